@@ -0,0 +1,77 @@
+from __future__ import annotations
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from rag.answer_cache import SemanticAnswerCache
+from rag.search import RAGHit
+from src.prompts import chat_prompt, customer_lines
+
+HITS = [RAGHit(score=0.9, doc_id="returns.md", doc_title="Returns", chunk_id=0, text="Returns within 14 days.")]
+TIERS = ("bronze", "silver", "gold", "vip")
+MODES = ("optimistic", "cautious")
+
+
+def _ctx(customer_id: str, spend: float, tier: str = "gold", mode: str = "optimistic") -> dict:
+    return {
+        "customer_id": customer_id, "tier": tier, "mode": mode, "total_spend": spend,
+        "purchase_count": 22, "avg_rating": 4.1, "rating_coverage": 0.9, "last_purchase": "2023-09-30",
+        "recent_items": ["Handbag", "Scarf"],
+    }
+
+
+def check_profile_sharing() -> None:
+    # The cached answer comes from a prompt with tier and mode only, so customers sharing
+    # them share the entry; everything customer-specific is in customer_lines().
+    a, b = _ctx("1001", 5200.0), _ctx("1002", 870.0)
+    assert chat_prompt(a, "[1] ctx", "Can I return this?") == chat_prompt(b, "[1] ctx", "Can I return this?")
+    assert "Handbag" in customer_lines(a) and "Handbag" not in chat_prompt(a, "", "")
+
+    cache = SemanticAnswerCache(threshold=0.5)
+    vec = np.ones(8, dtype="float32") / np.sqrt(8)
+    cache.put(vec, a, None, HITS, "Can I return this?", "Returns within 14 days [1].", "m")
+    assert cache.lookup(vec, b, None, HITS) is not None, "same tier/mode not shared"
+    assert cache.lookup(vec, {**a, "tier": "vip"}, None, HITS) is None, "answer crossed tiers"
+    assert cache.lookup(vec, {**a, "mode": "cautious"}, None, HITS) is None, "answer crossed modes"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Semantic answer cache: lookup latency and hit ratio on synthetic paraphrases.")
+    ap.add_argument("--customers", type=int, default=200, help="spread over every tier/mode")
+    ap.add_argument("--questions", type=int, default=20, help="distinct questions")
+    ap.add_argument("--noise", type=float, default=0.35, help="paraphrase noise added to question vectors")
+    ap.add_argument("--dim", type=int, default=384)
+    args = ap.parse_args()
+
+    check_profile_sharing()
+    rng = np.random.default_rng(0)
+    base = rng.standard_normal((args.questions, args.dim)).astype("float32")
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    profiles = list(itertools.product(TIERS, MODES))
+    ctxs = [_ctx(str(1000 + i), 100.0 * i, *profiles[i % len(profiles)]) for i in range(args.customers)]
+    cache = SemanticAnswerCache()
+    # First customer of each tier/mode asks everything; the rest paraphrase.
+    for tier, mode in profiles:
+        for j, v in enumerate(base):
+            cache.put(v, _ctx("seed", 0.0, tier, mode), None, HITS, f"q{j}", f"answer {j} for {tier}/{mode}", "m")
+
+    t0 = time.perf_counter()
+    n = 0
+    for ctx in ctxs:
+        for j, v in enumerate(base):
+            p = v + args.noise * rng.standard_normal(args.dim).astype("float32") / np.sqrt(args.dim)
+            found = cache.lookup(p / np.linalg.norm(p), ctx, None, HITS)
+            assert found is None or found["answer"].endswith(f"{ctx['tier']}/{ctx['mode']}")
+            n += 1
+    lookup_us = (time.perf_counter() - t0) / n * 1e6
+    s = cache.stats()
+    print(f"customers={args.customers} tier/mode keys={s['keys']} questions={args.questions}: "
+          f"{lookup_us:.1f} us/lookup  hit_ratio={s['hit_ratio']:.3f}")
+    print("would-hit:", "  ".join(f"{t}={r:.3f}" for t, r in s["would_hit_ratio"].items()))
+    print("shared across customers with the same tier/mode: ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from bench.synthetic import synthetic_sales
+from src.data import build_client_index, build_clients_table, get_client_context
+
+
+def _median_ms(fn, ids, runs: int) -> float:
+    out = []
+    for cid in ids[:runs]:
+        t0 = time.perf_counter()
+        fn(cid)
+        out.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(out)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Client profile lookup: full-table scan vs ClientIndex.")
+    ap.add_argument("--sizes", default="10000,100000,1000000,5000000")
+    ap.add_argument("--lookups", type=int, default=50)
+    args = ap.parse_args()
+
+    for n in [int(s) for s in args.sizes.split(",")]:
+        df = synthetic_sales(n)
+        clients = build_clients_table(df)
+        t0 = time.perf_counter()
+        index = build_client_index(df, clients)
+        build_s = time.perf_counter() - t0
+
+        ids = np.random.default_rng(1).choice(clients["customer_id"].to_numpy(), args.lookups).tolist()
+
+        def scan(cid):
+            get_client_context(df, clients, cid)
+            df[df["customer_id"] == cid].sort_values("date", ascending=False).head(25)
+
+        def indexed(cid):
+            index.context(cid)
+            index.history(cid, limit=25)
+
+        print(
+            f"rows={n:>8}  scan={_median_ms(scan, ids, min(args.lookups, 10)):9.2f} ms  "
+            f"index={_median_ms(indexed, ids, args.lookups):7.3f} ms  index_build={build_s:.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+import argparse
+import time
+
+import pandas as pd
+
+from bench.synthetic import synthetic_sales
+from src.data import build_clients_table
+
+
+def reference_clients_table(df: pd.DataFrame) -> pd.DataFrame:
+    # The original row-at-a-time implementation, kept to check label equivalence.
+    out = df.groupby("customer_id", as_index=False).agg(
+        total_spend=("amount", "sum"),
+        purchase_count=("amount", "size"),
+        avg_rating=("rating", "mean"),
+        rated_count=("rating", lambda s: s.notna().sum()),
+    )
+    out["rating_coverage"] = out["rated_count"] / out["purchase_count"]
+    out["avg_rating"] = out["avg_rating"].where(out["avg_rating"].notna(), None)
+
+    spend = out["total_spend"].astype(float)
+    cnt = out["purchase_count"].astype(int)
+    spend_p50, spend_p80, spend_p95 = spend.quantile([0.50, 0.80, 0.95]).tolist()
+    cnt_p50, cnt_p80, cnt_p95 = cnt.quantile([0.50, 0.80, 0.95]).tolist()
+
+    def tier_row(r):
+        s = float(r["total_spend"])
+        c = int(r["purchase_count"])
+        ar = r["avg_rating"]
+        if ((s >= spend_p95) or (c >= cnt_p95)) and (ar is not None and ar >= 4.0):
+            return "vip"
+        if (s >= spend_p80) or (c >= cnt_p80):
+            return "gold"
+        if (s >= spend_p50) or (c >= cnt_p50):
+            return "silver"
+        return "bronze"
+
+    def mode_row(r):
+        ar = r["avg_rating"]
+        cov = float(r["rating_coverage"])
+        if ar is None:
+            return "cautious"
+        if ar >= 3.0 and cov >= 0.3:
+            return "optimistic"
+        return "cautious"
+
+    out["tier"] = out.apply(tier_row, axis=1)
+    out["mode"] = out.apply(mode_row, axis=1)
+    out["suggestion_limit"] = out["tier"].map({"bronze": 3, "silver": 5, "gold": 7, "vip": 9})
+    return out
+
+
+def check_equivalent(df: pd.DataFrame) -> None:
+    new = build_clients_table(df)
+    ref = reference_clients_table(df)
+    for col in ("customer_id", "rated_count", "tier", "mode", "suggestion_limit"):
+        a = new[col].astype(str).tolist()
+        b = ref[col].astype(str).tolist()
+        if a != b:
+            bad = sum(x != y for x, y in zip(a, b))
+            raise AssertionError(f"{col}: {bad} rows differ from the reference implementation")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Vectorized build_clients_table vs the row-wise original.")
+    ap.add_argument("--rows", type=int, default=5_000_000)
+    ap.add_argument("--check-rows", type=int, default=200_000, help="rows for the label equivalence check")
+    ap.add_argument("--skip-reference", action="store_true", help="don't time the slow row-wise version")
+    args = ap.parse_args()
+
+    check_equivalent(synthetic_sales(args.check_rows, seed=2))
+    print(f"labels identical to the row-wise implementation on {args.check_rows} rows")
+
+    df = synthetic_sales(args.rows)
+    t0 = time.perf_counter()
+    build_clients_table(df)
+    print(f"vectorized build_clients_table: {time.perf_counter() - t0:.2f} s ({args.rows} rows)")
+    if not args.skip_reference:
+        t0 = time.perf_counter()
+        reference_clients_table(df)
+        print(f"row-wise reference:             {time.perf_counter() - t0:.2f} s ({args.rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+import argparse
+import statistics
+
+from bench.replay import QUESTIONS
+from rag.context import build_context, dedupe_hits
+from rag.search import SEARCH_MODE, Retriever
+
+EXTRA_QUESTIONS = [
+    "How long does a refund take to reach my card?",
+    "What are the benefits of the VIP tier?",
+    "Who pays return shipping for defective items?",
+    "How do I contact support after hours?",
+    "Are final sale items returnable?",
+    "Can I return without a receipt?",
+    "How many points do I earn per dollar?",
+    "What happens if my package is lost?",
+    "Can I cancel an order after it ships?",
+    "Do loyalty points expire?",
+]
+LONG_CONTEXT_CHARS = 1800  # src.llm._pick_model routes longer contexts to gemini-2.5-flash
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Share of retrieved policy hits kept in the /chat context per token budget.")
+    ap.add_argument("--budgets", default="300,440,600,700,900,1200",
+                    type=lambda s: [int(x) for x in s.split(",")])
+    ap.add_argument("-k", type=int, default=6, help="hits retrieved per question (as /chat)")
+    ap.add_argument("--mode", default=SEARCH_MODE, help="retrieval mode (lexical needs no encoder)")
+    args = ap.parse_args()
+
+    retriever = Retriever(mode=args.mode)
+    hits = [retriever.search(q, k=args.k) for q in QUESTIONS + EXTRA_QUESTIONS]
+    # Reference: everything that survives dedup, with no budget.
+    ref_hits = sum(len(dedupe_hits(h)) for h in hits)
+    ref_docs = sum(len({x.doc_id for _, x in dedupe_hits(h)}) for h in hits)
+
+    print(f"questions={len(hits)} k={args.k} mode={args.mode}")
+    for budget in args.budgets:
+        kept = docs = long_ctx = 0
+        chars = []
+        for h in hits:
+            ctx, blocks = build_context(h, budget_tokens=budget)
+            kept += sum(len(b.hits) for b in blocks if not b.truncated)
+            docs += len({b.doc_id for b in blocks})
+            long_ctx += len(ctx) > LONG_CONTEXT_CHARS
+            chars.append(len(ctx))
+        print(
+            f"budget={budget:>5} tokens  whole hits kept={kept / max(ref_hits, 1):6.1%}  "
+            f"documents kept={docs / max(ref_docs, 1):6.1%}  context chars p50={statistics.median(chars):6.0f} "
+            f"max={max(chars):6d}  long-context routing={long_ctx / len(hits):6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
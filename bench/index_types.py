@@ -0,0 +1,97 @@
+from __future__ import annotations
+import argparse
+import json
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+import faiss
+import numpy as np
+
+from rag.index_types import INDEX_KINDS, build_index
+
+DIM = 384  # all-MiniLM-L6-v2
+
+
+def synthetic_corpus(n: int, dim: int = DIM, n_topics: int = 256, seed: int = 0) -> np.ndarray:
+    # Clustered unit vectors: chunks of the same document/topic sit close together,
+    # which is closer to real embeddings than uniform noise.
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_topics, dim)).astype("float32")
+    x = centers[rng.integers(0, n_topics, n)] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+
+
+def index_bytes(index: faiss.Index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def bench_one(kind: str, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int,
+              params: Dict[str, Any], train_size: int) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    train = corpus[: min(len(corpus), train_size)]
+    index = build_index(kind, train, params)
+    index.add_with_ids(corpus, np.arange(len(corpus), dtype="int64"))
+    build_s = time.perf_counter() - t0
+
+    lat_ms: List[float] = []
+    found = np.empty_like(truth)
+    for i in range(len(queries)):
+        t = time.perf_counter()
+        _, ids = index.search(queries[i:i + 1], k)
+        lat_ms.append((time.perf_counter() - t) * 1000)
+        found[i] = ids[0]
+    lat_ms.sort()
+    return {
+        "kind": kind,
+        "params": params,
+        "n": len(corpus),
+        "recall_at_k": round(recall_at_k(truth, found), 4),
+        "p50_ms": round(statistics.median(lat_ms), 3),
+        "p95_ms": round(lat_ms[int(0.95 * (len(lat_ms) - 1))], 3),
+        "index_mb": round(index_bytes(index) / 2**20, 1),
+        "build_s": round(build_s, 2),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Recall@k vs latency vs memory for each FAISS index kind.")
+    ap.add_argument("--sizes", default="10000,100000", help="comma-separated corpus sizes, e.g. 10000,100000,1000000")
+    ap.add_argument("--kinds", default=",".join(INDEX_KINDS))
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("-k", type=int, default=6)
+    ap.add_argument("--nprobe", type=int, default=16)
+    ap.add_argument("--ef-search", type=int, default=64)
+    ap.add_argument("--train-size", type=int, default=100_000)
+    ap.add_argument("--json", action="store_true", help="emit one JSON object per result")
+    args = ap.parse_args()
+
+    params = {"nprobe": args.nprobe, "ef_search": args.ef_search}
+    for n in [int(s) for s in args.sizes.split(",")]:
+        corpus = synthetic_corpus(n)
+        queries = synthetic_corpus(args.queries, seed=1)
+        flat = faiss.IndexFlatIP(DIM)
+        flat.add(corpus)
+        _, truth = flat.search(queries, args.k)
+
+        for kind in args.kinds.split(","):
+            r = bench_one(kind, corpus, queries, truth, args.k, params, args.train_size)
+            if args.json:
+                print(json.dumps(r))
+            else:
+                print(
+                    f"n={n:>8} {kind:<5} recall@{args.k}={r['recall_at_k']:.3f} "
+                    f"p50={r['p50_ms']:.3f}ms p95={r['p95_ms']:.3f}ms "
+                    f"mem={r['index_mb']:.1f}MB build={r['build_s']:.1f}s"
+                )
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
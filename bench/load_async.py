@@ -0,0 +1,85 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+import src.app as app_module
+from src.llm_cache import LLM_CACHE
+from src.llm_providers import FakeProvider, set_provider
+
+QUESTIONS = [
+    "Can I return an item after 14 days?",
+    "What is the refund timeline?",
+    "Do VIP customers get free return shipping?",
+    "How do I exchange a damaged item?",
+]
+
+
+def install_fake_llm(mean_s: float) -> None:
+    # Gemini stand-in behind the real gemini_text_async path (routing, LLM semaphore).
+    set_provider(FakeProvider(latency_s=mean_s, dist="exp"))
+    # The bench cycles a handful of questions; measure the LLM path, not the caches.
+    LLM_CACHE.endpoints = set()
+    app_module.ANSWER_CACHE.threshold = 2.0
+
+
+async def run_level(client: httpx.AsyncClient, customer_ids: list, concurrency: int, requests: int):
+    latencies: list[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            payload = {"customer_id": customer_ids[i % len(customer_ids)], "question": QUESTIONS[i % len(QUESTIONS)]}
+            t0 = time.perf_counter()
+            r = await client.post("/chat", json=payload)
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "rps": requests / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+async def main_async(levels: list[int], requests_per_client: int) -> None:
+    app_module.load_snapshot()
+    customer_ids = app_module.SNAPSHOTS.current().clients["customer_id"].tolist()
+    transport = httpx.ASGITransport(app=app_module.app)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=120) as client:
+        for n in levels:
+            r = await run_level(client, customer_ids, n, n * requests_per_client)
+            print(
+                f"clients={r['concurrency']:>4}  throughput={r['rps']:8.1f} req/s  "
+                f"p50={r['p50_ms']:7.1f} ms  p95={r['p95_ms']:7.1f} ms"
+            )
+    await app_module.stop_snapshot_watcher()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="/chat throughput at increasing concurrency with a fake LLM.")
+    ap.add_argument("--levels", default="50,200,500")
+    ap.add_argument("--requests-per-client", type=int, default=4)
+    ap.add_argument("--llm-latency-s", type=float, default=0.8, help="mean fake LLM round trip")
+    args = ap.parse_args()
+    install_fake_llm(args.llm_latency_s)
+    asyncio.run(main_async([int(x) for x in args.levels.split(",")], args.requests_per_client))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.data import CSV_PATH, build_clients_table, load_sales_csv
+from src.profiles import QUANTILES, ProfileStore
+
+
+def check_unrated_new_customer(store: ProfileStore) -> None:
+    # A first purchase without a rating must read back as JSON (avg_rating null, not NaN).
+    cid = "bench-unrated"
+    store.append(pd.DataFrame([{"customer_id": cid, "item": "Scarf", "amount": 10.0, "date": "2023-10-01"}]))
+    for ctx in (store.context(cid), store.contexts([cid])[cid]):
+        assert ctx["avg_rating"] is None, ctx["avg_rating"]
+        json.dumps(ctx, allow_nan=False)
+
+
+def check_content_version(base: pd.DataFrame) -> None:
+    # /clients ETags come from appended_digest: equal for the same appends in another
+    # worker (a fresh store here), different as soon as the appended content differs.
+    tx = pd.DataFrame([{"customer_id": "bench-etag", "item": "Scarf", "amount": 10.0, "date": "2023-10-01"}])
+    a, b, c = (ProfileStore(base, build_clients_table(base)) for _ in range(3))
+    a.append(tx)
+    b.append(tx.copy())
+    c.append(tx.assign(amount=11.0))
+    assert a.appended_digest == b.appended_digest != c.appended_digest
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="ProfileStore.append replay vs a full build_clients_table rebuild.")
+    ap.add_argument("--csv", default=str(CSV_PATH))
+    ap.add_argument("--holdout", type=int, default=400, help="latest rows appended instead of loaded")
+    ap.add_argument("--batch", type=int, default=50)
+    args = ap.parse_args()
+
+    df = load_sales_csv(args.csv).sort_values("date", kind="stable").reset_index(drop=True)
+    base, rest = df.iloc[: len(df) - args.holdout], df.iloc[len(df) - args.holdout:]
+    store = ProfileStore(base, build_clients_table(base))
+    t0 = time.perf_counter()
+    for lo in range(0, len(rest), args.batch):
+        store.append(rest.iloc[lo: lo + args.batch])
+    append_s = time.perf_counter() - t0
+
+    full = build_clients_table(df).set_index("customer_id")
+    spend = full["total_spend"].astype(float)
+    exact = spend.quantile(list(QUANTILES)).tolist()
+    # The sketch answers with a value within relative_accuracy of the spend at rank
+    # floor(q * (n - 1)); pandas interpolates up from that same sample.
+    ranked = np.sort(spend.to_numpy())
+    acc = store.spend_sketch.relative_accuracy
+    for q, got in zip(QUANTILES, store.spend_q):
+        at_rank = ranked[int(np.floor(q * (len(ranked) - 1)))]
+        assert abs(got - at_rank) <= acc * at_rank + 1e-9, (q, got, at_rank)
+    assert list(store.count_q) == full["purchase_count"].astype(int).quantile(list(QUANTILES)).tolist()
+
+    inc = store.table(["customer_id", "tier", "mode"]).set_index("customer_id").loc[full.index]
+    # Rating sums are accumulated in a different order, so an average sitting exactly
+    # on a cut-off (3.0 / 4.0) can land one ulp to either side.
+    ar = full["avg_rating"].astype(float)
+    on_edge = ((ar - 3.0).abs() < 1e-9) | ((ar - 4.0).abs() < 1e-9)
+    # Tiers may differ only for customers between a sketch threshold and the exact one.
+    in_band = pd.Series(False, index=full.index)
+    for got, want in zip(store.spend_q, exact):
+        in_band |= (spend >= min(got, want)) & (spend <= max(got, want))
+    for col, allowed in (("tier", on_edge | in_band), ("mode", on_edge)):
+        diff = (full[col] != inc[col]) & ~allowed
+        assert not diff.any(), f"{col}: {int(diff.sum())} customers differ from a full rebuild"
+    near = int(((full["tier"] != inc["tier"]) & in_band).sum())
+    print(f"rows={len(df)} appended={len(rest)} in batches of {args.batch}: {append_s * 1000:.1f} ms")
+    print("spend thresholds sketch vs exact: " + "  ".join(
+        f"p{int(q * 100)}={got:.2f}/{want:.2f}" for q, got, want in zip(QUANTILES, store.spend_q, exact)))
+    print(f"tiers and modes match a rebuild except {near} customers between a sketch and an exact spend threshold")
+
+    check_content_version(base)
+    print("data version follows appended content")
+
+    check_unrated_new_customer(store)
+    print("unrated new customer reads back with avg_rating=null")
+
+
+if __name__ == "__main__":
+    main()
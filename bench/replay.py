@@ -0,0 +1,328 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+from src.llm_providers import FakeProvider, set_provider
+
+# One request per line: {"method": "POST", "path": "/chat", "body": {...}}.
+# Lines without "path" are skipped, so a mixed file can be replayed as is.
+QUESTIONS = [
+    "Can I return an item after 14 days?",
+    "What is the refund timeline?",
+    "Do VIP customers get free return shipping?",
+    "How do I exchange a damaged item?",
+    "Is there a loyalty discount for gold members?",
+    "Can I get store credit instead of a refund?",
+]
+STREAM_PATHS = ("/chat/stream", "/email_suggestion/stream")
+
+
+class StreamingASGITransport(httpx.AsyncBaseTransport):
+    # httpx.ASGITransport collects the whole body before returning, so in-process
+    # streams would report time-to-first-byte equal to total latency. This one hands
+    # body chunks to the client as the app sends them.
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": request.method, "scheme": request.url.scheme,
+            "path": request.url.path, "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query, "root_path": "",
+            "headers": [(k.lower(), v) for k, v in request.headers.raw],
+            "server": (request.url.host, request.url.port or 80), "client": ("127.0.0.1", 0),
+        }
+        chunks: asyncio.Queue = asyncio.Queue()
+        started: asyncio.Future = asyncio.get_running_loop().create_future()
+        closed = asyncio.Event()
+        request_sent = False
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await closed.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                started.set_result(message)
+            elif message["type"] == "http.response.body":
+                if message.get("body"):
+                    await chunks.put(message["body"])
+                if not message.get("more_body", False):
+                    await chunks.put(None)
+
+        async def run() -> None:
+            try:
+                await self.app(scope, receive, send)
+            except Exception as e:
+                if not started.done():
+                    started.set_exception(e)
+                await chunks.put(e)
+
+        task = asyncio.create_task(run())
+        start = await started
+
+        class Body(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                while True:
+                    chunk = await chunks.get()
+                    if chunk is None:
+                        return
+                    if isinstance(chunk, Exception):
+                        raise httpx.ReadError(f"app failed mid-response: {chunk!r}")
+                    yield chunk
+
+            async def aclose(self) -> None:
+                closed.set()
+                await task
+
+        return httpx.Response(start["status"], headers=start.get("headers", []), stream=Body(), request=request)
+
+
+def read_requests(path: Path) -> List[Dict[str, Any]]:
+    out = []
+    with path.open("r", encoding="utf-8") as r:
+        for line in r:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if "path" in obj:
+                obj.setdefault("method", "POST" if "body" in obj else "GET")
+                out.append(obj)
+    return out
+
+
+def make_requests(customer_ids: List[str], n: int, email_share: float = 0.2, stream_share: float = 0.0,
+                  seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        cid = rng.choice(customer_ids)
+        stream = rng.random() < stream_share
+        if rng.random() < email_share:
+            path = "/email_suggestion/stream" if stream else "/email_suggestion"
+            out.append({"method": "POST", "path": path, "body": {"customer_id": cid}})
+        else:
+            path = "/chat/stream" if stream else "/chat"
+            out.append({"method": "POST", "path": path, "body": {"customer_id": cid, "question": rng.choice(QUESTIONS)}})
+    return out
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    v = sorted(values)
+    pick = lambda q: v[min(len(v) - 1, int(q * (len(v) - 1) + 0.5))] * 1000
+    return {
+        "count": len(v),
+        "mean_ms": statistics.fmean(v) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": v[-1] * 1000,
+    }
+
+
+async def run_level(client: httpx.AsyncClient, requests: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for req in requests:
+        queue.put_nowait(req)
+
+    async def one(req: Dict[str, Any]) -> None:
+        t0 = time.perf_counter()
+        ttfb = None
+        try:
+            if req["path"] in STREAM_PATHS:
+                async with client.stream(req["method"], req["path"], json=req.get("body")) as r:
+                    async for _ in r.aiter_bytes():
+                        if ttfb is None:
+                            ttfb = time.perf_counter() - t0
+                    status = r.status_code
+            else:
+                r = await client.request(req["method"], req["path"], json=req.get("body"))
+                status = r.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - t0
+        results.append({"path": req["path"], "status": status, "latency": elapsed, "ttfb": ttfb if ttfb is not None else elapsed})
+
+    async def worker() -> None:
+        while True:
+            try:
+                req = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await one(req)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+
+    by_route: Dict[str, Any] = {}
+    for path in sorted({r["path"] for r in results}):
+        rows = [r for r in results if r["path"] == path]
+        by_route[path] = {
+            "latency": percentiles([r["latency"] for r in rows]),
+            "ttfb": percentiles([r["ttfb"] for r in rows]),
+        }
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "wall_s": wall,
+        "rps": len(results) / wall if wall else 0.0,
+        "errors": sum(n for s, n in statuses.items() if not s.startswith("2")),
+        "status": statuses,
+        "latency": percentiles([r["latency"] for r in results]),
+        "by_route": by_route,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main_async(args) -> Dict[str, Any]:
+    if args.url:
+        transport, base_url = None, args.url
+        app_module = None
+    else:
+        import src.app as app_module
+        from src.llm_cache import LLM_CACHE
+        from src.metrics import REGISTRY
+
+        set_provider(FakeProvider(
+            latency_s=args.llm_latency_s, dist=args.llm_dist, sigma=args.llm_sigma,
+            tokens_per_s=args.llm_tokens_per_s, error_rate=args.llm_error_rate, seed=args.seed,
+        ))
+        if not args.keep_caches:
+            # Replayed files repeat prompts; measure the full path, not the caches.
+            LLM_CACHE.endpoints = set()
+            app_module.ANSWER_CACHE.threshold = 2.0
+        app_module.load_snapshot()
+        transport, base_url = StreamingASGITransport(app_module.app), "http://bench"
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        if args.input:
+            requests = read_requests(Path(args.input))
+        else:
+            r = await client.get("/clients", params={"fields": "customer_id", "limit": 5000})
+            requests = make_requests([c["customer_id"] for c in r.json()], args.requests,
+                                     email_share=args.email_share, stream_share=args.stream_share, seed=args.seed)
+        if args.requests and len(requests) != args.requests:
+            requests = [requests[i % len(requests)] for i in range(args.requests)]
+
+        levels = []
+        for n in args.levels:
+            if app_module is not None:
+                REGISTRY.reset()
+            level = await run_level(client, requests, n)
+            # Server-side per-stage breakdown for this level.
+            if app_module is not None:
+                level["stages"] = REGISTRY.summary()
+                level["counters"] = REGISTRY.counter_values()  # fallbacks, routing, cache hits
+            else:
+                level["stages"] = (await client.get("/metrics/summary")).json()
+            levels.append(level)
+            lat = level["latency"]
+            print(
+                f"clients={n:>4}  throughput={level['rps']:8.1f} req/s  p50={lat['p50_ms']:7.1f} ms  "
+                f"p95={lat['p95_ms']:7.1f} ms  p99={lat['p99_ms']:7.1f} ms  errors={level['errors']}",
+                file=sys.stderr,
+            )
+    if app_module is not None:
+        await app_module.stop_snapshot_watcher()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "target": args.url or "in-process",
+            "input": args.input,
+            "llm": None if args.url else {
+                "latency_s": args.llm_latency_s, "dist": args.llm_dist, "sigma": args.llm_sigma,
+                "tokens_per_s": args.llm_tokens_per_s, "error_rate": args.llm_error_rate,
+            },
+        },
+        "levels": levels,
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    # One line per concurrency level present in both runs: throughput and latency deltas.
+    lines = []
+    prev = {lv["concurrency"]: lv for lv in old["levels"]}
+    for lv in new["levels"]:
+        o = prev.get(lv["concurrency"])
+        if o is None:
+            continue
+        pct = lambda a, b: f"{(b - a) / a * 100:+6.1f}%" if a else "   n/a"
+        lines.append(
+            f"clients={lv['concurrency']:>4}  rps {o['rps']:8.1f} -> {lv['rps']:8.1f} ({pct(o['rps'], lv['rps'])})  "
+            f"p95 {o['latency']['p95_ms']:7.1f} -> {lv['latency']['p95_ms']:7.1f} ms "
+            f"({pct(o['latency']['p95_ms'], lv['latency']['p95_ms'])})"
+        )
+    return lines
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Replay API requests at increasing concurrency against a fake LLM.")
+    ap.add_argument("input", nargs="?", help="JSONL of {method, path, body}; omitted = synthesize /chat + /email_suggestion")
+    ap.add_argument("--levels", default="10,50,200", type=lambda s: [int(x) for x in s.split(",")])
+    ap.add_argument("--requests", type=int, default=400, help="requests per level (input is cycled or truncated)")
+    ap.add_argument("--email-share", type=float, default=0.2)
+    ap.add_argument("--stream-share", type=float, default=0.0)
+    ap.add_argument("--url", default=None, help="replay against a running server instead of in-process")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--llm-latency-s", type=float, default=0.8, help="median fake LLM latency")
+    ap.add_argument("--llm-dist", default="lognormal", choices=["lognormal", "exp", "fixed"])
+    ap.add_argument("--llm-sigma", type=float, default=0.5)
+    ap.add_argument("--llm-tokens-per-s", type=float, default=50.0)
+    ap.add_argument("--llm-error-rate", type=float, default=0.0)
+    ap.add_argument("--keep-caches", action="store_true", help="leave the LLM response and answer caches on")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("-o", "--output", default="-", help="baseline JSON file, or - for stdout")
+    ap.add_argument("--compare", default=None, help="earlier baseline JSON to diff against")
+    args = ap.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr):  # keep app log lines out of the JSON on stdout
+        report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output == "-":
+        print(text)
+    else:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    if args.compare:
+        for line in compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
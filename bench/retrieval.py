@@ -0,0 +1,46 @@
+from __future__ import annotations
+import statistics
+import time
+import faiss
+from sentence_transformers import SentenceTransformer
+
+from rag.search import INDEX_PATH, MODEL_NAME, Retriever, open_meta
+
+QUERY = "Can I return an item after 14 days? What about VIP?"
+K = 6
+
+
+def cold_search(query: str, k: int = K):
+    # What rag.search.search() did per call before the resident Retriever.
+    index = faiss.read_index(str(INDEX_PATH))
+    open_meta()
+    model = SentenceTransformer(MODEL_NAME)
+    q = model.encode([query], normalize_embeddings=True).astype("float32")
+    return index.search(q, k)
+
+
+def _time_ms(fn, runs: int) -> list[float]:
+    out = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def main(runs: int = 20) -> None:
+    before = _time_ms(lambda: cold_search(QUERY), runs=max(3, runs // 4))
+
+    t0 = time.perf_counter()
+    retriever = Retriever()
+    startup_ms = (time.perf_counter() - t0) * 1000
+    retriever.search(QUERY, k=K)
+    after = _time_ms(lambda: retriever.search(QUERY, k=K), runs=runs)
+
+    print(f"per-call load (before): median={statistics.median(before):.1f} ms  max={max(before):.1f} ms")
+    print(f"resident      (after):  median={statistics.median(after):.1f} ms  max={max(after):.1f} ms")
+    print(f"one-time Retriever startup: {startup_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
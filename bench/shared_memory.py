@@ -0,0 +1,203 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import numpy as np
+
+from bench.startup import write_synthetic_csv
+
+REPO = Path(__file__).resolve().parent.parent
+QUESTION = "Can I return an item after 14 days?"
+
+
+def write_synthetic_index(out_dir: Path, n: int, dim: int = 384, seed: int = 0) -> None:
+    # A flat index of n random unit vectors plus matching chunk metadata and BM25 postings.
+    import faiss
+    from rag.lexical import LexicalIndex
+    from rag.meta_store import write_meta_store
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+    for lo in range(0, n, 100_000):
+        x = rng.standard_normal((min(n, lo + 100_000) - lo, dim)).astype("float32")
+        faiss.normalize_L2(x)
+        index.add_with_ids(x, np.arange(lo, lo + len(x), dtype="int64"))
+    faiss.write_index(index, str(out_dir / "rag.faiss"))
+    rows = [
+        {"id": i, "doc_id": f"doc{i // 50}.md", "doc_title": f"Doc {i // 50}", "chunk_id": i % 50,
+         "text": f"Synthetic policy chunk {i}: returns within 14 days, refunds in 5-7 business days."}
+        for i in range(n)
+    ]
+    write_meta_store(out_dir / "rag_meta.bin", rows)
+    LexicalIndex.build(rows).save(out_dir / "rag_bm25.npz")
+
+
+def prepare(workdir: Path, rows: int, vectors: int) -> None:
+    # The app reads fashion_data/ and dat/ relative to its working directory.
+    (workdir / "fashion_data").mkdir(parents=True)
+    csv = workdir / "fashion_data" / "Fashion_Retail_Sales.csv"
+    if rows:
+        write_synthetic_csv(csv, rows)
+    else:
+        shutil.copy(REPO / "fashion_data" / "Fashion_Retail_Sales.csv", csv)
+    if vectors:
+        write_synthetic_index(workdir / "dat" / "out", vectors)
+    else:
+        shutil.copytree(REPO / "dat" / "out", workdir / "dat" / "out")
+    subprocess.run([sys.executable, "-m", "src.prebuild"], cwd=workdir, env=_env(False), check=True,
+                   stdout=sys.stderr)
+    # Same working directory as the workers: the cache key records the CSV path.
+    subprocess.run([sys.executable, "-c", "from bench.shared_memory import check_mapped; check_mapped()"],
+                   cwd=workdir, env=_env(True), check=True, stdout=sys.stderr)
+
+
+def check_mapped() -> None:
+    # What SHARED_MMAP=1 workers load must still be file-backed, or each worker holds a copy.
+    import pandas as pd
+    from src.data import csv_cache_key, load_client_index, load_sales_data
+    from src.profiles import ProfileStore
+
+    df, clients = load_sales_data(mmap=True)
+    index = load_client_index(df, clients, csv_cache_key(), mmap=True)
+    for name, arr in index._arrays.items():
+        assert isinstance(arr, np.memmap), f"client index {name!r} is {type(arr).__name__}, not np.memmap"
+    # Appends go to the store's overlay; the mapped clients columns stay the ones it was given.
+    store = ProfileStore(df, clients, index)
+    cid = str(clients["customer_id"].iloc[0])
+    store.append(pd.DataFrame([{"customer_id": cid, "item": "Scarf", "amount": 10.0, "date": "2023-10-01"}]))
+    assert store._base is clients and not hasattr(store, "_pos")
+    for col in ("total_spend", "purchase_count", "avg_rating"):
+        assert isinstance(clients[col].array._ndarray, np.memmap), f"clients {col!r} copied"
+    assert store.context(cid)["total_spend"] == float(clients["total_spend"].iloc[0]) + 10.0
+
+
+def _env(shared: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO), env.get("PYTHONPATH")]))
+    env["SHARED_MMAP"] = "1" if shared else "0"
+    env.setdefault("LLM_PROVIDER", "fake")
+    env.setdefault("FAKE_LLM_LATENCY_S", "0")
+    env.setdefault("SNAPSHOT_WATCH_INTERVAL_S", "0")
+    return env
+
+
+def worker_pids(parent: int) -> List[int]:
+    # uvicorn --workers N: children of the supervisor started through multiprocessing spawn.
+    out = []
+    for d in Path("/proc").iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            ppid = int((d / "stat").read_text().rsplit(")", 1)[1].split()[1])
+            cmd = (d / "cmdline").read_bytes()
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent and b"spawn_main" in cmd:
+            out.append(int(d.name))
+    return sorted(out)
+
+
+def memory(pid: int) -> Dict[str, float]:
+    # MiB from smaps_rollup. Pss divides shared pages between the processes mapping them.
+    vals = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, rest = line.split(":", 1)
+        if name in ("Rss", "Pss", "Anonymous"):
+            vals[name.lower()] = int(rest.split()[0]) / 1024
+    return vals
+
+
+def run(workdir: Path, workers: int, shared: bool, port: int, warmup: int, timeout_s: float) -> Dict[str, Any]:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning",
+         # Workers answer the supervisor's health check only once startup is done; on a
+         # small box many workers loading at once take longer than the 5 s default.
+         "--timeout-worker-healthcheck", str(int(timeout_s))],
+        cwd=workdir, env=_env(shared), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout_s
+        while True:
+            # With a single worker uvicorn serves from the process it was started as.
+            pids = worker_pids(proc.pid) if workers > 1 else [proc.pid]
+            try:
+                if len(pids) == workers and httpx.get(f"{base}/health", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"server with {workers} workers did not start")
+            time.sleep(0.5)
+
+        # Spread requests over the workers so each has loaded its snapshot and searched the index.
+        with httpx.Client(base_url=base, timeout=timeout_s) as client:
+            ids = [c["customer_id"] for c in client.get("/clients", params={"fields": "customer_id", "limit": 200}).json()]
+
+            def one(i: int) -> None:
+                cid = ids[i % len(ids)]
+                client.get(f"/clients/{cid}")
+                client.post("/chat", json={"customer_id": cid, "question": f"{QUESTION} ({i})"})
+
+            with ThreadPoolExecutor(max(4, workers)) as pool:
+                list(pool.map(one, range(warmup * workers)))
+
+        per = [memory(pid) for pid in pids]
+        return {
+            "workers": workers,
+            "shared_mmap": shared,
+            "rss_mib": float(np.mean([p["rss"] for p in per])),
+            "pss_mib": float(np.mean([p["pss"] for p in per])),
+            "anon_mib": float(np.mean([p["anonymous"] for p in per])),
+            "total_pss_mib": float(sum(p["pss"] for p in per)),
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Per-worker memory of uvicorn workers with and without SHARED_MMAP.")
+    ap.add_argument("--workers", default="1,4,16", type=lambda s: [int(x) for x in s.split(",")])
+    ap.add_argument("--rows", type=int, default=2_000_000, help="synthetic sales rows (0 = the bundled CSV)")
+    ap.add_argument("--vectors", type=int, default=300_000, help="synthetic flat index size (0 = copy dat/out)")
+    ap.add_argument("--warmup", type=int, default=8, help="requests per worker before measuring")
+    ap.add_argument("--port", type=int, default=8790)
+    ap.add_argument("--timeout", type=float, default=600.0)
+    ap.add_argument("-o", "--output", default=None, help="also write the results as JSON")
+    args = ap.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        prepare(workdir, args.rows, args.vectors)
+        for n in args.workers:
+            for shared in (False, True):
+                r = run(workdir, n, shared, args.port, args.warmup, args.timeout)
+                results.append(r)
+                print(
+                    f"workers={n:>3}  shared_mmap={'on ' if shared else 'off'}  per-worker rss={r['rss_mib']:8.1f} MiB  "
+                    f"pss={r['pss_mib']:8.1f} MiB  anon={r['anon_mib']:8.1f} MiB  total pss={r['total_pss_mib']:9.1f} MiB",
+                    flush=True,
+                )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+import argparse
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+from bench.synthetic import synthetic_sales
+from src.columnar import load_frame, save_frame
+from src.data import CSV_PATH, load_sales_csv, load_sales_data
+
+CSV_COLUMNS = {
+    "customer_id": "Customer Reference ID",
+    "item": "Item Purchased",
+    "amount": "Purchase Amount (USD)",
+    "date": "Date Purchase",
+    "rating": "Review Rating",
+    "payment_method": "Payment Method",
+}
+
+
+def write_synthetic_csv(path: Path, rows: int) -> Path:
+    df = synthetic_sales(rows).rename(columns=CSV_COLUMNS)
+    df["Date Purchase"] = df["Date Purchase"].dt.strftime("%Y-%m-%d")
+    df.to_csv(path, index=False)
+    return path
+
+
+def _write_and_read(args: tuple) -> int:
+    # One process of check_concurrent_writers: alternately rewrite and map the same cache dir.
+    path, seed, calls = args
+    df = load_sales_csv(CSV_PATH)
+    for i in range(calls):
+        if (seed + i) % 2:
+            save_frame(df, path, key={"seed": 0})
+        else:
+            assert len(load_frame(path, mmap=True)) == len(df)
+    return calls
+
+
+def check_concurrent_writers(cache_dir: Path, processes: int = 8, calls: int = 10) -> None:
+    # Workers starting against a stale cache all rewrite it; none may fail or read a half-swapped dir.
+    path = cache_dir / "race"
+    save_frame(load_sales_csv(CSV_PATH), path, key={"seed": 0})
+    with mp.get_context("spawn").Pool(processes) as pool:
+        done = sum(pool.map(_write_and_read, [(path, s, calls) for s in range(processes)]))
+    leftovers = [p.name for p in cache_dir.iterdir() if ".tmp-" in p.name or p.name.endswith(".old")]
+    assert not leftovers, leftovers
+    print(f"concurrent cache writers: {done} writes/reads across {processes} processes, no errors")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Sales data cold start: CSV parse vs columnar cache.")
+    ap.add_argument("--rows", type=int, default=0, help="use a synthetic CSV with this many rows instead of the dataset")
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--writers", type=int, default=8, help="processes racing on one cache dir (0 skips)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = CSV_PATH
+        if args.rows:
+            csv_path = write_synthetic_csv(Path(tmp) / "sales.csv", args.rows)
+        cache_dir = Path(tmp) / "cache"
+
+        t0 = time.perf_counter()
+        load_sales_data(csv_path, cache_dir=None)
+        csv_s = time.perf_counter() - t0
+        load_sales_data(csv_path, cache_dir=cache_dir)  # writes the cache
+
+        cached = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            load_sales_data(csv_path, cache_dir=cache_dir)
+            cached.append(time.perf_counter() - t0)
+        if args.writers:
+            check_concurrent_writers(cache_dir, args.writers)
+
+    print(f"csv parse + clients table: {csv_s:.3f} s")
+    print(f"columnar cache (best of {args.runs}): {min(cached):.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+ITEMS = [
+    "Handbag", "Tunic", "Tank Top", "Leggings", "Wallet", "Jacket", "Camisole", "Pants",
+    "Romper", "Vest", "Trousers", "Hoodie", "Sweater", "Dress", "Sneakers", "Scarf",
+]
+PAYMENT = ["Credit Card", "Cash"]
+
+
+def synthetic_sales(n_rows: int, n_customers: int | None = None, seed: int = 0) -> pd.DataFrame:
+    # Same columns and dtypes as src.data.load_sales_csv(), with ~20 purchases per
+    # customer, ~10% missing ratings and a long tail of big spenders.
+    rng = np.random.default_rng(seed)
+    n_customers = n_customers or max(1, n_rows // 20)
+    return pd.DataFrame(
+        {
+            "customer_id": (rng.integers(0, n_customers, n_rows) + 1000).astype(str),
+            "item": np.asarray(ITEMS, dtype=object)[rng.integers(0, len(ITEMS), n_rows)].astype(str),
+            "amount": np.round(rng.lognormal(6.5, 1.2, n_rows), 0),
+            "date": pd.Timestamp("2022-10-01") + pd.to_timedelta(rng.integers(0, 365, n_rows), unit="D"),
+            "rating": np.where(rng.random(n_rows) < 0.1, np.nan, np.round(rng.uniform(1, 5, n_rows), 1)),
+            "payment_method": np.asarray(PAYMENT, dtype=object)[rng.integers(0, 2, n_rows)].astype(str),
+        }
+    )
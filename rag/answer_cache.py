@@ -0,0 +1,131 @@
+from __future__ import annotations
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from rag.search import RAGHit
+
+# Cosine similarity (normalized embeddings) a cached question must reach to be reused.
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_ENTRIES = int(os.getenv("ANSWER_CACHE_ENTRIES", "256"))  # per (tier, mode, model, chunks) key
+ANSWER_CACHE_KEYS = int(os.getenv("ANSWER_CACHE_KEYS", "4096"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "86400"))
+# Similarity cut-offs reported in stats() so the threshold can be tuned on replayed traffic.
+REPORT_THRESHOLDS = (0.80, 0.85, 0.88, 0.90, 0.92, 0.94, 0.96, 0.98)
+# Client context fields that src.prompts.chat_prompt writes into the prompt. Nothing
+# customer-specific goes in, so one answer serves every customer with the same tier and mode.
+PROMPT_FIELDS = ("tier", "mode")
+
+
+def prompt_key(ctx: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(ctx.get(name) or "").lower() for name in PROMPT_FIELDS)
+
+
+def chunk_set_key(hits: Sequence[RAGHit]) -> str:
+    # Order-insensitive and content-based, so a re-ingested chunk with new text never matches.
+    h = hashlib.sha1()
+    for cite, text in sorted((hit.cite(), hit.text) for hit in hits):
+        h.update(cite.encode("utf-8"))
+        h.update(b"\0")
+        h.update(text.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@dataclass
+class _Bucket:
+    index: faiss.Index
+    answers: List[Tuple[str, str, str, float]] = field(default_factory=list)  # question, answer, model, created
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_ENTRIES,
+        max_keys: int = ANSWER_CACHE_KEYS,
+        ttl_s: float = ANSWER_CACHE_TTL_S,
+    ) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_keys = max_keys
+        self.ttl_s = ttl_s
+        self._buckets: "OrderedDict[Tuple[str, ...], _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Best similarity seen on each lookup, for the would-hit report.
+        self._best: List[float] = []
+
+    def lookup(self, vec: np.ndarray, ctx: Dict[str, Any], model: str | None, hits: Sequence[RAGHit]):
+        key = (*prompt_key(ctx), model or "", chunk_set_key(hits))
+        q = np.asarray(vec, dtype="float32").reshape(1, -1)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            best, found = -1.0, None
+            if bucket is not None and bucket.index.ntotal:
+                self._buckets.move_to_end(key)
+                scores, ids = bucket.index.search(q, 1)
+                best = float(scores[0, 0])
+                question, answer, model_used, created = bucket.answers[int(ids[0, 0])]
+                if best >= self.threshold and (self.ttl_s <= 0 or time.time() - created <= self.ttl_s):
+                    found = {"answer": answer, "model_used": model_used, "question": question, "similarity": best}
+            self._best.append(best)
+            if len(self._best) > 100_000:
+                del self._best[:50_000]
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return found
+
+    def put(self, vec: np.ndarray, ctx: Dict[str, Any], model: str | None, hits: Sequence[RAGHit],
+            question: str, answer: str, model_used: str) -> None:
+        key = (*prompt_key(ctx), model or "", chunk_set_key(hits))
+        q = np.asarray(vec, dtype="float32").reshape(1, -1)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(faiss.IndexFlatIP(q.shape[1]))
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            if bucket.index.ntotal >= self.max_entries:
+                # Drop the oldest half; flat indexes are cheap to rebuild at this size.
+                keep = self.max_entries // 2
+                vecs = bucket.index.reconstruct_n(bucket.index.ntotal - keep, keep)
+                bucket.index.reset()
+                bucket.index.add(vecs)
+                bucket.answers = bucket.answers[-keep:]
+            bucket.index.add(q)
+            bucket.answers.append((question, answer, model_used, time.time()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._best.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            best = np.asarray(self._best, dtype="float32")
+            return {
+                "threshold": self.threshold,
+                "keys": len(self._buckets),
+                "entries": sum(b.index.ntotal for b in self._buckets.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                # Share of recorded lookups whose nearest cached question reached each cut-off.
+                "would_hit_ratio": {
+                    f"{t:.2f}": float((best >= t).mean()) if best.size else 0.0 for t in REPORT_THRESHOLDS
+                },
+            }
@@ -0,0 +1,73 @@
+from __future__ import annotations
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, TextIO
+
+from rag.search import ENCODE_BATCH_SIZE, get_retriever
+
+
+def read_queries(r: TextIO) -> Iterator[Dict[str, Any]]:
+    # Accepts {"id": ..., "query": ...} objects or bare JSON strings, one per line.
+    for n, line in enumerate(r):
+        line = line.strip()
+        if not line:
+            continue
+        obj = json.loads(line)
+        if isinstance(obj, str):
+            obj = {"query": obj}
+        obj.setdefault("id", n)
+        yield obj
+
+
+def _batches(items: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def run(r: TextIO, w: TextIO, k: int = 5, batch_size: int = ENCODE_BATCH_SIZE) -> int:
+    retriever = get_retriever()
+    n = 0
+    for batch in _batches(read_queries(r), batch_size):
+        results = retriever.search_many([q["query"] for q in batch], k=k, batch_size=batch_size)
+        for q, hits in zip(batch, results):
+            w.write(
+                json.dumps(
+                    {"id": q["id"], "query": q["query"], "hits": [asdict(h) for h in hits]},
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+        n += len(batch)
+    return n
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Search the policy index for every query in a JSONL file.")
+    ap.add_argument("input", help="JSONL file of queries, or - for stdin")
+    ap.add_argument("-o", "--output", default="-", help="JSONL file for hits, or - for stdout")
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    args = ap.parse_args()
+
+    r = sys.stdin if args.input == "-" else Path(args.input).open("r", encoding="utf-8")
+    w = sys.stdout if args.output == "-" else Path(args.output).open("w", encoding="utf-8")
+    try:
+        n = run(r, w, k=args.k, batch_size=args.batch_size)
+    finally:
+        if r is not sys.stdin:
+            r.close()
+        if w is not sys.stdout:
+            w.close()
+    print(f"Searched {n} queries", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import importlib.util
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+# Bumped when chunk boundaries change; ingest rebuilds indexes made with another version.
+CHUNKER_VERSION = 2
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")  # markdown horizontal rule
+# Sentence end: .!? followed by whitespace and something that can start a sentence.
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[*]?[A-Z0-9])")
+
+
+def clean_text(s: str) -> str:
+    s = s.replace("\r", "\n")
+    s = re.sub(r"\n{3,}", "\n\n", s)
+    s = re.sub(r"[ \t]{2,}", " ", s)
+    return s.strip()
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in SENTENCE_RE.split(text) if s.strip()]
+
+
+def _blocks(text: str) -> List[Tuple[int, str]]:
+    # (heading level, heading line) for headings, (0, paragraph) for everything else.
+    out: List[Tuple[int, str]] = []
+    para: List[str] = []
+
+    def end_para():
+        if para:
+            out.append((0, "\n".join(para)))
+            para.clear()
+
+    for line in text.split("\n"):
+        m = HEADING_RE.match(line)
+        if m:
+            end_para()
+            out.append((len(m.group(1)), line.strip()))
+        elif not line.strip() or RULE_RE.match(line):
+            end_para()
+        else:
+            para.append(line.rstrip())
+    end_para()
+    return out
+
+
+def _pieces(para: str, limit: int) -> List[Tuple[str, str]]:
+    # (separator, text) pieces of at most `limit` chars: whole paragraph, else its
+    # lines (list items), else sentences, else words.
+    if len(para) <= limit:
+        return [("\n\n", para)]
+    out: List[Tuple[str, str]] = []
+    for i, line in enumerate(para.split("\n")):
+        sep = "\n\n" if i == 0 else "\n"
+        if len(line) <= limit:
+            out.append((sep, line))
+            continue
+        for s in split_sentences(line):
+            while len(s) > limit:
+                cut = s.rfind(" ", 0, limit)
+                cut = cut if cut > 0 else limit
+                out.append((sep, s[:cut].rstrip()))
+                s, sep = s[cut:].lstrip(), " "
+            if s:
+                out.append((sep, s))
+            sep = " "
+    return out
+
+
+def chunk_text(text: str, chunk_size: int = 900, overlap: int = 180) -> List[str]:
+    # Packs whole paragraphs, list items or sentences into chunks of about `chunk_size`
+    # chars. Small sections share a chunk; a chunk that is already a third full
+    # ends at the next heading. A section split across chunks repeats its heading
+    # path at the top of each continuation, plus up to `overlap` chars of the
+    # previous chunk's trailing sentences.
+    text = clean_text(text)
+    chunks: List[str] = []
+    cur: List[Tuple[str, str, int]] = []  # (separator, text, heading level or 0)
+    trail: List[Tuple[int, str]] = []
+    min_fill = chunk_size // 3
+
+    def size(units) -> int:
+        return sum(len(sep) + len(t) for sep, t, _ in units)
+
+    def emit(units) -> None:
+        if any(level == 0 for _, _, level in units):
+            out, prev = [], 1
+            for sep, t, level in units:
+                out.append(("\n" if prev and sep == " " else sep) + t)
+                prev = level
+            chunks.append("".join(out).strip())
+
+    for level, block in _blocks(text):
+        if level:
+            if size(cur) >= min_fill:
+                emit(cur)
+                cur = []
+            trail = [h for h in trail if h[0] < level] + [(level, block)]
+            cur.append(("\n\n", block, level))
+            continue
+
+        for sep, piece in _pieces(block, chunk_size):
+            if cur and size(cur) + len(sep) + len(piece) > chunk_size:
+                # Headings at the end move to the next chunk with the section they open.
+                k = len(cur)
+                while k and cur[k - 1][2]:
+                    k -= 1
+                head, moved = cur[:k], cur[k:]
+                emit(head)
+                if moved:
+                    cur = moved
+                else:
+                    tail: List[Tuple[str, str, int]] = []
+                    for u in reversed(head):
+                        if u[2] or size(tail) + len(u[0]) + len(u[1]) > overlap:
+                            break
+                        tail.insert(0, u)
+                    # Sub-sections drop the document title (the citation carries it).
+                    path = [("\n", h, lv) for lv, h in trail if lv > 1 or len(trail) == 1]
+                    cur = path + tail
+                    if cur and size(cur) + len(sep) + len(piece) > chunk_size:
+                        cur = path
+            cur.append((sep, piece, 0))
+    emit(cur)
+    return chunks
+
+
+class _HTMLText(HTMLParser):
+    # Visible text with h1-h6 turned into markdown headings and block tags into paragraphs.
+    BLOCKS = {"p", "div", "section", "article", "br", "tr", "table", "ul", "ol", "pre", "blockquote"}
+    SKIP = {"script", "style", "head", "title", "noscript"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif re.fullmatch(r"h[1-6]", tag):
+            self.parts.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag == "li":
+            self.parts.append("\n* ")
+        elif tag in self.BLOCKS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip = max(0, self._skip - 1)
+        elif re.fullmatch(r"h[1-6]", tag) or tag in self.BLOCKS:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(re.sub(r"\s+", " ", data))
+
+
+def html_to_text(raw: str) -> str:
+    p = _HTMLText()
+    p.feed(raw)
+    p.close()
+    lines = [ln.strip() for ln in "".join(p.parts).split("\n")]
+    return clean_text("\n".join(lines))
+
+
+def _read_pdf(path: Path) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise RuntimeError(f"{path.name}: reading PDFs needs `pip install pypdf`") from e
+    return "\n\n".join(page.extract_text() or "" for page in PdfReader(str(path)).pages)
+
+
+READERS: Dict[str, Callable[[Path], str]] = {
+    ".md": lambda p: p.read_text(encoding="utf-8"),
+    ".markdown": lambda p: p.read_text(encoding="utf-8"),
+    ".txt": lambda p: p.read_text(encoding="utf-8"),
+    ".html": lambda p: html_to_text(p.read_text(encoding="utf-8")),
+    ".htm": lambda p: html_to_text(p.read_text(encoding="utf-8")),
+}
+# Formats whose reader needs an optional package: (package, reader). Registered in
+# READERS only when the package is installed; ingest skips the rest with a warning.
+OPTIONAL_READERS: Dict[str, Tuple[str, Callable[[Path], str]]] = {
+    ".pdf": ("pypdf", _read_pdf),
+}
+for _suffix, (_package, _reader) in OPTIONAL_READERS.items():
+    if importlib.util.find_spec(_package) is not None:
+        READERS[_suffix] = _reader
+
+
+def read_document(path: Path) -> str:
+    return READERS[path.suffix.lower()](path)
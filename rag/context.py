@@ -0,0 +1,163 @@
+from __future__ import annotations
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Sequence, Tuple
+
+from rag.chunking import HEADING_RE
+from rag.search import RAGHit
+
+# Prompt budget for the policy context, set from retrieval rather than model routing:
+# with k=6 hits it keeps every deduplicated hit on the policy docs
+# (python -m bench.context_budget). src.llm._pick_model routes on the length of the
+# context actually built, so most /chat calls with several hits go to the larger model.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "900"))
+# Shingle Jaccard similarity above which a lower-ranked hit is dropped as a near-duplicate.
+DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+MIN_OVERLAP_CHARS = 20
+# A hit that doesn't fit whole is still trimmed in if at least this much budget is left.
+MIN_BLOCK_TOKENS = 64
+SHINGLE = 5  # words
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class ContextBlock:
+    doc_id: str
+    doc_title: str
+    chunk_ids: List[int]
+    text: str
+    score: float
+    rank: int  # best retrieval rank among the merged hits
+    truncated: bool = False
+    hits: List[RAGHit] = field(default_factory=list, repr=False)
+
+    def cite(self) -> str:
+        lo, hi = min(self.chunk_ids), max(self.chunk_ids)
+        span = f"chunk{lo}" if lo == hi else f"chunk{lo}-{hi}"
+        return f"{self.doc_id}#{span} ({self.doc_title})"
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def continuation(a: str, b: str) -> str:
+    # b without the heading lines it repeats from a: the chunker starts a continuation
+    # chunk with its section's heading path, one line each with no blank line after
+    # (a heading that opens a new section is followed by one, and is kept).
+    seen = set(a.split("\n"))
+    lines = b.split("\n")
+    i = 0
+    while i + 1 < len(lines) and HEADING_RE.match(lines[i]) and lines[i] in seen and lines[i + 1].strip():
+        i += 1
+    return "\n".join(lines[i:]) if i else b
+
+
+def merge_overlap(a: str, b: str) -> str | None:
+    # a + b with the longest suffix of a that prefixes b written once; None if they don't overlap.
+    if a in b:
+        return b
+    b = continuation(a, b)
+    if b in a:
+        return a
+    for n in range(min(len(a), len(b)), MIN_OVERLAP_CHARS - 1, -1):
+        if a.endswith(b[:n]):
+            return a + b[n:]
+    return None
+
+
+def dedupe_hits(hits: Sequence[RAGHit], threshold: float = DEDUP_THRESHOLD) -> List[Tuple[int, RAGHit]]:
+    # Keeps (rank, hit) for hits that are not contained in / near-identical to a better-ranked one.
+    kept: List[Tuple[int, RAGHit, set]] = []
+    for rank, h in enumerate(hits):
+        sh = _shingles(h.text)
+        if any(h.text in k.text or _jaccard(sh, ksh) >= threshold for _, k, ksh in kept):
+            continue
+        kept.append((rank, h, sh))
+    return [(rank, h) for rank, h, _ in kept]
+
+
+def merge_blocks(ranked: Sequence[Tuple[int, RAGHit]]) -> List[ContextBlock]:
+    # Same-document hits with adjacent chunk ids become one block, with the chunker's
+    # overlap written once. Blocks come back in retrieval-rank order.
+    by_doc: dict = {}
+    for rank, h in ranked:
+        by_doc.setdefault(h.doc_id, []).append((rank, h))
+
+    blocks: List[ContextBlock] = []
+    for doc_hits in by_doc.values():
+        doc_hits.sort(key=lambda rh: rh[1].chunk_id)
+        cur: ContextBlock | None = None
+        for rank, h in doc_hits:
+            merged = None
+            if cur is not None and h.chunk_id - max(cur.chunk_ids) <= 1:
+                merged = merge_overlap(cur.text, h.text) or cur.text + "\n\n" + continuation(cur.text, h.text)
+            if merged is not None:
+                cur.text = merged
+                cur.chunk_ids.append(h.chunk_id)
+                cur.score = max(cur.score, h.score)
+                cur.rank = min(cur.rank, rank)
+                cur.hits.append(h)
+                continue
+            if cur is not None:
+                blocks.append(cur)
+            cur = ContextBlock(h.doc_id, h.doc_title, [h.chunk_id], h.text, h.score, rank, hits=[h])
+        if cur is not None:
+            blocks.append(cur)
+    blocks.sort(key=lambda b: b.rank)
+    return blocks
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    # Cut at the last sentence end that fits, else at a word boundary.
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    cut = max(head.rfind(". "), head.rfind("? "), head.rfind("! "), head.rfind("\n"))
+    if cut < max_chars // 2:
+        cut = head.rfind(" ")
+    return head[: cut + 1 if cut > 0 else max_chars].rstrip()
+
+
+def _render(blocks: Sequence[ContextBlock]) -> str:
+    return "\n".join(f"[{i}] {b.cite()}\n{b.text}\n" for i, b in enumerate(blocks, start=1)).strip()
+
+
+def build_context(
+    hits: Sequence[RAGHit],
+    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+    dedup_threshold: float = DEDUP_THRESHOLD,
+) -> Tuple[str, List[ContextBlock]]:
+    # Returns the prompt context and its blocks in citation order. Hits are added best
+    # first while the merged context fits the budget; [n] in the context is blocks[n-1],
+    # so block.cite() lines up with the numbers the model is told to use.
+    chosen: List[Tuple[int, RAGHit]] = []
+    blocks: List[ContextBlock] = []
+    for rank, h in dedupe_hits(hits, dedup_threshold):
+        trial = merge_blocks(chosen + [(rank, h)])
+        if estimate_tokens(_render(trial)) <= budget_tokens:
+            chosen.append((rank, h))
+            blocks = trial
+            continue
+        left = budget_tokens - (estimate_tokens(_render(blocks)) if blocks else 0)
+        if blocks and left < MIN_BLOCK_TOKENS:
+            continue
+        # Trim the hit to what is left, as its own block (never merged into a neighbour).
+        b = ContextBlock(h.doc_id, h.doc_title, [h.chunk_id], "", h.score, rank, truncated=True, hits=[h])
+        overhead = estimate_tokens(_render(blocks + [b])) - (estimate_tokens(_render(blocks)) if blocks else 0)
+        b.text = _truncate(h.text, max(0, left - overhead) * 4)
+        if b.text:
+            blocks = sorted(blocks + [b], key=lambda x: x.rank)
+            break  # the budget is spent
+    return _render(blocks), blocks
@@ -0,0 +1,80 @@
+from __future__ import annotations
+from typing import Any, Dict
+import faiss
+import numpy as np
+
+# All indexes use inner product over normalized embeddings (cosine similarity)
+# and are wrapped in IndexIDMap2 so chunks keep stable FAISS ids.
+INDEX_KINDS = ("flat", "ivf", "hnsw", "pq", "sq8")
+
+DEFAULT_PARAMS: Dict[str, Dict[str, Any]] = {
+    "flat": {},
+    "ivf": {"nlist": 1024, "nprobe": 16},
+    "hnsw": {"M": 32, "ef_construction": 200, "ef_search": 64},
+    "pq": {"m": 48, "nbits": 8},
+    "sq8": {},
+}
+
+# FAISS warns below ~39 training points per centroid.
+MIN_POINTS_PER_CENTROID = 39
+
+
+def resolve_params(kind: str, params: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"unknown index kind {kind!r}; expected one of {INDEX_KINDS}")
+    out = dict(DEFAULT_PARAMS[kind])
+    out.update({k: v for k, v in (params or {}).items() if v is not None and k in out})
+    return out
+
+
+def supports_remove(kind: str) -> bool:
+    return kind != "hnsw"
+
+
+def build_index(kind: str, train: np.ndarray, params: Dict[str, Any] | None = None) -> faiss.Index:
+    # Builds (and trains, if needed) an empty index sized for `train`; vectors are added by the caller.
+    p = resolve_params(kind, params)
+    n, dim = train.shape
+    ip = faiss.METRIC_INNER_PRODUCT
+
+    if kind == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif kind == "ivf":
+        nlist = max(1, min(int(p["nlist"]), n // MIN_POINTS_PER_CENTROID))
+        base = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, ip)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, int(p["M"]), ip)
+        base.hnsw.efConstruction = int(p["ef_construction"])
+    elif kind == "pq":
+        m = int(p["m"])
+        if dim % m:
+            raise ValueError(f"pq: m={m} must divide the embedding dimension {dim}")
+        nbits = int(p["nbits"])
+        while nbits > 1 and n < MIN_POINTS_PER_CENTROID * (1 << nbits):
+            nbits -= 1
+        base = faiss.IndexPQ(dim, m, nbits, ip)
+    else:
+        base = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, ip)
+
+    if not base.is_trained:
+        base.train(train)
+    index = faiss.IndexIDMap2(base)
+    set_search_params(index, p)
+    return index
+
+
+def read_index(path, mmap: bool = False) -> faiss.Index:
+    # mmap: vector storage (flat/sq8/pq codes, HNSW storage, IVF lists) stays in the
+    # file's pages, shared between processes that open the same file. Read-only.
+    if not mmap:
+        return faiss.read_index(str(path))
+    flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)  # MMAP_IFC: faiss >= 1.8
+    return faiss.read_index(str(path), flag | faiss.IO_FLAG_READ_ONLY)
+
+
+def set_search_params(index: faiss.Index, params: Dict[str, Any]) -> None:
+    base = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if params.get("nprobe") is not None and hasattr(base, "nprobe"):
+        base.nprobe = int(params["nprobe"])
+    if params.get("ef_search") is not None and hasattr(base, "hnsw"):
+        base.hnsw.efSearch = int(params["ef_search"])
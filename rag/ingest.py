@@ -1,41 +1,41 @@
 from __future__ import annotations
+import argparse
+import hashlib
 import json
-import re
-from dataclasses import dataclass
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterator, List, Tuple
 import faiss
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from rag.chunking import CHUNKER_VERSION, OPTIONAL_READERS, READERS, chunk_text, read_document
+from rag.index_types import INDEX_KINDS, MIN_POINTS_PER_CENTROID, build_index, resolve_params, supports_remove
+from rag.lexical import LexicalIndex
+from rag.meta_store import MetaStore, write_meta_store
+
 
 DOC_DIR = Path("docs")
 
 
 OUT_DIR = Path("dat/out")
 INDEX_PATH = OUT_DIR / "rag.faiss"
-META_PATH = OUT_DIR / "rag_meta.jsonl"
+META_PATH = OUT_DIR / "rag_meta.bin"
+MANIFEST_PATH = OUT_DIR / "rag_manifest.json"
+LEXICAL_PATH = OUT_DIR / "rag_bm25.npz"
 
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
-
-def clean_text(s: str) -> str:
-    s = s.replace("\r", "\n")
-    s = re.sub(r"\n{3,}", "\n\n", s)
-    s = re.sub(r"[ \t]{2,}", " ", s)
-    return s.strip()
-
-
-def chunk_text(text: str, chunk_size: int = 900, overlap: int = 180) -> List[str]:
-    text = clean_text(text)
-    chunks: List[str] = []
-    i = 0
-    while i < len(text):
-        j = min(len(text), i + chunk_size)
-        chunk = text[i:j].strip()
-        if chunk:
-            chunks.append(chunk)
-        i = max(j - overlap, i + 1)
-    return chunks
+# Encoding runs in INGEST_WORKERS processes (1 = in this process), each handed
+# INGEST_DOCS_PER_TASK documents at a time; at most two tasks per worker are in
+# flight, so memory stays bounded however large the corpus is.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_DOCS_PER_TASK = int(os.getenv("INGEST_DOCS_PER_TASK", "8"))
+ENCODE_BATCH_SIZE = int(os.getenv("INGEST_ENCODE_BATCH", "64"))
 
 
 def first_markdown_title(raw: str, fallback: str) -> str:
@@ -52,60 +52,321 @@ class ChunkMeta:
     doc_title: str   
     chunk_id: int
     text: str
+    id: int = -1     # FAISS vector id
+
+
+@dataclass
+class IngestReport:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)  # format needs a package that is not installed
+    vectors_added: int = 0
+    vectors_removed: int = 0
+    embed_seconds: float = 0.0
+
+    @property
+    def chunks_per_s(self) -> float:
+        return self.vectors_added / self.embed_seconds if self.embed_seconds else 0.0
+
+    def summary(self) -> str:
+        out = (
+            f"added={len(self.added)} changed={len(self.changed)} "
+            f"deleted={len(self.deleted)} unchanged={len(self.unchanged)} skipped={len(self.skipped)} "
+            f"(+{self.vectors_added}/-{self.vectors_removed} vectors)"
+        )
+        if self.vectors_added:
+            out += f" embedded in {self.embed_seconds:.1f}s ({self.chunks_per_s:.1f} chunks/s)"
+        return out
+
+
+def content_hash(raw: str) -> str:
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def doc_chunks(f: Path, raw: str) -> List[ChunkMeta]:
+    title = first_markdown_title(raw, fallback=f.stem)
+    return [
+        ChunkMeta(doc_id=f.name, doc_title=title, chunk_id=idx, text=ch)
+        for idx, ch in enumerate(chunk_text(raw))
+    ]
+
+
+def list_documents(doc_dir: Path = DOC_DIR) -> List[Path]:
+    return sorted(f for f in doc_dir.iterdir() if f.is_file() and f.suffix.lower() in READERS)
+
+
+def skipped_documents(doc_dir: Path = DOC_DIR) -> List[Path]:
+    # Files of a known format whose optional reader package is missing (e.g. PDF without pypdf).
+    return sorted(
+        f for f in doc_dir.iterdir()
+        if f.is_file() and f.suffix.lower() in OPTIONAL_READERS and f.suffix.lower() not in READERS
+    )
+
+
+_model: SentenceTransformer | None = None
+
+
+def _init_worker(threads: int = 0) -> None:
+    global _model
+    if threads:
+        import torch
+        torch.set_num_threads(threads)  # workers split the cores instead of oversubscribing them
+    _model = SentenceTransformer(MODEL_NAME)
+
+
+def _embed_docs(paths: List[str], batch_size: int) -> List[Tuple[str, str, List[ChunkMeta], np.ndarray]]:
+    # One task: read, chunk and encode a few documents. FAISS ids are assigned by the parent.
+    docs = []
+    for p in paths:
+        f = Path(p)
+        raw = read_document(f)
+        docs.append((f.name, content_hash(raw), doc_chunks(f, raw)))
+    texts = [c.text for _, _, chunks in docs for c in chunks]
+    emb = _model.encode(texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False) if texts else None
+    out, i = [], 0
+    for name, h, chunks in docs:
+        vecs = np.asarray(emb[i:i + len(chunks)], dtype="float32") if chunks else np.zeros((0, 0), dtype="float32")
+        out.append((name, h, chunks, vecs))
+        i += len(chunks)
+    return out
 
 
-def main() -> None:
+def embed_documents(paths: List[Path], workers: int, docs_per_task: int,
+                    batch_size: int) -> Iterator[Tuple[str, str, List[ChunkMeta], np.ndarray]]:
+    # Yields (doc name, content hash, chunks, vectors) in input order.
+    tasks = [[str(p) for p in paths[i:i + docs_per_task]] for i in range(0, len(paths), docs_per_task)]
+    if not tasks:
+        return
+    if workers <= 1:
+        if _model is None:
+            _init_worker()
+        for t in tasks:
+            yield from _embed_docs(t, batch_size)
+        return
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(threads,)) as pool:
+        todo = iter(tasks)
+        pending: deque = deque()
+        for t in todo:
+            pending.append(pool.submit(_embed_docs, t, batch_size))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            done = pending.popleft().result()
+            t = next(todo, None)
+            if t is not None:
+                pending.append(pool.submit(_embed_docs, t, batch_size))
+            yield from done
+
+
+def _train_points(kind: str, params: Dict[str, Any]) -> int:
+    # Vectors to collect before a fresh index is built; trained kinds need a sample first.
+    if kind == "ivf":
+        return int(params["nlist"]) * MIN_POINTS_PER_CENTROID
+    if kind == "pq":
+        return MIN_POINTS_PER_CENTROID * (1 << int(params["nbits"]))
+    if kind == "sq8":
+        return 4096
+    return 1
+
+
+def load_manifest() -> Dict[str, Any] | None:
+    if not MANIFEST_PATH.exists():
+        return None
+    return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+
+
+def _load_meta_rows() -> Dict[int, Dict[str, Any]]:
+    store = MetaStore(META_PATH)
+    try:
+        return {int(m["id"]): m for m in store.rows()}
+    finally:
+        store.close()
+
+
+def _load_previous(rebuild: bool, index_spec: Dict[str, Any]):
+    # Returns (index, meta rows, manifest) from the last run, or None to build from scratch.
+    if rebuild or not INDEX_PATH.exists() or not META_PATH.exists():
+        return None
+    manifest = load_manifest()
+    if not manifest or manifest.get("model") != MODEL_NAME:
+        return None
+    if manifest.get("chunker", 1) != CHUNKER_VERSION:
+        return None
+    if manifest.get("index", {"kind": "flat", "params": {}}) != index_spec:
+        return None
+    index = faiss.read_index(str(INDEX_PATH))
+    if not isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return None
+    if index.ntotal == 0:
+        return None  # an empty corpus placeholder (flat); build the configured kind afresh
+    return index, _load_meta_rows(), manifest
+
+
+def _rebuild_without(index: faiss.Index, keep_ids: List[int], kind: str, params: Dict[str, Any]) -> faiss.Index | None:
+    # For index types without remove_ids (HNSW): rebuild from the stored vectors, no re-encoding.
+    if not keep_ids:
+        return None
+    ids = np.asarray(keep_ids, dtype="int64")
+    vecs = np.vstack([index.reconstruct(int(i)) for i in ids]).astype("float32")
+    fresh = build_index(kind, vecs, params)
+    fresh.add_with_ids(vecs, ids)
+    return fresh
+
+
+def _empty_index(dim: int | None) -> faiss.Index:
+    # Written when no vectors are left, so deleted documents stop matching. Flat needs
+    # no training; the next ingest with documents builds the configured kind.
+    if dim is None:
+        if _model is None:
+            _init_worker()
+        dim = _model.get_sentence_embedding_dimension()
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+
+def _index_from(batches: List[Tuple[np.ndarray, np.ndarray]], kind: str, params: Dict[str, Any]) -> faiss.Index:
+    emb = np.vstack([e for e, _ in batches])
+    index = build_index(kind, emb, params)
+    index.add_with_ids(emb, np.concatenate([i for _, i in batches]))
+    return index
+
+
+def main(rebuild: bool = False, index_kind: str = "flat", index_params: Dict[str, Any] | None = None,
+         workers: int | None = None, docs_per_task: int | None = None, batch_size: int | None = None) -> IngestReport:
     OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-    md_files = sorted(DOC_DIR.glob("*.md"))
-
-    model = SentenceTransformer(MODEL_NAME)
-
-    all_chunks: List[ChunkMeta] = []
-    for f in md_files:
-        raw = f.read_text(encoding="utf-8")
-        title = first_markdown_title(raw, fallback=f.stem)
-        chunks = chunk_text(raw)
-
-        for idx, ch in enumerate(chunks):
-            all_chunks.append(
-                ChunkMeta(
-                    doc_id=f.name,
-                    doc_title=title,
-                    chunk_id=idx,
-                    text=ch,
-                )
-            )
-
-    texts = [c.text for c in all_chunks]
-    emb = model.encode(texts, normalize_embeddings=True, show_progress_bar=True)
-    emb = emb.astype("float32")
-
-    dim = emb.shape[1]
-    index = faiss.IndexFlatIP(dim)  # cosine similarity via normalized embeddings
-    index.add(emb)
-
-    faiss.write_index(index, str(INDEX_PATH))
-
-    with META_PATH.open("w", encoding="utf-8") as w:
-        for c in all_chunks:
-            w.write(
-                json.dumps(
-                    {
-                        "doc_id": c.doc_id,
-                        "doc_title": c.doc_title,
-                        "chunk_id": c.chunk_id,
-                        "text": c.text,
-                    },
-                    ensure_ascii=False,
-                )
-                + "\n"
-            )
-
-    print(f"Built index: {INDEX_PATH} (vectors={index.ntotal}, dim={dim})")
-    print(f"Wrote metadata: {META_PATH} (chunks={len(all_chunks)})")
+    # Only hashes are kept here; documents are read again, one task at a time, by the workers.
+    current = {f.name: f for f in list_documents()}
+    hashes = {name: content_hash(read_document(f)) for name, f in current.items()}
+
+    index_spec = {"kind": index_kind, "params": resolve_params(index_kind, index_params)}
+    previous = _load_previous(rebuild, index_spec)
+    if previous is None:
+        index, meta_rows = None, {}
+        manifest = {"model": MODEL_NAME, "chunker": CHUNKER_VERSION, "index": index_spec, "next_id": 0, "docs": {}}
+    else:
+        index, meta_rows, manifest = previous
+    docs: Dict[str, Any] = manifest["docs"]
+    dim = index.d if index is not None else None
+
+    report = IngestReport()
+    to_embed: List[str] = []
+    for name, h in hashes.items():
+        if name not in docs:
+            report.added.append(name)
+            to_embed.append(name)
+        elif docs[name]["sha256"] != h:
+            report.changed.append(name)
+            to_embed.append(name)
+        else:
+            report.unchanged.append(name)
+    # A skipped file is still there: keep whatever an earlier run indexed from it.
+    report.skipped = [f.name for f in skipped_documents()]
+    report.deleted = sorted(set(docs) - set(current) - set(report.skipped))
+
+    stale_ids: List[int] = []
+    for name in report.changed + report.deleted:
+        stale_ids.extend(docs.pop(name)["ids"])
+    if stale_ids and index is not None:
+        stale = set(stale_ids)
+        if supports_remove(index_kind):
+            report.vectors_removed = int(index.remove_ids(np.asarray(stale_ids, dtype="int64")))
+        else:
+            keep = [i for i in sorted(meta_rows) if i not in stale]
+            report.vectors_removed = len(meta_rows) - len(keep)
+            index = _rebuild_without(index, keep, index_kind, index_spec["params"])
+        for i in stale:
+            meta_rows.pop(i, None)
+
+    # Vectors go into the index as each task finishes. A new index of a trained kind
+    # first buffers a training sample (bounded by _train_points), then adds directly.
+    next_id = int(manifest["next_id"])
+    train_points = _train_points(index_kind, index_spec["params"])
+    buffered: List[Tuple[np.ndarray, np.ndarray]] = []
+    n_buffered = 0
+    t0 = last_print = time.perf_counter()
+    stream = embed_documents(
+        [current[name] for name in to_embed],
+        workers=INGEST_WORKERS if workers is None else workers,
+        docs_per_task=docs_per_task or INGEST_DOCS_PER_TASK,
+        batch_size=batch_size or ENCODE_BATCH_SIZE,
+    )
+    for n_docs, (name, h, chunks, emb) in enumerate(stream, start=1):
+        for c in chunks:
+            c.id = next_id
+            next_id += 1
+            meta_rows[c.id] = asdict(c)
+        docs[name] = {"sha256": h, "ids": [c.id for c in chunks]}
+        report.vectors_added += len(chunks)
+        if chunks:
+            ids = np.asarray([c.id for c in chunks], dtype="int64")
+            if index is None:
+                buffered.append((emb, ids))
+                n_buffered += len(ids)
+                if n_buffered >= train_points:
+                    index = _index_from(buffered, index_kind, index_spec["params"])
+                    buffered, n_buffered = [], 0
+            else:
+                index.add_with_ids(emb, ids)
+        now = time.perf_counter()
+        if now - last_print >= 5 or n_docs == len(to_embed):
+            last_print = now
+            print(f"  embedded {n_docs}/{len(to_embed)} docs, {report.vectors_added} chunks "
+                  f"({report.vectors_added / max(now - t0, 1e-9):.1f} chunks/s)")
+    if buffered:
+        index = _index_from(buffered, index_kind, index_spec["params"])
+    report.embed_seconds = time.perf_counter() - t0 if to_embed else 0.0
+    manifest["next_id"] = next_id
+
+    if index is None:
+        # Empty corpus, or every vector removed: still replace the old files below.
+        index = _empty_index(dim)
+
+    changed = bool(report.vectors_added or report.vectors_removed or previous is None)
+    # Every file is written beside its target and renamed into place, manifest last,
+    # so a running API that hot-reloads never reads a half-written index.
+    if changed:
+        tmp = INDEX_PATH.with_name(INDEX_PATH.name + ".tmp")
+        faiss.write_index(index, str(tmp))
+        os.replace(tmp, INDEX_PATH)
+        write_meta_store(META_PATH, meta_rows.values())
+    if changed or not LEXICAL_PATH.exists():
+        # BM25 postings are cheap to rebuild in full from the chunk text.
+        LexicalIndex.build(meta_rows.values()).save(LEXICAL_PATH)
+    if changed:
+        tmp = MANIFEST_PATH.with_name(MANIFEST_PATH.name + ".tmp")
+        tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        os.replace(tmp, MANIFEST_PATH)
+
+    print(f"Ingest: {report.summary()}")
+    for label in ("added", "changed", "deleted"):
+        for name in getattr(report, label):
+            print(f"  {label}: {name}")
+    for name in report.skipped:
+        package = OPTIONAL_READERS[Path(name).suffix.lower()][0]
+        print(f"  skipped: {name} (needs `pip install {package}`)")
+    print(f"Index: {INDEX_PATH} ({index_kind}, vectors={index.ntotal}, dim={index.d})")
+    print(f"Metadata: {META_PATH} (chunks={len(meta_rows)})")
     print("Done. You can now run: python -m rag.search_demo")
+    return report
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="Build or incrementally update the policy RAG index.")
+    ap.add_argument("--rebuild", action="store_true", help="ignore the manifest and re-embed every document")
+    ap.add_argument("--index", choices=INDEX_KINDS, default="flat", help="FAISS index type")
+    ap.add_argument("--nlist", type=int, help="ivf: number of inverted lists")
+    ap.add_argument("--nprobe", type=int, help="ivf: lists probed per query")
+    ap.add_argument("--hnsw-m", dest="M", type=int, help="hnsw: graph degree")
+    ap.add_argument("--ef-construction", type=int, help="hnsw: build-time beam width")
+    ap.add_argument("--ef-search", type=int, help="hnsw: query-time beam width")
+    ap.add_argument("--pq-m", dest="m", type=int, help="pq: number of sub-quantizers")
+    ap.add_argument("--pq-nbits", dest="nbits", type=int, help="pq: bits per sub-quantizer code")
+    ap.add_argument("--workers", type=int, help=f"encoding processes (default {INGEST_WORKERS}; 1 = in-process)")
+    ap.add_argument("--docs-per-task", type=int, help=f"documents per worker task (default {INGEST_DOCS_PER_TASK})")
+    ap.add_argument("--batch-size", type=int, help=f"encoder batch size (default {ENCODE_BATCH_SIZE})")
+    args = ap.parse_args()
+    main(rebuild=args.rebuild, index_kind=args.index, index_params=vars(args),
+         workers=args.workers, docs_per_task=args.docs_per_task, batch_size=args.batch_size)
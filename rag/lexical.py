@@ -0,0 +1,109 @@
+from __future__ import annotations
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+import numpy as np
+
+# Keep numbers and simple hyphenated terms ("14", "14-day") as tokens.
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "i", "if",
+    "in", "is", "it", "my", "of", "on", "or", "the", "to", "what", "with", "you", "your",
+}
+
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    def __init__(self, vocab: np.ndarray, df: np.ndarray, offsets: np.ndarray,
+                 post_ids: np.ndarray, post_tf: np.ndarray, doc_len: np.ndarray) -> None:
+        self.vocab = {t: i for i, t in enumerate(vocab.tolist())}
+        self.df = df
+        self.offsets = offsets
+        self.post_ids = post_ids
+        self.post_tf = post_tf
+        self.doc_len = doc_len  # indexed by FAISS id, 0 for unused ids
+        self.n_docs = int((doc_len > 0).sum())
+        self.avgdl = float(doc_len[doc_len > 0].mean()) if self.n_docs else 0.0
+        self.idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]]) -> "LexicalIndex":
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        lengths: Dict[int, int] = {}
+        for m in rows:
+            idx = int(m["id"])
+            toks = tokenize(f'{m.get("doc_title", "")} {m["text"]}')
+            lengths[idx] = max(1, len(toks))
+            for t, tf in Counter(toks).items():
+                postings.setdefault(t, []).append((idx, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype="int64")
+        ids: List[int] = []
+        tfs: List[int] = []
+        for i, t in enumerate(terms):
+            plist = postings[t]
+            ids.extend(p[0] for p in plist)
+            tfs.extend(p[1] for p in plist)
+            offsets[i + 1] = len(ids)
+        doc_len = np.zeros(max(lengths, default=-1) + 1, dtype="float32")
+        for idx, n in lengths.items():
+            doc_len[idx] = n
+        return cls(
+            vocab=np.array(terms, dtype=str),
+            df=np.diff(offsets).astype("float32"),
+            offsets=offsets,
+            post_ids=np.asarray(ids, dtype="int64"),
+            post_tf=np.asarray(tfs, dtype="float32"),
+            doc_len=doc_len,
+        )
+
+    def save(self, path: Path) -> None:
+        terms = sorted(self.vocab, key=self.vocab.get)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(
+            tmp, vocab=np.array(terms, dtype=str), df=self.df, offsets=self.offsets,
+            post_ids=self.post_ids, post_tf=self.post_tf, doc_len=self.doc_len,
+        )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "LexicalIndex":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(**{k: z[k] for k in ("vocab", "df", "offsets", "post_ids", "post_tf", "doc_len")})
+
+    def search(self, query: str, k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        scores = np.zeros(len(self.doc_len), dtype="float32")
+        for t in set(tokenize(query)):
+            i = self.vocab.get(t)
+            if i is None:
+                continue
+            lo, hi = self.offsets[i], self.offsets[i + 1]
+            ids = self.post_ids[lo:hi]
+            tf = self.post_tf[lo:hi]
+            norm = K1 * (1.0 - B + B * self.doc_len[ids] / self.avgdl)
+            scores[ids] += self.idf[i] * tf * (K1 + 1.0) / (tf + norm)
+
+        hit = np.flatnonzero(scores > 0)
+        if len(hit) > k:
+            hit = hit[np.argpartition(-scores[hit], k - 1)[:k]]
+        hit = hit[np.argsort(-scores[hit], kind="stable")]
+        return scores[hit], hit.astype("int64")
+
+
+def rrf_fuse(rankings: List[np.ndarray], k: int, c: int = 60) -> List[Tuple[int, float]]:
+    # Reciprocal rank fusion: score(d) = sum over rankings of 1 / (c + rank(d)).
+    fused: Dict[int, float] = {}
+    for ranked in rankings:
+        for rank, idx in enumerate(ranked.tolist(), start=1):
+            if idx < 0:
+                continue
+            fused[idx] = fused.get(idx, 0.0) + 1.0 / (c + rank)
+    return sorted(fused.items(), key=lambda kv: -kv[1])[:k]
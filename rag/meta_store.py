@@ -0,0 +1,121 @@
+from __future__ import annotations
+import argparse
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List
+import numpy as np
+
+# Layout (little endian):
+#   magic (8s) | n_slots (u8) | doc_table_len (u8) | doc_table JSON [[doc_id, doc_title], ...]
+#   padding to 8 bytes | slot table: n_slots x SLOT_DTYPE, indexed by FAISS id | UTF-8 text blob
+MAGIC = b"RAGMETA1"
+HEADER = struct.Struct("<8sQQ")
+SLOT_DTYPE = np.dtype(
+    [("offset", "<u8"), ("length", "<u4"), ("doc", "<i4"), ("chunk_id", "<i4"), ("_pad", "<u4")]
+)
+
+
+def _align8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def write_meta_store(path: Path, rows: Iterable[Dict[str, Any]]) -> int:
+    rows = sorted(rows, key=lambda m: int(m["id"]))
+    n_slots = int(rows[-1]["id"]) + 1 if rows else 0
+
+    doc_index: Dict[tuple, int] = {}
+    slots = np.zeros(n_slots, dtype=SLOT_DTYPE)
+    slots["doc"] = -1
+    texts: List[bytes] = []
+    offset = 0
+    for m in rows:
+        key = (m["doc_id"], m["doc_title"])
+        doc = doc_index.setdefault(key, len(doc_index))
+        data = m["text"].encode("utf-8")
+        slots[int(m["id"])] = (offset, len(data), doc, int(m["chunk_id"]), 0)
+        texts.append(data)
+        offset += len(data)
+
+    doc_table = json.dumps([list(k) for k in doc_index], ensure_ascii=False).encode("utf-8")
+    head = HEADER.pack(MAGIC, n_slots, len(doc_table)) + doc_table
+    head += b"\0" * (_align8(len(head)) - len(head))
+
+    # Write beside the target and rename, so processes that have the old file
+    # mapped keep reading a consistent snapshot.
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as w:
+        w.write(head)
+        w.write(slots.tobytes())
+        for data in texts:
+            w.write(data)
+    os.replace(tmp, path)
+    return len(rows)
+
+
+class MetaStore:
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_slots, doc_len = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a RAG metadata store")
+        start = HEADER.size
+        self.docs = json.loads(self._mm[start:start + doc_len].decode("utf-8"))
+        slots_at = _align8(start + doc_len)
+        self.slots = np.frombuffer(self._mm, dtype=SLOT_DTYPE, count=n_slots, offset=slots_at)
+        self._blob_at = slots_at + n_slots * SLOT_DTYPE.itemsize
+
+    def __len__(self) -> int:
+        return int((self.slots["doc"] >= 0).sum())
+
+    def __contains__(self, idx: int) -> bool:
+        return 0 <= idx < len(self.slots) and self.slots[idx]["doc"] >= 0
+
+    def get(self, idx: int) -> Dict[str, Any] | None:
+        if not 0 <= idx < len(self.slots):
+            return None
+        offset, length, doc, chunk_id, _ = self.slots[idx].tolist()
+        if doc < 0:
+            return None
+        start = self._blob_at + offset
+        doc_id, doc_title = self.docs[doc]
+        return {
+            "id": idx,
+            "doc_id": doc_id,
+            "doc_title": doc_title,
+            "chunk_id": chunk_id,
+            "text": self._mm[start:start + length].decode("utf-8"),
+        }
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        for idx in np.flatnonzero(self.slots["doc"] >= 0):
+            yield self.get(int(idx))
+
+    def close(self) -> None:
+        self.slots = self.slots[:0].copy()
+        self._mm.close()
+
+
+def read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    with Path(path).open("r", encoding="utf-8") as r:
+        for n, line in enumerate(r):
+            m = json.loads(line)
+            m.setdefault("id", n)
+            yield m
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Convert rag_meta.jsonl into the binary metadata store.")
+    ap.add_argument("src", nargs="?", default="dat/out/rag_meta.jsonl")
+    ap.add_argument("dst", nargs="?", default="dat/out/rag_meta.bin")
+    args = ap.parse_args()
+    n = write_meta_store(Path(args.dst), read_jsonl(Path(args.src)))
+    print(f"Wrote {args.dst} (chunks={n})")
+
+
+if __name__ == "__main__":
+    main()
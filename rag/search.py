@@ -1,15 +1,41 @@
 from __future__ import annotations
 import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Sequence
 import faiss
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from rag.index_types import read_index, set_search_params
+from rag.lexical import LexicalIndex, rrf_fuse
+from rag.meta_store import MetaStore
+from src.metrics import span
+
 OUT_DIR = Path("dat/out")
 INDEX_PATH = OUT_DIR / "rag.faiss"
-META_PATH = OUT_DIR / "rag_meta.jsonl"
+META_PATH = OUT_DIR / "rag_meta.bin"
+LEGACY_META_PATH = OUT_DIR / "rag_meta.jsonl"
+LEXICAL_PATH = OUT_DIR / "rag_bm25.npz"
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ENCODE_BATCH_SIZE = 64
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "4096"))
+QUERY_CACHE_TTL_S = float(os.getenv("RAG_QUERY_CACHE_TTL_S", "3600"))
+
+# dense | hybrid (RRF of dense + BM25) | prefilter (dense over BM25 candidates) | lexical
+SEARCH_MODES = ("dense", "hybrid", "prefilter", "lexical")
+SEARCH_MODE = os.getenv("RAG_SEARCH_MODE", "dense")
+HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "50"))
+PREFILTER_CANDIDATES = int(os.getenv("RAG_PREFILTER_CANDIDATES", "200"))
+# Concurrent query encodes allowed before non-dense modes degrade to lexical-only (0 = unlimited).
+MAX_ENCODE_INFLIGHT = int(os.getenv("RAG_MAX_ENCODE_INFLIGHT", "0"))
+# Same switch as src.data: open the FAISS index memory-mapped so workers share its pages.
+INDEX_MMAP = os.getenv("SHARED_MMAP", "0") not in ("0", "false", "False", "")
 
 
 @dataclass
@@ -24,38 +50,247 @@ class RAGHit:
         return f"{self.doc_id}#chunk{self.chunk_id} ({self.doc_title})"
 
 
-def _load_meta() -> List[Dict[str, Any]]:
-    meta: List[Dict[str, Any]] = []
-    with META_PATH.open("r", encoding="utf-8") as r:
-        for line in r:
-            meta.append(json.loads(line))
+def _load_meta(path: Path = LEGACY_META_PATH) -> Dict[int, Dict[str, Any]]:
+    # Keyed by FAISS id; older metadata files without "id" map by line number.
+    meta: Dict[int, Dict[str, Any]] = {}
+    with path.open("r", encoding="utf-8") as r:
+        for n, line in enumerate(r):
+            m = json.loads(line)
+            meta[int(m.get("id", n))] = m
     return meta
 
 
-def search(query: str, k: int = 5) -> List[RAGHit]:
+def open_meta(path: Path | None = None):
+    # Binary store is mmapped and read per hit; JSONL is the pre-conversion fallback.
+    if path is None:
+        path = META_PATH if META_PATH.exists() else LEGACY_META_PATH
+    if path.suffix == ".jsonl":
+        return _load_meta(path)
+    return MetaStore(path)
 
-    index = faiss.read_index(str(INDEX_PATH))
-    meta = _load_meta()
 
-    model = SentenceTransformer(MODEL_NAME)
-    q = model.encode([query], normalize_embeddings=True).astype("float32")
+def normalize_query(query: str) -> str:
+    q = re.sub(r"\s+", " ", (query or "").lower()).strip()
+    return q.rstrip("?!. ")
 
-    scores, ids = index.search(q, k)
-    hits: List[RAGHit] = []
-    for score, idx in zip(scores[0], ids[0]):
-        if idx < 0:
-            continue
-        m = meta[int(idx)]
-        hits.append(
-            RAGHit(
-                score=float(score),
-                doc_id=m["doc_id"],
-                doc_title=m["doc_title"],
-                chunk_id=int(m["chunk_id"]),
-                text=m["text"],
-            )
+
+class EmbeddingCache:
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl_s: float = QUERY_CACHE_TTL_S) -> None:
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            stored_at, vec = item
+            if self.ttl_s > 0 and time.monotonic() - stored_at > self.ttl_s:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, key: str, vec) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), vec)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+class Retriever:
+    def __init__(
+        self,
+        index_path: Path = INDEX_PATH,
+        meta_path: Path | None = None,
+        model_name: str = MODEL_NAME,
+        cache: EmbeddingCache | None = None,
+        lexical_path: Path = LEXICAL_PATH,
+        mode: str = SEARCH_MODE,
+        model: SentenceTransformer | None = None,
+        mmap: bool = INDEX_MMAP,
+    ) -> None:
+        self.index = read_index(index_path, mmap=mmap)
+        # Query-time knobs for approximate indexes; the values saved at ingest apply otherwise.
+        set_search_params(
+            self.index, {"nprobe": os.getenv("RAG_NPROBE"), "ef_search": os.getenv("RAG_EF_SEARCH")}
         )
-    return hits
+        self.meta = open_meta(meta_path)
+        # Pass an already-loaded encoder (and cache) to reopen only the index files.
+        self.model = model if model is not None else SentenceTransformer(model_name)
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.lexical = LexicalIndex.load(lexical_path) if lexical_path.exists() else None
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"unknown search mode {mode!r}; expected one of {SEARCH_MODES}")
+        self.mode = mode
+        self._encode_slots = threading.BoundedSemaphore(MAX_ENCODE_INFLIGHT) if MAX_ENCODE_INFLIGHT > 0 else None
+
+    def encode(self, query: str):
+        return self.encode_many([query])
+
+    def encode_many(self, queries: Sequence[str], batch_size: int = ENCODE_BATCH_SIZE):
+        keys = [normalize_query(q) for q in queries]
+        vecs: List[Any] = [self.cache.get(key) for key in keys]
+
+        # Encode each distinct missing key once, in one batch.
+        missing = list(dict.fromkeys(key for key, v in zip(keys, vecs) if v is None))
+        if missing:
+            with span("rag.encode"):
+                emb = self.model.encode(
+                    missing, batch_size=batch_size, normalize_embeddings=True
+                ).astype("float32")
+            fresh = dict(zip(missing, emb))
+            for key, v in fresh.items():
+                self.cache.put(key, v)
+            vecs = [v if v is not None else fresh[key] for key, v in zip(keys, vecs)]
+
+        return np.stack(vecs).astype("float32", copy=False)
+
+    def _hits(self, scores, ids) -> List[RAGHit]:
+        hits: List[RAGHit] = []
+        for score, idx in zip(scores, ids):
+            if idx < 0:
+                continue
+            m = self.meta.get(int(idx))
+            if m is None:
+                continue
+            hits.append(
+                RAGHit(
+                    score=float(score),
+                    doc_id=m["doc_id"],
+                    doc_title=m["doc_title"],
+                    chunk_id=int(m["chunk_id"]),
+                    text=m["text"],
+                )
+            )
+        return hits
+
+    def _encode_or_none(self, query: str):
+        # None when the encoder is saturated, so the caller can answer lexically.
+        if self._encode_slots is None:
+            return self.encode(query)
+        if not self._encode_slots.acquire(blocking=False):
+            return None
+        try:
+            return self.encode(query)
+        finally:
+            self._encode_slots.release()
+
+    def search(self, query: str, k: int = 5, mode: str | None = None) -> List[RAGHit]:
+        return self.search_with_vector(query, k=k, mode=mode)[0]
+
+    def search_with_vector(self, query: str, k: int = 5, mode: str | None = None):
+        # (hits, query embedding); the embedding is None when the search was lexical
+        # (lexical mode, or the encoder was saturated), so callers never encode on their own.
+        hits, q = self._search(query, k, mode)
+        return hits, (q[0] if q is not None else None)
+
+    def _search(self, query: str, k: int, mode: str | None):
+        mode = mode or self.mode
+        if self.lexical is None:
+            mode = "dense"
+
+        if mode == "lexical":
+            with span("rag.lexical_search"):
+                return self._hits(*self.lexical.search(query, k)), None
+
+        q = self.encode(query) if mode == "dense" else self._encode_or_none(query)
+        if q is None:
+            with span("rag.lexical_search"):
+                return self._hits(*self.lexical.search(query, k)), None
+
+        if mode == "prefilter":
+            with span("rag.lexical_search"):
+                _, cand = self.lexical.search(query, PREFILTER_CANDIDATES)
+            if len(cand):
+                sel = faiss.IDSelectorBatch(cand)
+                try:
+                    with span("rag.faiss_search", mode="prefilter"):
+                        scores, ids = self.index.search(q, k, params=faiss.SearchParameters(sel=sel))
+                    # HNSW walks the graph and drops disallowed nodes, so it can come back
+                    # short (-1 ids) although enough candidates exist; fuse instead.
+                    if int((ids[0] >= 0).sum()) >= min(k, len(cand)):
+                        return self._hits(scores[0], ids[0]), q
+                    mode = "hybrid"
+                except RuntimeError:
+                    mode = "hybrid"  # index type without selector support
+            else:
+                mode = "dense"
+
+        if mode == "hybrid":
+            n = max(k, HYBRID_CANDIDATES)
+            with span("rag.faiss_search", mode="hybrid"):
+                _, dense_ids = self.index.search(q, n)
+            with span("rag.lexical_search"):
+                _, lex_ids = self.lexical.search(query, n)
+            fused = rrf_fuse([dense_ids[0], lex_ids], k)
+            return self._hits([f[1] for f in fused], [f[0] for f in fused]), q
+
+        with span("rag.faiss_search", mode="dense"):
+            scores, ids = self.index.search(q, k)
+        return self._hits(scores[0], ids[0]), q
+
+    def search_many(
+        self, queries: Sequence[str], k: int = 5, batch_size: int = ENCODE_BATCH_SIZE
+    ) -> List[List[RAGHit]]:
+        if not queries:
+            return []
+        q = self.encode_many(queries, batch_size=batch_size)
+        scores, ids = self.index.search(q, k)
+        return [self._hits(s, i) for s, i in zip(scores, ids)]
+
+
+_RETRIEVER: Retriever | None = None
+_RETRIEVER_LOCK = threading.Lock()
+
+
+def get_retriever() -> Retriever:
+    global _RETRIEVER
+    if _RETRIEVER is None:
+        with _RETRIEVER_LOCK:
+            if _RETRIEVER is None:
+                _RETRIEVER = Retriever()
+    return _RETRIEVER
+
+
+def search(query: str, k: int = 5, mode: str | None = None) -> List[RAGHit]:
+    return get_retriever().search(query, k=k, mode=mode)
+
+
+def search_many(queries: Sequence[str], k: int = 5, batch_size: int = ENCODE_BATCH_SIZE) -> List[List[RAGHit]]:
+    return get_retriever().search_many(queries, k=k, batch_size=batch_size)
 
 
 def format_context(hits: List[RAGHit]) -> str:
@@ -1,37 +1,99 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import asyncio
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import pandas as pd
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from src.schemas import (
     ChatRequest, ChatResponse,
-    EmailSuggestionRequest, EmailSuggestionResponse
+    EmailSuggestionRequest, EmailSuggestionResponse,
+    TransactionIn, CampaignRequest, ClientLookupRequest,
 )
-from src.data import load_sales_csv, build_clients_table, get_client_context
-from src.llm import gemini_text
+from src.campaign import (
+    CAMPAIGN_CONCURRENCY, CAMPAIGN_RATE_PER_S,
+    CampaignFilter, CampaignProgress, campaign_path, run_campaign,
+)
+from src.llm import gemini_stream_async, gemini_text, gemini_text_async
+from src.client_pages import LIST_COLUMNS, SORT_ORDERS, ClientListingCache, parse_list_param
+from src.llm_cache import LLM_CACHE
+from src.metrics import METRICS_ENABLED, REGISTRY, inc, observe, span
+from src.prompts import (
+    chat_fallback, chat_prompt, customer_lines,
+    email_fallback, email_prompt, email_response,
+)
+from src.snapshot import Snapshot, SnapshotManager
 
-from rag.search import search, format_context
+from rag.answer_cache import SemanticAnswerCache
+from rag.context import build_context
 
 app = FastAPI(title="Fashion Policy RAG Demo")
 
 
-DF = load_sales_csv()
-CLIENTS = build_clients_table(DF)
+SNAPSHOTS = SnapshotManager()
+# Keep proxies (nginx) from buffering server-sent events.
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Paraphrased /chat questions with the same tier/mode and retrieved chunks reuse an earlier
+# policy answer; the customer-specific opening (customer_lines) is added after the lookup.
+ANSWER_CACHE = SemanticAnswerCache()
+CLIENT_LISTINGS = ClientListingCache()
+CLIENTS_DEFAULT_LIMIT = int(os.getenv("CLIENTS_DEFAULT_LIMIT", "1000"))
+CLIENTS_MAX_LIMIT = int(os.getenv("CLIENTS_MAX_LIMIT", "5000"))
+# Bulk email campaigns run as background tasks in this process; progress is kept by id.
+CAMPAIGNS: dict = {}
+CAMPAIGN_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# Encoding + FAISS search are CPU-bound; keep them off the event loop and off
+# the default threadpool that sync endpoints share.
+RETRIEVAL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RAG_SEARCH_WORKERS", str(min(8, os.cpu_count() or 1)))),
+    thread_name_prefix="rag-search",
+)
+
+
+async def current_snapshot() -> Snapshot:
+    # async so resolving it doesn't take a threadpool slot; the snapshot is built at startup.
+    return SNAPSHOTS.current()
+
+
+@app.on_event("startup")
+def load_snapshot():
+    # Load data, index, metadata and encoder once so the first request doesn't pay for it.
+    SNAPSHOTS.current()
+    SNAPSHOTS.start_watcher()
+
 
+@app.on_event("shutdown")
+async def stop_snapshot_watcher():
+    SNAPSHOTS.stop_watcher()
+    RETRIEVAL_EXECUTOR.shutdown(wait=False)
+    for progress, task in CAMPAIGNS.values():
+        task.cancel()
+    await LLM_CACHE.close()
 
-def tier_ack_line(tier: str, mode: str) -> str:
-    tier = (tier or "").lower()
-    mode = (mode or "").lower()
 
-    if tier == "vip":
-        base = "Thanks for being one of our VIP customers."
-    elif tier == "gold":
-        base = "Thanks for being a Gold customer."
-    elif tier == "silver":
-        base = "Thanks for being a Silver customer."
-    else:
-        base = "Thanks for reaching out."
+async def run_search(snap: Snapshot, question: str, k: int):
+    # (hits, question embedding or None). The embedding is the one retrieval computed;
+    # None when it answered lexically (RAG_MAX_ENCODE_INFLIGHT saturated, or lexical mode).
+    loop = asyncio.get_running_loop()
+    with span("rag.retrieval"):  # includes waiting for a retrieval worker
+        return await loop.run_in_executor(RETRIEVAL_EXECUTOR, snap.retriever.search_with_vector, question, k)
 
-    if mode == "optimistic":
-        return base + " I’ll be proactive and share the best options available under our policy."
-    return base + " I’ll help, but I may need a couple details to confirm eligibility under policy."
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    # Per-route totals; for streaming routes this is time to the first byte.
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    observe("http.request", time.perf_counter() - t0,
+            route=getattr(route, "path", "unmatched"), method=request.method, status=str(response.status_code))
+    return response
 
 
 def safe_gemini_call(prompt: str, *, question: str, rag_context: str, tier: str, model: str | None = None):
@@ -42,102 +104,158 @@ def safe_gemini_call(prompt: str, *, question: str, rag_context: str, tier: str,
         return gemini_text(prompt, question=question, rag_context=rag_context, tier=tier)
 
 
-def parse_email_sections(text: str) -> tuple[str, str, str]:
-    platform_summary = ""
-    subject = "Discover new picks for you"
-    body = text.strip()
-
-    lower = text.lower()
-    if "section a:" in lower and "section b:" in lower:
-        parts = text.split("SECTION B:", 1)
-        a_part = parts[0]
-        b_part = parts[1] if len(parts) > 1 else ""
-
-
-        if "SECTION A:" in a_part:
-            platform_summary = a_part.split("SECTION A:", 1)[1].strip()
-        else:
-            platform_summary = a_part.strip()
+@app.get("/health")
+def health():
+    return {"ok": True}
 
 
-        b_lines = b_part.strip().splitlines()
+@app.get("/metrics")
+def metrics():
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
-        for i, line in enumerate(b_lines):
-            if line.lower().startswith("subject:"):
-                subject = line.split(":", 1)[1].strip() or subject
-                rest = "\n".join(b_lines[i+1:]).strip()
-                if "Body:" in rest:
-                    body = rest.split("Body:", 1)[1].strip()
-                else:
-                    body = rest
-                break
 
-        return platform_summary, subject, body
+@app.get("/metrics/summary")
+def metrics_summary():
+    # Same data as /metrics as JSON percentiles, for benches and quick looks.
+    return REGISTRY.summary()
 
 
-    lines = text.splitlines()
-    for i, line in enumerate(lines):
-        if line.lower().startswith("subject:"):
-            subject = line.split(":", 1)[1].strip() or subject
-            rest = "\n".join(lines[i+1:]).strip()
-            if "Body:" in rest:
-                body = rest.split("Body:", 1)[1].strip()
-            else:
-                body = rest
-            break
+@app.get("/version")
+def data_version(snap: Snapshot = Depends(current_snapshot)):
+    # Cheap poll for clients that cache responses per data version.
+    return {"data_version": snap.data_version, "snapshot_version": snap.version}
 
-    return platform_summary, subject, body
 
+@app.post("/admin/reload")
+def admin_reload():
+    return {"started": SNAPSHOTS.reload_in_background(), "version": SNAPSHOTS.current().version}
 
 
-@app.get("/health")
-def health():
-    return {"ok": True}
+@app.get("/admin/snapshot")
+def admin_snapshot():
+    return SNAPSHOTS.status()
 
 
 @app.get("/clients")
-def list_clients():
-    cols = [
-        "customer_id", "tier", "mode", "total_spend",
-        "purchase_count", "avg_rating", "rating_coverage",
-        "suggestion_limit"
-    ]
-    out = CLIENTS[cols].copy()
-    return out.to_dict(orient="records")
+def list_clients(
+    tier: Optional[List[str]] = Query(None),
+    mode: Optional[List[str]] = Query(None),
+    min_spend: Optional[float] = None,
+    max_spend: Optional[float] = None,
+    sort: str = "customer_id",
+    order: str = "asc",
+    fields: Optional[List[str]] = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(CLIENTS_DEFAULT_LIMIT, ge=1, le=CLIENTS_MAX_LIMIT),
+    if_none_match: Optional[str] = Header(None),
+    snap: Snapshot = Depends(current_snapshot),
+):
+    # Serialized pages are cached per data version; an unchanged page costs a 304.
+    fields = parse_list_param(fields)
+    unknown = [c for c in fields + [sort] if c not in LIST_COLUMNS]
+    if unknown or order not in SORT_ORDERS:
+        raise HTTPException(status_code=422, detail=f"unknown field/sort {unknown} or order {order!r}")
+    tiers, modes = parse_list_param(tier), parse_list_param(mode)
+
+    listing = CLIENT_LISTINGS.get(snap.profiles, snap.data_version)
+    params = (tiers, modes, min_spend, max_spend, sort, order, fields, offset, limit)
+    etag = listing.etag(params)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Data-Version": listing.data_version}
+    if if_none_match and etag in {t.strip() for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+
+    body, total = listing.page(*params)
+    headers["X-Total-Count"] = str(total)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/clients/search")
+def search_clients(
+    q: str = "",
+    limit: int = Query(20, ge=1, le=200),
+    snap: Snapshot = Depends(current_snapshot),
+):
+    listing = CLIENT_LISTINGS.get(snap.profiles, snap.data_version)
+    return {"results": listing.search(q.strip(), limit), "data_version": listing.data_version}
+
+
+@app.post("/clients/lookup")
+def lookup_clients(req: ClientLookupRequest, snap: Snapshot = Depends(current_snapshot)):
+    if len(req.customer_ids) > CLIENTS_MAX_LIMIT:
+        raise HTTPException(status_code=422, detail=f"at most {CLIENTS_MAX_LIMIT} customer_ids per call")
+    found = snap.profiles.contexts(req.customer_ids)
+    return {
+        "profiles": [found[cid] for cid in map(str, req.customer_ids) if cid in found],
+        "missing": [cid for cid in map(str, req.customer_ids) if cid not in found],
+        "data_version": snap.data_version,
+    }
 
 
 @app.get("/clients/{customer_id}")
-def client_detail(customer_id: str):
-    ctx = get_client_context(DF, CLIENTS, customer_id)
-    history = DF[DF["customer_id"] == str(customer_id)].sort_values("date", ascending=False).head(25)
+def client_detail(customer_id: str, snap: Snapshot = Depends(current_snapshot)):
+    ctx = snap.profiles.context(customer_id)
+    history = snap.profiles.history(customer_id, limit=25)
+    history = history.astype(object).where(history.notna(), None)  # NaN ratings are not valid JSON
     return {"profile": ctx, "recent_purchases": history.to_dict(orient="records")}
 
 
-@app.get("/thresholds")
-def thresholds():
+@app.get("/rag/cache_stats")
+def rag_cache_stats(snap: Snapshot = Depends(current_snapshot)):
+    return snap.retriever.cache.stats()
+
 
-    spend = CLIENTS["total_spend"].astype(float)
-    cnt = CLIENTS["purchase_count"].astype(int)
+@app.get("/llm/cache_stats")
+async def llm_cache_stats():
+    return await LLM_CACHE.stats()
 
+
+@app.get("/rag/answer_cache_stats")
+def answer_cache_stats():
+    return ANSWER_CACHE.stats()
+
+
+@app.post("/admin/answer_cache")
+def configure_answer_cache(threshold: float | None = None, clear: bool = False):
+    if threshold is not None:
+        if not 0.0 < threshold <= 1.01:
+            raise HTTPException(status_code=422, detail="threshold must be in (0, 1.01]")
+        ANSWER_CACHE.threshold = threshold
+    if clear:
+        ANSWER_CACHE.clear()
+    return ANSWER_CACHE.stats()
+
+
+@app.get("/thresholds")
+def thresholds(snap: Snapshot = Depends(current_snapshot)):
+    # Maintained incrementally by the profile store; no per-request quantile computation.
     return {
-        "spend_quantiles": {
-            "p50": float(spend.quantile(0.50)),
-            "p80": float(spend.quantile(0.80)),
-            "p95": float(spend.quantile(0.95)),
-        },
-        "count_quantiles": {
-            "p50": float(cnt.quantile(0.50)),
-            "p80": float(cnt.quantile(0.80)),
-            "p95": float(cnt.quantile(0.95)),
-        },
+        **snap.profiles.thresholds(),
         "mode_rule": "optimistic if avg_rating >= 3.8 and rating_coverage >= 0.3 else cautious",
         "suggestion_limits": {"bronze": 3, "silver": 5, "gold": 7, "vip": 9},
     }
 
 
+@app.post("/transactions")
+def add_transactions(transactions: List[TransactionIn], snap: Snapshot = Depends(current_snapshot)):
+    tx = pd.DataFrame([t.model_dump() for t in transactions])
+    if tx.empty:
+        return {"transactions": 0}
+    return snap.profiles.append(tx)
+
+
+def client_context(ctx: dict, model_used: str) -> dict:
+    return {
+        "tier": ctx["tier"],
+        "mode": ctx["mode"],
+        "suggestion_limit": ctx["suggestion_limit"],
+        "model_used": model_used,
+    }
+
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    ctx = get_client_context(DF, CLIENTS, req.customer_id)
+async def chat(req: ChatRequest, snap: Snapshot = Depends(current_snapshot)):
+    with span("chat.client_context"):
+        ctx = snap.profiles.context(req.customer_id)
     if not ctx:
         return ChatResponse(
             answer="Client not found.",
@@ -147,168 +265,221 @@ def chat(req: ChatRequest):
         )
 
 
-    hits = search(req.question, k=6)
-    rag_context = format_context(hits)
-
-    used_citations = [h.cite() for h in hits]
-    used_docs = sorted({h.doc_id for h in hits})
-    ack = tier_ack_line(ctx["tier"], ctx["mode"])
-
-
-    prompt = f"""
-You are a customer support assistant for a fashion retail platform.
-
-HARD RULES:
-- Use ONLY the POLICY CONTEXT below to answer policy questions.
-- Do NOT invent rules, time windows, exceptions, or benefits.
-- If the policy context is missing info, ask for exactly what you need.
-- You MUST adapt your response to the customer's tier and mode.
+    hits, qvec = await run_search(snap, req.question, k=6)
+    with span("rag.context"):
+        rag_context, blocks = build_context(hits)
 
-TIER & MODE BEHAVIOR:
-- Tier affects what benefits can be offered (shipping coverage, goodwill likelihood, priority).
-- Mode affects communication style:
-  - optimistic: warm, proactive, suggest best options within policy.
-  - cautious: neutral, verification-first, stricter about timelines/evidence.
+    used_citations = [b.cite() for b in blocks]
+    used_docs = sorted({b.doc_id for b in blocks})
+    ack = customer_lines(ctx)
 
-CUSTOMER CONTEXT:
-- customer_id: {ctx["customer_id"]}
-- tier: {ctx["tier"]}
-- mode: {ctx["mode"]}
-- total_spend: {ctx["total_spend"]}
-- purchase_count: {ctx["purchase_count"]}
-- avg_rating: {ctx["avg_rating"]}
-- rating_coverage: {ctx["rating_coverage"]}
-- last_purchase: {ctx["last_purchase"]}
-- recent_items: {ctx["recent_items"]}
+    with span("chat.prompt"):
+        prompt = chat_prompt(ctx, rag_context, req.question)
 
-POLICY CONTEXT (authoritative):
-{rag_context}
-
-RESPONSE FORMAT:
-1) First line MUST be a tier-aware acknowledgment (one sentence).
-2) Then provide the answer grounded in policy.
-3) Include citations like [1], [2] corresponding to the POLICY CONTEXT numbering.
-4) End with "Next steps" bullets.
-
-Customer question: {req.question}
-""".strip()
+    cached = None
+    if qvec is not None:
+        cached = ANSWER_CACHE.lookup(qvec, ctx, req.model, hits)
+        inc("answer_cache_total", result="miss" if cached is None else "hit")
 
     try:
-        model = getattr(req, "model", None)
-        answer, model_used = gemini_text(
-            prompt,
-            question=req.question,
-            rag_context=rag_context,
-            tier=ctx["tier"],
-            model=req.model
-        )
+        if cached is not None:
+            answer, model_used = cached["answer"], cached["model_used"]
+        else:
+            with span("chat.llm"):
+                answer, model_used = await gemini_text_async(
+                    prompt,
+                    question=req.question,
+                    rag_context=rag_context,
+                    tier=ctx["tier"],
+                    model=req.model,
+                    endpoint="chat",
+                )
+            if answer and qvec is not None:
+                ANSWER_CACHE.put(qvec, ctx, req.model, hits, req.question, answer, model_used)
 
     except Exception as e:
-
-        fallback = (
-            f"{ack}\n\n"
-            "I couldn’t reach the AI model right now, but here is the most relevant policy context I found:\n\n"
-            f"{rag_context}\n\n"
-            "Next steps:\n"
-            "- Share the item name and purchase date\n"
-            "- Tell us the reason (changed mind / wrong size / defective)\n"
-        )
+        inc("fallback_total", endpoint="chat", error=type(e).__name__)
         return ChatResponse(
-            answer=fallback,
+            answer=f"{ack}\n\n" + chat_fallback(rag_context),
             used_policy_citations=used_citations,
             used_policy_docs=used_docs,
-            client_context={
-                "tier": ctx["tier"],
-                "mode": ctx["mode"],
-                "suggestion_limit": ctx["suggestion_limit"],
-                "model_used": "unavailable",
-            },
+            client_context=client_context(ctx, "unavailable"),
         )
 
 
-    if ctx["tier"].lower() not in answer.lower():
-        answer = f"{ack}\n\n{answer}"
-
     return ChatResponse(
-        answer=answer,
+        answer=f"{ack}\n\n{answer}",
         used_policy_citations=used_citations,
         used_policy_docs=used_docs,
-        client_context={
-            "tier": ctx["tier"],
-            "mode": ctx["mode"],
-            "suggestion_limit": ctx["suggestion_limit"],
-            "model_used": model_used,
-        },
+        client_context=client_context(ctx, model_used),
     )
 
 
 @app.post("/email_suggestion", response_model=EmailSuggestionResponse)
-def email_suggestion(req: EmailSuggestionRequest):
-    ctx = get_client_context(DF, CLIENTS, req.customer_id)
-
-    occasion = req.occasion or "general update"
-    limit = int(ctx["suggestion_limit"])
-    top_items = ctx["top_items"][:5]
-    recent = ctx["recent_items"][:5]
-
-    prompt = f"""
-You are generating content to display inside a demo platform (do not send emails).
-
-CLIENT CONTEXT:
-- Tier: {ctx["tier"]}
-- Mode: {ctx["mode"]}
-- Top items: {top_items}
-- Recent items: {recent}
-- Avg purchase amount: {ctx["avg_amount"]}
-- Total spend: {ctx["total_spend"]}
-
-TASK:
-Return TWO sections.
-
-SECTION A: PLATFORM SUMMARY (2-4 sentences)
-- Start with: "Based on this client’s history and status..."
-- Explain why these suggestions fit and how tier/mode changes optimism/caution.
-
-SECTION B: SUGGESTED EMAIL DRAFT
-- Format exactly:
-  Subject: ...
-  Body:
-  ...
-- Suggest exactly {min(limit,5)} item ideas (categories like Jacket, Tunic, Handbag, etc.)
-- No promises of discounts/refunds/exceptions.
-
-Occasion/theme: {occasion}
-""".strip()
+async def email_suggestion(req: EmailSuggestionRequest, snap: Snapshot = Depends(current_snapshot)):
+    with span("email.client_context"):
+        ctx = snap.profiles.context(req.customer_id)
+
+    with span("email.prompt"):
+        prompt = email_prompt(ctx, req.occasion or "general update")
 
     try:
-        model = getattr(req, "model", None)
-        text, model_used = gemini_text(
-            prompt,
-            question="email_suggestion",
-            rag_context="",
-            tier=ctx["tier"],
-            model=req.model
-        )
+        with span("email.llm"):
+            text, model_used = await gemini_text_async(
+                prompt,
+                question="email_suggestion",
+                rag_context="",
+                tier=ctx["tier"],
+                model=req.model,
+                endpoint="email_suggestion",
+            )
 
-    except Exception:
-        subject = "New picks for you"
-        body = (
-            f"Based on this client’s history and status ({ctx['tier']}/{ctx['mode']}), "
-            f"we suggest focusing on items similar to: {', '.join(top_items[:3])}.\n\n"
-            "Subject: New picks you may like\n"
-            "Body:\n"
-            f"Hi {ctx['customer_id']},\n\n"
-            "Based on your recent choices, here are a few ideas you might like:\n"
-            f"- {top_items[0] if len(top_items) > 0 else 'Jacket'}\n"
-            f"- {top_items[1] if len(top_items) > 1 else 'Tunic'}\n"
-            f"- {top_items[2] if len(top_items) > 2 else 'Handbag'}\n\n"
-            "Reply with your occasion and budget, and we’ll refine the picks.\n"
-        )
-        return EmailSuggestionResponse(subject=subject, body=body, tier=ctx["tier"], mode=ctx["mode"])
+    except Exception as e:
+        inc("fallback_total", endpoint="email_suggestion", error=type(e).__name__)
+        return email_fallback(ctx)
+
+    return email_response(ctx, text)
 
-    platform_summary, subject, body = parse_email_sections(text)
 
-    if platform_summary.strip():
-        body = platform_summary.strip() + "\n\n---\n\n" + body.strip()
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    return EmailSuggestionResponse(subject=subject, body=body, tier=ctx["tier"], mode=ctx["mode"])
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest, snap: Snapshot = Depends(current_snapshot)):
+    ctx = snap.profiles.context(req.customer_id)
+    if not ctx:
+        raise HTTPException(status_code=404, detail="Client not found.")
+
+    async def events():
+        # The opening only needs the profile, so it goes out before retrieval and generation.
+        ack = customer_lines(ctx)
+        yield sse("token", {"text": f"{ack}\n\n"})
+
+        hits, qvec = await run_search(snap, req.question, k=6)
+        with span("rag.context"):
+            rag_context, blocks = build_context(hits)
+        yield sse("sources", {
+            "used_policy_citations": [b.cite() for b in blocks],
+            "used_policy_docs": sorted({b.doc_id for b in blocks}),
+        })
+
+        cached = None
+        if qvec is not None:
+            cached = ANSWER_CACHE.lookup(qvec, ctx, req.model, hits)
+            inc("answer_cache_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            yield sse("token", {"text": cached["answer"]})
+            yield sse("done", {"answer": ack + "\n\n" + cached["answer"], "client_context": client_context(ctx, cached["model_used"])})
+            return
+
+        parts: list[str] = []
+        model_used = "unavailable"
+        try:
+            chunks, model_used = await gemini_stream_async(
+                chat_prompt(ctx, rag_context, req.question),
+                question=req.question,
+                rag_context=rag_context,
+                tier=ctx["tier"],
+                model=req.model,
+                endpoint="chat",
+            )
+            async for text in chunks:
+                parts.append(text)
+                yield sse("token", {"text": text})
+        except Exception as e:
+            inc("fallback_total", endpoint="chat_stream", error=type(e).__name__)
+            if not parts:
+                model_used = "unavailable"
+                parts.append(chat_fallback(rag_context))
+                yield sse("token", {"text": parts[0]})
+            else:
+                yield sse("error", {"detail": "generation interrupted"})
+        else:
+            answer = "".join(parts)
+            if answer and qvec is not None:
+                ANSWER_CACHE.put(qvec, ctx, req.model, hits, req.question, answer, model_used)
+
+        yield sse("done", {"answer": ack + "\n\n" + "".join(parts), "client_context": client_context(ctx, model_used)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/email_suggestion/stream")
+async def email_suggestion_stream(req: EmailSuggestionRequest, snap: Snapshot = Depends(current_snapshot)):
+    ctx = snap.profiles.context(req.customer_id)
+    if not ctx:
+        raise HTTPException(status_code=404, detail="Client not found.")
+
+    async def events():
+        parts: list[str] = []
+        try:
+            chunks, _ = await gemini_stream_async(
+                email_prompt(ctx, req.occasion or "general update"),
+                question="email_suggestion",
+                rag_context="",
+                tier=ctx["tier"],
+                model=req.model,
+                endpoint="email_suggestion",
+            )
+            async for text in chunks:
+                parts.append(text)
+                yield sse("token", {"text": text})
+        except Exception as e:
+            inc("fallback_total", endpoint="email_suggestion_stream", error=type(e).__name__)
+            if parts:
+                yield sse("error", {"detail": "generation interrupted"})
+            resp = email_fallback(ctx) if not parts else email_response(ctx, "".join(parts))
+        else:
+            resp = email_response(ctx, "".join(parts))
+        # Tokens are the raw model output; `done` carries the parsed subject/body.
+        yield sse("done", resp.model_dump())
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@app.post("/campaigns")
+async def start_campaign(req: CampaignRequest, snap: Snapshot = Depends(current_snapshot)):
+    # Re-posting a finished or interrupted campaign_id resumes it: customers already in
+    # the output file are skipped.
+    if not CAMPAIGN_ID_RE.match(req.campaign_id):
+        raise HTTPException(status_code=422, detail="campaign_id may only contain letters, digits, '_', '-', '.'")
+    running = CAMPAIGNS.get(req.campaign_id)
+    if running is not None and not running[1].done():
+        raise HTTPException(status_code=409, detail="campaign is already running")
+
+    output = campaign_path(req.campaign_id)
+    progress = CampaignProgress(campaign_id=req.campaign_id, output=str(output))
+    flt = CampaignFilter(
+        tiers=req.tiers, modes=req.modes, purchased_within_days=req.purchased_within_days,
+        purchased_after=req.purchased_after, purchased_before=req.purchased_before,
+    )
+    task = asyncio.create_task(run_campaign(
+        snap.profiles, flt, output,
+        occasion=req.occasion or "general update",
+        model=req.model,
+        concurrency=req.concurrency or CAMPAIGN_CONCURRENCY,
+        rate_per_s=req.rate_per_s if req.rate_per_s is not None else CAMPAIGN_RATE_PER_S,
+        progress=progress,
+    ))
+    task.add_done_callback(lambda t: _campaign_finished(progress, t))
+    CAMPAIGNS[req.campaign_id] = (progress, task)
+    return progress.info()
+
+
+def _campaign_finished(progress: CampaignProgress, task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        progress.status = f"error: {task.exception()}"
+
+
+@app.get("/campaigns")
+def list_campaigns():
+    return [progress.info() for progress, _ in CAMPAIGNS.values()]
+
+
+@app.get("/campaigns/{campaign_id}")
+def campaign_status(campaign_id: str):
+    entry = CAMPAIGNS.get(campaign_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="unknown campaign")
+    return entry[0].info()
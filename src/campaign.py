@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from src.llm import gemini_text_async
+from src.profiles import ProfileStore
+from src.prompts import email_prompt, email_response
+
+CAMPAIGN_DIR = Path(os.getenv("CAMPAIGN_DIR", "dat/campaigns"))
+CAMPAIGN_RATE_PER_S = float(os.getenv("CAMPAIGN_RATE_PER_S", "5"))
+CAMPAIGN_BURST = int(os.getenv("CAMPAIGN_BURST", "10"))
+CAMPAIGN_CONCURRENCY = int(os.getenv("CAMPAIGN_CONCURRENCY", "8"))
+CAMPAIGN_MAX_RETRIES = int(os.getenv("CAMPAIGN_MAX_RETRIES", "3"))
+
+
+@dataclass
+class CampaignFilter:
+    tiers: List[str] = field(default_factory=list)
+    modes: List[str] = field(default_factory=list)
+    # Last purchase within this many days of `as_of` (default: the newest purchase in the data).
+    purchased_within_days: Optional[int] = None
+    purchased_after: Optional[str] = None
+    purchased_before: Optional[str] = None
+    as_of: Optional[str] = None
+
+    def select(self, profiles: ProfileStore) -> List[str]:
+        after = pd.Timestamp(self.purchased_after) if self.purchased_after else None
+        if self.purchased_within_days is not None:
+            as_of = pd.Timestamp(self.as_of) if self.as_of else profiles.table(["last_purchase"])["last_purchase"].max()
+            window_start = as_of - pd.Timedelta(days=self.purchased_within_days)
+            after = window_start if after is None else max(after, window_start)
+        return profiles.select(self.tiers, self.modes, after, self.purchased_before)
+
+
+class TokenBucket:
+    # Allows `rate` acquisitions per second on average with bursts up to `burst`.
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class CampaignProgress:
+    campaign_id: str
+    output: str
+    selected: int = 0
+    skipped: int = 0  # already in the output file from an earlier run
+    done: int = 0
+    failed: int = 0
+    retries: int = 0
+    status: str = "pending"
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+    def info(self) -> Dict[str, Any]:
+        out = asdict(self)
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        out["elapsed_s"] = round(elapsed, 3)
+        out["remaining"] = self.selected - self.skipped - self.done - self.failed
+        return out
+
+
+def campaign_path(campaign_id: str, out_dir: Path = CAMPAIGN_DIR) -> Path:
+    return out_dir / f"{campaign_id}.jsonl"
+
+
+def completed_ids(path: Path) -> set:
+    # Customers with a successful draft in the output; failed rows are retried on resume.
+    done = set()
+    if not path.exists():
+        return done
+    with path.open("r", encoding="utf-8") as r:
+        for line in r:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            if row.get("status") == "ok":
+                done.add(str(row["customer_id"]))
+    return done
+
+
+async def run_campaign(
+    profiles: ProfileStore,
+    flt: CampaignFilter,
+    output: Path,
+    *,
+    occasion: str = "general update",
+    model: str | None = None,
+    concurrency: int = CAMPAIGN_CONCURRENCY,
+    rate_per_s: float = CAMPAIGN_RATE_PER_S,
+    burst: int = CAMPAIGN_BURST,
+    max_retries: int = CAMPAIGN_MAX_RETRIES,
+    progress: CampaignProgress | None = None,
+    generate: Callable[..., Awaitable[tuple]] = gemini_text_async,
+) -> CampaignProgress:
+    progress = progress or CampaignProgress(campaign_id=output.stem, output=str(output))
+    progress.status = "running"
+    progress.started_at = time.time()
+
+    ids = flt.select(profiles)
+    progress.selected = len(ids)
+    done = completed_ids(output)
+    todo = [cid for cid in ids if cid not in done]
+    progress.skipped = len(ids) - len(todo)
+    contexts = profiles.contexts(todo)
+
+    bucket = TokenBucket(rate_per_s, burst)
+    queue: asyncio.Queue = asyncio.Queue()
+    for cid in todo:
+        queue.put_nowait(cid)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("a", encoding="utf-8") as w:
+
+        def emit(row: Dict[str, Any]) -> None:
+            # One line per customer, flushed so a crash loses at most the rows in flight.
+            w.write(json.dumps(row, ensure_ascii=False) + "\n")
+            w.flush()
+
+        async def generate_one(cid: str) -> None:
+            ctx = contexts[cid]
+            prompt = email_prompt(ctx, occasion)
+            for attempt in range(max_retries + 1):
+                await bucket.acquire()
+                try:
+                    text, model_used = await generate(
+                        prompt, question="email_suggestion", rag_context="", tier=ctx["tier"],
+                        model=model, endpoint="email_suggestion",
+                    )
+                    if not text:
+                        raise ValueError("empty response")
+                except Exception as e:
+                    if attempt == max_retries:
+                        progress.failed += 1
+                        emit({"customer_id": cid, "status": "error", "error": f"{type(e).__name__}: {e}"})
+                        return
+                    progress.retries += 1
+                    await asyncio.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random()))
+                    continue
+                resp = email_response(ctx, text)
+                progress.done += 1
+                emit({"customer_id": cid, "status": "ok", "model_used": model_used, **resp.model_dump()})
+                return
+
+        async def worker() -> None:
+            while True:
+                try:
+                    cid = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await generate_one(cid)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+            progress.status = "done"
+        except asyncio.CancelledError:
+            progress.status = "cancelled"
+            raise
+        finally:
+            progress.finished_at = time.time()
+    return progress
+
+
+def main() -> None:
+    from src.data import load_sales_data
+
+    ap = argparse.ArgumentParser(description="Generate email drafts for every customer matching a filter.")
+    ap.add_argument("campaign_id", help="output goes to CAMPAIGN_DIR/<campaign_id>.jsonl; rerun to resume")
+    ap.add_argument("--tier", action="append", default=[])
+    ap.add_argument("--mode", action="append", default=[])
+    ap.add_argument("--within-days", type=int, default=None, help="last purchase within N days of the newest")
+    ap.add_argument("--after", default=None, help="last purchase on or after this date")
+    ap.add_argument("--before", default=None, help="last purchase on or before this date")
+    ap.add_argument("--occasion", default="general update")
+    ap.add_argument("--model", default=None)
+    ap.add_argument("--concurrency", type=int, default=CAMPAIGN_CONCURRENCY)
+    ap.add_argument("--rate", type=float, default=CAMPAIGN_RATE_PER_S, help="LLM calls per second (0 = unlimited)")
+    ap.add_argument("--retries", type=int, default=CAMPAIGN_MAX_RETRIES)
+    args = ap.parse_args()
+
+    df, clients = load_sales_data()
+    flt = CampaignFilter(args.tier, args.mode, args.within_days, args.after, args.before)
+    progress = asyncio.run(run_campaign(
+        ProfileStore(df, clients), flt, campaign_path(args.campaign_id),
+        occasion=args.occasion, model=args.model, concurrency=args.concurrency,
+        rate_per_s=args.rate, max_retries=args.retries,
+    ))
+    print(json.dumps(progress.info(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.profiles import ProfileStore
+
+LIST_COLUMNS = [
+    "customer_id", "tier", "mode", "total_spend",
+    "purchase_count", "avg_rating", "rating_coverage",
+    "suggestion_limit",
+]
+SORT_ORDERS = ("asc", "desc")
+PAGE_CACHE_SIZE = 256
+
+
+class ClientListing:
+    # Read-only view of the clients table for one data version. Sort orders and
+    # serialized pages are computed on first use and reused until the version changes.
+
+    def __init__(self, frame: pd.DataFrame, data_version: str):
+        self.data_version = data_version
+        self.frame = frame
+        self.frame["customer_id"] = self.frame["customer_id"].astype(str)
+        self._tier = self.frame["tier"].astype(str).str.lower().to_numpy()
+        self._mode = self.frame["mode"].astype(str).str.lower().to_numpy()
+        self._spend = self.frame["total_spend"].to_numpy(dtype=float)
+        self._orders: Dict[Tuple[str, str], np.ndarray] = {}
+        self._pages: "OrderedDict[tuple, Tuple[bytes, int]]" = OrderedDict()
+        self._ids: np.ndarray | None = None
+        self._ids_order: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+    def _order(self, sort: str, order: str) -> np.ndarray:
+        key = (sort, order)
+        if key not in self._orders:
+            # customer_id breaks ties so pages are stable across requests.
+            self._orders[key] = self.frame.sort_values(
+                [sort, "customer_id"], ascending=[order == "asc", True], kind="mergesort", na_position="last"
+            ).index.to_numpy()
+        return self._orders[key]
+
+    def search(self, prefix: str, limit: int = 20) -> List[dict]:
+        # Prefix match on customer_id via binary search, for the UI's client picker.
+        with self._lock:
+            if self._ids is None:
+                self._ids_order = np.argsort(self.frame["customer_id"].to_numpy(dtype=str), kind="mergesort")
+                self._ids = self.frame["customer_id"].to_numpy(dtype=str)[self._ids_order]
+        lo = np.searchsorted(self._ids, prefix, side="left")
+        hi = np.searchsorted(self._ids, prefix + "\U0010ffff", side="left")
+        rows = self._ids_order[lo:min(hi, lo + limit)]
+        return self.frame.iloc[rows][["customer_id", "tier", "mode"]].to_dict(orient="records")
+
+    def etag(self, params: tuple) -> str:
+        return 'W/"' + hashlib.sha1(repr((self.data_version, params)).encode()).hexdigest()[:20] + '"'
+
+    def page(
+        self,
+        tiers: Sequence[str] = (),
+        modes: Sequence[str] = (),
+        min_spend: float | None = None,
+        max_spend: float | None = None,
+        sort: str = "customer_id",
+        order: str = "asc",
+        fields: Sequence[str] = (),
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Tuple[bytes, int]:
+        # Returns (JSON array body, total matching rows).
+        params = (tuple(sorted(t.lower() for t in tiers)), tuple(sorted(m.lower() for m in modes)),
+                  min_spend, max_spend, sort, order, tuple(fields), offset, limit)
+        with self._lock:
+            hit = self._pages.get(params)
+            if hit is not None:
+                self._pages.move_to_end(params)
+                return hit
+
+            rows = self._order(sort, order)
+            mask = np.ones(len(rows), dtype=bool)
+            if tiers:
+                mask &= np.isin(self._tier[rows], params[0])
+            if modes:
+                mask &= np.isin(self._mode[rows], params[1])
+            if min_spend is not None:
+                mask &= self._spend[rows] >= min_spend
+            if max_spend is not None:
+                mask &= self._spend[rows] <= max_spend
+            rows = rows[mask]
+            total = len(rows)
+            part = self.frame.iloc[rows[offset:offset + limit]]
+            if fields:
+                part = part[list(fields)]
+            # to_json writes NaN as null (json.dumps would emit invalid NaN).
+            body = part.to_json(orient="records", double_precision=15).encode()
+
+            self._pages[params] = (body, total)
+            while len(self._pages) > PAGE_CACHE_SIZE:
+                self._pages.popitem(last=False)
+            return body, total
+
+
+class ClientListingCache:
+    # Holds the listing for the newest data version seen.
+
+    def __init__(self):
+        self._listing: ClientListing | None = None
+        self._lock = threading.Lock()
+
+    def get(self, profiles: ProfileStore, data_version: str) -> ClientListing:
+        listing = self._listing
+        if listing is not None and listing.data_version == data_version:
+            return listing
+        with self._lock:
+            if self._listing is None or self._listing.data_version != data_version:
+                self._listing = ClientListing(profiles.table(LIST_COLUMNS), data_version)
+            return self._listing
+
+
+def parse_list_param(values: List[str] | None) -> List[str]:
+    # Accepts repeated (?tier=gold&tier=vip) and comma-separated (?tier=gold,vip) forms.
+    out: List[str] = []
+    for v in values or []:
+        out.extend(x.strip() for x in v.split(",") if x.strip())
+    return out
@@ -0,0 +1,159 @@
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single writer assumed
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+# A frame is stored as a directory with one .npy file per column plus meta.json.
+# String columns are dictionary-encoded (codes .npy + categories in meta.json), so
+# every column file is a plain fixed-width array that np.load can memory-map.
+FORMAT_VERSION = 1
+
+
+@contextmanager
+def locked(path: Path, exclusive: bool):
+    # Advisory lock on a sibling file: writers swap a directory in exclusively,
+    # readers hold it shared while they open the files, so nobody sees the gap
+    # between moving the old directory out and the new one in.
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(path.with_name(path.name + ".lock"), "a")
+    except OSError:
+        if exclusive:
+            raise
+        yield  # read-only cache directory: nothing can be swapping it
+        return
+    with f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def _tmp_dir(path: Path) -> Path:
+    # Unique per writer, so processes building the same cache never share a directory.
+    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    tmp.mkdir(parents=True)
+    return tmp
+
+
+def save_frame(df: pd.DataFrame, path: Path, key: Dict[str, Any] | None = None,
+               categorical: Iterable[str] = ()) -> None:
+    categorical = set(categorical)
+    tmp = _tmp_dir(path)
+    try:
+        _write_frame(df, tmp, key, categorical)
+        _swap_in(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _write_frame(df: pd.DataFrame, tmp: Path, key: Dict[str, Any] | None, categorical: set) -> None:
+    columns = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        if s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) in ("floating", "integer", "mixed-integer-float"):
+            s = s.astype(float)  # e.g. float columns holding None for missing values
+        spec: Dict[str, Any] = {"name": col, "file": f"c{i}.npy"}
+        if isinstance(s.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(s) or s.dtype == object:
+            cat = s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype("category")
+            spec["kind"] = "category" if col in categorical or isinstance(s.dtype, pd.CategoricalDtype) else "string"
+            spec["categories"] = [str(c) for c in cat.cat.categories]
+            codes = cat.cat.codes.to_numpy()
+            arr = codes.astype("int32") if len(spec["categories"]) > 32767 else codes.astype("int16")
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            spec["kind"] = "datetime"
+            spec["unit"] = np.datetime_data(s.dtype)[0]
+            arr = s.to_numpy().view("int64")
+        else:
+            spec["kind"] = "numeric"
+            arr = s.to_numpy()
+        np.save(tmp / spec["file"], np.ascontiguousarray(arr), allow_pickle=False)
+        columns.append(spec)
+
+    meta = {"version": FORMAT_VERSION, "rows": len(df), "key": key or {}, "columns": columns}
+    (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+
+def _swap_in(tmp: Path, path: Path) -> None:
+    with locked(path, exclusive=True):
+        old = path.with_name(path.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        if path.exists():
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def save_arrays(arrays: Dict[str, np.ndarray], path: Path, key: Dict[str, Any] | None = None,
+                extra: Dict[str, Any] | None = None) -> None:
+    # Same directory layout as save_frame for plain arrays of any length, so
+    # load_arrays(mmap=True) hands back np.memmap objects with no DataFrame in between.
+    tmp = _tmp_dir(path)
+    try:
+        for name, arr in arrays.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(arr), allow_pickle=False)
+        meta = {"version": FORMAT_VERSION, "key": key or {}, "arrays": list(arrays), **(extra or {})}
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        _swap_in(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_arrays(path: Path, mmap: bool = False) -> tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    with locked(path, exclusive=False):
+        meta = _read_meta(path)
+        if meta is None or "arrays" not in meta:
+            raise FileNotFoundError(f"no saved arrays at {path}")
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None, allow_pickle=False)
+            for name in meta["arrays"]
+        }
+    return arrays, meta
+
+
+def read_meta(path: Path) -> Dict[str, Any] | None:
+    with locked(path, exclusive=False):
+        return _read_meta(path)
+
+
+def _read_meta(path: Path) -> Dict[str, Any] | None:
+    try:
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == FORMAT_VERSION else None
+
+
+def load_frame(path: Path, mmap: bool = False) -> pd.DataFrame:
+    with locked(path, exclusive=False):
+        meta = _read_meta(path)
+        if meta is None:
+            raise FileNotFoundError(f"no columnar frame at {path}")
+        # Mapped files stay valid after a later swap replaces the directory.
+        raw = {spec["file"]: np.load(path / spec["file"], mmap_mode="r" if mmap else None, allow_pickle=False)
+               for spec in meta["columns"]}
+    data = {}
+    for spec in meta["columns"]:
+        arr = raw[spec["file"]]
+        kind = spec["kind"]
+        if kind == "category":
+            data[spec["name"]] = pd.Categorical.from_codes(arr, categories=spec["categories"])
+        elif kind == "string":
+            values = np.asarray(spec["categories"], dtype=object)[arr] if len(spec["categories"]) else np.full(len(arr), None, dtype=object)
+            values[np.asarray(arr) < 0] = None
+            data[spec["name"]] = pd.array(values, dtype=str)
+        elif kind == "datetime":
+            data[spec["name"]] = np.asarray(arr).view(f"datetime64[{spec['unit']}]")
+        else:
+            data[spec["name"]] = arr
+    return pd.DataFrame(data, copy=False)
@@ -1,13 +1,28 @@
+import os
+import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from typing import Dict, Any
 
+from src.columnar import load_arrays, load_frame, read_meta, save_arrays, save_frame
+from src.metrics import observe, span
+
 CSV_PATH = Path("fashion_data/Fashion_Retail_Sales.csv")
+CACHE_DIR = Path("dat/cache")
+CATEGORICAL_COLUMNS = ("item", "payment_method")
+# Bump when load_sales_csv / build_clients_table change what they produce.
+CACHE_VERSION = 1
+# SHARED_MMAP=1: workers memory-map the prebuilt column files (python -m src.prebuild)
+# read-only, so N uvicorn workers share one copy of the tables in the page cache.
+SHARED_MMAP = os.getenv("SHARED_MMAP", "0") not in ("0", "false", "False", "")
+
+
+def load_sales_csv(csv_path: Path = CSV_PATH) -> pd.DataFrame:
+    return clean_sales_frame(pd.read_csv(csv_path))
 
 
-def load_sales_csv() -> pd.DataFrame:
-    df = pd.read_csv(CSV_PATH)
+def clean_sales_frame(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = [c.strip().lower() for c in df.columns]
 
     rename = {
@@ -21,7 +36,8 @@ def load_sales_csv() -> pd.DataFrame:
     df = df.rename(columns=rename)
 
     df["customer_id"] = df["customer_id"].astype(str)
-    df["item"] = df["item"].astype(str)
+    df["item"] = df["item"].astype(str).astype("category")
+    df["payment_method"] = df["payment_method"].astype(str).astype("category")
     df["amount"] = pd.to_numeric(df["amount"], errors="coerce").fillna(0.0)
     df["date"] = pd.to_datetime(df["date"], errors="coerce")
     df["rating"] = pd.to_numeric(df["rating"], errors="coerce")
@@ -29,6 +45,49 @@ def load_sales_csv() -> pd.DataFrame:
     return df
 
 
+def csv_cache_key(csv_path: Path = CSV_PATH) -> Dict[str, Any]:
+    st = csv_path.stat()
+    return {"csv": str(csv_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns, "version": CACHE_VERSION}
+
+
+def load_sales_data(csv_path: Path = CSV_PATH, cache_dir: Path | None = CACHE_DIR,
+                    mmap: bool = False) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # Cleaned transactions + clients table, from the columnar cache when it matches
+    # the CSV's size/mtime, otherwise parsed from CSV and written back to the cache.
+    # With mmap, the cache is mapped read-only and a stale one is left for prebuild
+    # to rewrite, so concurrently starting workers never race on it.
+    t0 = time.perf_counter()
+    key = csv_cache_key(csv_path)
+    sales_dir = cache_dir / "sales" if cache_dir else None
+    clients_dir = cache_dir / "clients" if cache_dir else None
+
+    if sales_dir and all((m or {}).get("key") == key for m in (read_meta(sales_dir), read_meta(clients_dir))):
+        df = load_frame(sales_dir, mmap=mmap)
+        clients = load_frame(clients_dir, mmap=mmap)
+        source = "mmap" if mmap else "cache"
+    else:
+        df = load_sales_csv(csv_path)
+        clients = build_clients_table(df)
+        source = "csv"
+        if sales_dir and not mmap:
+            try:
+                save_frame(df, sales_dir, key=key, categorical=CATEGORICAL_COLUMNS)
+                save_frame(clients, clients_dir, key=key)
+            except OSError as e:
+                # The cache only speeds up the next start; serve what was just parsed.
+                print(f"Could not write the sales cache to {cache_dir}: {e}")
+        elif mmap:
+            print("Sales cache missing or stale; run `python -m src.prebuild` to share it across workers.")
+
+    elapsed = time.perf_counter() - t0
+    observe("data.load_sales", elapsed, source=source)
+    print(
+        f"Loaded sales data from {source} in {elapsed:.3f}s "
+        f"(rows={len(df)}, customers={len(clients)})"
+    )
+    return df, clients
+
+
 def compute_tier(total_spend: float, purchase_count: int, avg_rating: float | None) -> str:
     if total_spend >= 20000 and (avg_rating is not None and avg_rating >= 4.2):
         return "vip"
@@ -49,6 +108,9 @@ def compute_mode(avg_rating: float | None, rating_coverage: float) -> str:
     return "optimistic"
 
 
+TIER_SUGGESTION_LIMITS = {"bronze": 3, "silver": 5, "gold": 7, "vip": 9}
+
+
 def build_clients_table(df: pd.DataFrame) -> pd.DataFrame:
     g = df.groupby("customer_id", as_index=False)
 
@@ -57,10 +119,15 @@ def build_clients_table(df: pd.DataFrame) -> pd.DataFrame:
         purchase_count=("amount", "size"),
         last_purchase=("date", "max"),
         avg_rating=("rating", "mean"),
-        rated_count=("rating", lambda s: s.notna().sum()),
+        rated_count=("rating", "count"),
         avg_amount=("amount", "mean"),
     )
 
+    return label_clients(out)
+
+
+def label_clients(out: pd.DataFrame) -> pd.DataFrame:
+    # Adds coverage, percentile-based tier, mode and suggestion limit to per-customer aggregates.
     out["rating_coverage"] = out["rated_count"] / out["purchase_count"]
     out["avg_rating"] = out["avg_rating"].where(out["avg_rating"].notna(), None)
 
@@ -71,43 +138,172 @@ def build_clients_table(df: pd.DataFrame) -> pd.DataFrame:
     spend_p50, spend_p80, spend_p95 = spend.quantile([0.50, 0.80, 0.95]).tolist()
     cnt_p50, cnt_p80, cnt_p95 = cnt.quantile([0.50, 0.80, 0.95]).tolist()
 
-    def tier_row(r):
-        s = float(r["total_spend"])
-        c = int(r["purchase_count"])
-        ar = r["avg_rating"]
-
-        # VIP = top 5% spend or purchases + good satisfaction
-        if ((s >= spend_p95) or (c >= cnt_p95)) and (ar is not None and ar >= 4.0):
-            return "vip"
-        # Gold = top 20%
-        if (s >= spend_p80) or (c >= cnt_p80):
-            return "gold"
-        # Silver = middle
-        if (s >= spend_p50) or (c >= cnt_p50):
-            return "silver"
-        return "bronze"
-
-    out["tier"] = out.apply(tier_row, axis=1)
-
-
-    def mode_row(r):
-        ar = r["avg_rating"]
-        cov = float(r["rating_coverage"])
-        if ar is None:
-            return "cautious"
-        # optimistic if ratings are decent and we have enough ratings
-        if ar >= 3.0 and cov >= 0.3:
-            return "optimistic"
-        return "cautious"
-
-    out["mode"] = out.apply(mode_row, axis=1)
-    out["suggestion_limit"] = out["tier"].map({"bronze": 3, "silver": 5, "gold": 7, "vip": 9})
+    out["tier"] = classify_tiers(
+        spend.to_numpy(), cnt.to_numpy(), out["avg_rating"].to_numpy(dtype=float, na_value=np.nan),
+        (spend_p50, spend_p80, spend_p95), (cnt_p50, cnt_p80, cnt_p95),
+    )
+    out["mode"] = classify_modes(
+        out["avg_rating"].to_numpy(dtype=float, na_value=np.nan), out["rating_coverage"].to_numpy(dtype=float)
+    )
+    out["suggestion_limit"] = out["tier"].map(TIER_SUGGESTION_LIMITS)
 
     return out
 
 
+def classify_tiers(spend: np.ndarray, cnt: np.ndarray, avg_rating: np.ndarray,
+                   spend_q: tuple, cnt_q: tuple) -> np.ndarray:
+    # avg_rating is NaN when a customer never left a rating; NaN comparisons are False.
+    spend_p50, spend_p80, spend_p95 = spend_q
+    cnt_p50, cnt_p80, cnt_p95 = cnt_q
+    return np.select(
+        [
+            # VIP = top 5% spend or purchases + good satisfaction
+            ((spend >= spend_p95) | (cnt >= cnt_p95)) & (avg_rating >= 4.0),
+            # Gold = top 20%
+            (spend >= spend_p80) | (cnt >= cnt_p80),
+            # Silver = middle
+            (spend >= spend_p50) | (cnt >= cnt_p50),
+        ],
+        ["vip", "gold", "silver"],
+        default="bronze",
+    ).astype(object)
+
+
+def classify_modes(avg_rating: np.ndarray, rating_coverage: np.ndarray) -> np.ndarray:
+    # optimistic if ratings are decent and we have enough ratings
+    return np.where((avg_rating >= 3.0) & (rating_coverage >= 0.3), "optimistic", "cautious").astype(object)
+
+
+
+NAT_NS = np.iinfo("int64").min
+
+
+def _neumaier_add(s: np.ndarray, c: np.ndarray, x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Compensated running sum, so chunked totals match a single-pass pandas sum/mean.
+    t = s + x
+    c = c + np.where(np.abs(s) >= np.abs(x), (s - t) + x, (x - t) + s)
+    return t, c
+
+
+class ClientAggregator:
+    # Running per-customer aggregates folded from transaction chunks, so the clients
+    # table can be built without holding every row in memory. Customers and items are
+    # interned to integer codes; item counts are pruned to the top `max_items` per
+    # customer whenever a customer exceeds it (approximate beyond that).
+
+    def __init__(self, max_items: int = 32):
+        self.max_items = max_items
+        self.customers = pd.Index([], dtype=object)
+        self.items = pd.Index([], dtype=object)
+        self.spend = np.zeros(0)
+        self.spend_comp = np.zeros(0)
+        self.count = np.zeros(0, dtype="int64")
+        self.last_purchase = np.zeros(0, dtype="int64")  # ns since epoch, NAT_NS when unknown
+        self.rating_sum = np.zeros(0)
+        self.rating_comp = np.zeros(0)
+        self.rated_count = np.zeros(0, dtype="int64")
+        self.item_counts = pd.Series(dtype="int64")  # (customer code << 32 | item code) -> count
+        self.rows = 0
+
+    @staticmethod
+    def _intern(index: pd.Index, values: pd.Series) -> tuple[pd.Index, np.ndarray]:
+        codes = index.get_indexer(values)
+        if (codes < 0).any():
+            index = index.append(pd.Index(pd.unique(values[codes < 0]), dtype=object))
+            codes = index.get_indexer(values)
+        return index, codes
+
+    def _grow(self, n: int) -> None:
+        extra = n - len(self.count)
+        if extra <= 0:
+            return
+        for name, fill in (("spend", 0.0), ("spend_comp", 0.0), ("count", 0), ("last_purchase", NAT_NS),
+                           ("rating_sum", 0.0), ("rating_comp", 0.0), ("rated_count", 0)):
+            arr = getattr(self, name)
+            setattr(self, name, np.concatenate([arr, np.full(extra, fill, dtype=arr.dtype)]))
+
+    def add(self, df: pd.DataFrame) -> None:
+        self.customers, cust = self._intern(self.customers, df["customer_id"].astype(str))
+        self.items, item = self._intern(self.items, df["item"].astype(str))
+        self._grow(len(self.customers))
+
+        # Per-chunk sums go through pandas (compensated); chunks are then combined with Neumaier.
+        part = pd.DataFrame(
+            {
+                "c": cust,
+                "amount": df["amount"].to_numpy(dtype=float),
+                "rating": df["rating"].to_numpy(dtype=float),
+                "date": pd.to_datetime(df["date"]).to_numpy().astype("datetime64[ns]").view("int64"),
+            }
+        ).groupby("c").agg(
+            amount=("amount", "sum"), n=("amount", "size"),
+            rating=("rating", "sum"), rated=("rating", "count"), date=("date", "max"),
+        )
+        c = part.index.to_numpy()
+        self.spend[c], self.spend_comp[c] = _neumaier_add(self.spend[c], self.spend_comp[c], part["amount"].to_numpy())
+        self.rating_sum[c], self.rating_comp[c] = _neumaier_add(
+            self.rating_sum[c], self.rating_comp[c], part["rating"].to_numpy()
+        )
+        self.count[c] += part["n"].to_numpy()
+        self.rated_count[c] += part["rated"].to_numpy()
+        self.last_purchase[c] = np.maximum(self.last_purchase[c], part["date"].to_numpy())
+
+        keys = (cust.astype("int64") << 32) | item.astype("int64")
+        counts = pd.Series(keys).value_counts()
+        self.item_counts = self.item_counts.add(counts, fill_value=0).astype("int64")
+        if self.max_items:
+            per_customer = np.bincount(self.item_counts.index.to_numpy() >> 32)
+            if per_customer.max(initial=0) > self.max_items:
+                ic = self.item_counts.sort_values(ascending=False, kind="stable")
+                ic = ic.groupby(ic.index.to_numpy() >> 32, sort=False).head(self.max_items)
+                self.item_counts = ic.sort_index()
+        self.rows += len(df)
+
+    def clients_table(self) -> pd.DataFrame:
+        order = np.argsort(self.customers.to_numpy(dtype=str), kind="stable")
+        spend = (self.spend + self.spend_comp)[order]
+        count = self.count[order]
+        rated = self.rated_count[order]
+        ratings = (self.rating_sum + self.rating_comp)[order]
+        last = self.last_purchase[order].view("datetime64[ns]").copy()
+        last[self.last_purchase[order] == NAT_NS] = np.datetime64("NaT")
+        out = pd.DataFrame(
+            {
+                "customer_id": self.customers.to_numpy(dtype=str)[order],
+                "total_spend": spend,
+                "purchase_count": count,
+                "last_purchase": last,
+                "avg_rating": np.divide(ratings, rated, out=np.full(len(rated), np.nan), where=rated > 0),
+                "rated_count": rated,
+                "avg_amount": spend / count,
+            }
+        )
+        out["customer_id"] = out["customer_id"].astype(str)
+        return label_clients(out)
+
+    def top_items(self, customer_id: str, n: int = 5) -> list:
+        code = self.customers.get_indexer([str(customer_id)])[0]
+        if code < 0:
+            return []
+        keys = self.item_counts.index.to_numpy()
+        counts = self.item_counts[(keys >> 32) == code].sort_values(ascending=False, kind="stable")
+        return self.items[counts.index.to_numpy()[:n] & 0xFFFFFFFF].tolist()
+
+
+def build_clients_table_streaming(csv_path: Path = CSV_PATH, chunksize: int = 500_000,
+                                  aggregator: ClientAggregator | None = None) -> pd.DataFrame:
+    agg = aggregator if aggregator is not None else ClientAggregator()
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        agg.add(clean_sales_frame(chunk))
+    return agg.clients_table()
+
 
 def get_client_context(df: pd.DataFrame, clients: pd.DataFrame, customer_id: str) -> Dict[str, Any] | None:
+    with span("data.client_context", path="scan"):
+        return _scan_client_context(df, clients, customer_id)
+
+
+def _scan_client_context(df: pd.DataFrame, clients: pd.DataFrame, customer_id: str) -> Dict[str, Any] | None:
     row = clients[clients["customer_id"] == str(customer_id)]
     if row.empty:
         return None
@@ -116,10 +312,15 @@ def get_client_context(df: pd.DataFrame, clients: pd.DataFrame, customer_id: str
     history = df[df["customer_id"] == str(customer_id)].sort_values("date", ascending=False)
 
     # Top items and recency summary
-    top_items = history["item"].value_counts().head(5).index.tolist()
-    recent_items = history.head(8)["item"].tolist()
+    top_items = history["item"].astype(str).value_counts().head(5).index.tolist()
+    recent_items = history.head(8)["item"].astype(str).tolist()
+
+    return _context_from_row(str(customer_id), r, top_items, recent_items)
 
-    avg_rating = r["avg_rating"] if r["avg_rating"] is not None else None
+
+def _context_from_row(customer_id: str, r: pd.Series, top_items: list, recent_items: list) -> Dict[str, Any]:
+    # Customers without ratings carry NaN (or None from older caches); JSON needs null.
+    avg_rating = None if pd.isna(r["avg_rating"]) else float(r["avg_rating"])
 
     return {
         "customer_id": str(customer_id),
@@ -135,3 +336,131 @@ def get_client_context(df: pd.DataFrame, clients: pd.DataFrame, customer_id: str
         "recent_items": recent_items,
         "suggestion_limit": int(r["suggestion_limit"]),
     }
+
+
+def _segments(keys: np.ndarray, ids: pd.Index) -> tuple[np.ndarray, np.ndarray]:
+    # Per-client (start, end) of the runs of equal `keys`; empty for clients without a run.
+    start = np.zeros(len(ids), dtype="int64")
+    end = np.zeros(len(ids), dtype="int64")
+    if len(keys):
+        b = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1], True])
+        pos = ids.get_indexer(keys[b[:-1]])
+        m = pos >= 0
+        start[pos[m]] = b[:-1][m]
+        end[pos[m]] = b[1:][m]
+    return start, end
+
+
+class ClientIndex:
+    # Per-customer lookup built once per data load: row positions into df sorted by
+    # date (newest first), plus precomputed top_items / recent_items. Everything is
+    # kept in flat arrays aligned with `clients`, so `python -m src.prebuild` can save
+    # it to the columnar cache and workers can memory-map it (see load).
+
+    def __init__(self, df: pd.DataFrame, clients: pd.DataFrame, top_n: int = 5, recent_n: int = 8):
+        ids = pd.Index(clients["customer_id"].tolist())
+
+        # Same-day purchases come out latest row first, as sort_values(ascending=False) does.
+        order = df.assign(_row=np.arange(len(df))).sort_values(
+            ["customer_id", "date", "_row"], ascending=[True, False, False], kind="mergesort", na_position="last"
+        )
+        rows = order["_row"].to_numpy()
+        start, end = _segments(order["customer_id"].to_numpy(), ids)
+
+        recent = order.groupby("customer_id", sort=False).head(recent_n)
+        recent_items = recent["item"].astype(str).to_numpy()
+        recent_start, recent_end = _segments(recent["customer_id"].to_numpy(), ids)
+
+        # value_counts order: count desc, ties by first appearance in the date-sorted history.
+        counts = order.assign(_pos=np.arange(len(order))).groupby(
+            ["customer_id", "item"], sort=False, observed=True
+        ).agg(n=("item", "size"), first=("_pos", "min")).reset_index()
+        counts["item"] = counts["item"].astype(str)
+        counts = counts.sort_values(["customer_id", "n", "first"], ascending=[True, False, True], kind="mergesort")
+        top = counts.groupby("customer_id", sort=False).head(top_n)
+        top_items = top["item"].to_numpy()
+        top_start, top_end = _segments(top["customer_id"].to_numpy(), ids)
+
+        items = pd.Index(pd.unique(np.concatenate([top_items, recent_items]))) if len(df) else pd.Index([], dtype=object)
+        arrays = {
+            "rows": rows, "start": start, "end": end,
+            "top_start": top_start, "top_end": top_end,
+            "top_codes": items.get_indexer(top_items).astype("int32"),
+            "recent_start": recent_start, "recent_end": recent_end,
+            "recent_codes": items.get_indexer(recent_items).astype("int32"),
+        }
+        self._init(df, clients, arrays, items)
+
+    def _init(self, df, clients, arrays: Dict[str, np.ndarray], items) -> None:
+        # `arrays` are used as given, so np.memmap arrays from load(mmap=True) stay shared.
+        self.df = df
+        self.clients = clients
+        self._client_pos = {cid: i for i, cid in enumerate(clients["customer_id"].tolist())}
+        self._arrays = arrays
+        self._rows, self._start, self._end = arrays["rows"], arrays["start"], arrays["end"]
+        self._top = (arrays["top_start"], arrays["top_end"], arrays["top_codes"])
+        self._recent = (arrays["recent_start"], arrays["recent_end"], arrays["recent_codes"])
+        self._items = np.asarray(items, dtype=object)
+
+    def save(self, path: Path, key: Dict[str, Any] | None = None) -> None:
+        save_arrays(self._arrays, path, key=key, extra={"items": [str(i) for i in self._items]})
+
+    @staticmethod
+    def saved_key(path: Path) -> Dict[str, Any] | None:
+        meta = read_meta(path)
+        return meta.get("key") if meta and "arrays" in meta else None
+
+    @classmethod
+    def load(cls, path: Path, df: pd.DataFrame, clients: pd.DataFrame, mmap: bool = False) -> "ClientIndex":
+        # `df` and `clients` must be the frames the index was saved with (same cache key).
+        arrays, meta = load_arrays(path, mmap=mmap)
+        self = cls.__new__(cls)
+        self._init(df, clients, arrays, meta["items"])
+        return self
+
+    def position(self, customer_id: str) -> int | None:
+        # Row of the customer in `clients`; ProfileStore looks positions up here too.
+        return self._client_pos.get(str(customer_id))
+
+    def __contains__(self, customer_id: str) -> bool:
+        return str(customer_id) in self._client_pos
+
+    def history(self, customer_id: str, limit: int | None = None) -> pd.DataFrame:
+        pos = self._client_pos.get(str(customer_id))
+        s, e = (int(self._start[pos]), int(self._end[pos])) if pos is not None else (0, 0)
+        if limit is not None:
+            e = min(e, s + limit)
+        return self.df.iloc[self._rows[s:e]]
+
+    def _items_at(self, pos: int | None, which) -> list:
+        if pos is None:
+            return []
+        starts, ends, codes = which
+        return self._items[codes[starts[pos]:ends[pos]]].tolist()
+
+    def item_summary(self, customer_id: str) -> tuple[list, list]:
+        pos = self._client_pos.get(str(customer_id))
+        return self._items_at(pos, self._top), self._items_at(pos, self._recent)
+
+    def context(self, customer_id: str) -> Dict[str, Any] | None:
+        customer_id = str(customer_id)
+        pos = self._client_pos.get(customer_id)
+        if pos is None:
+            return None
+        r = self.clients.iloc[pos]
+        return _context_from_row(customer_id, r, self._items_at(pos, self._top), self._items_at(pos, self._recent))
+
+
+def build_client_index(df: pd.DataFrame, clients: pd.DataFrame) -> ClientIndex:
+    with span("data.build_client_index"):
+        return ClientIndex(df, clients)
+
+
+def load_client_index(df: pd.DataFrame, clients: pd.DataFrame, key: Dict[str, Any],
+                      cache_dir: Path | None = CACHE_DIR, mmap: bool = False) -> ClientIndex:
+    # The prebuilt index when it was saved for the same CSV (and so the same cached
+    # df/clients row order), otherwise built from the frames.
+    path = cache_dir / "client_index" if cache_dir else None
+    if path is not None and ClientIndex.saved_key(path) == key:
+        return ClientIndex.load(path, df, clients, mmap=mmap)
+    return build_client_index(df, clients)
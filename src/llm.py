@@ -1,15 +1,20 @@
+import asyncio
 import os
+import time
+from typing import AsyncIterator
 from dotenv import load_dotenv
-from google import genai
+
+from src.llm_cache import LLM_CACHE
+from src.llm_providers import get_provider
+from src.metrics import inc, observe, span
 
 load_dotenv(dotenv_path="src/.env")
 
-API_KEY = os.getenv("GEMINI_API_KEY", "")
 DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+# Max outstanding async LLM calls per process; extra callers wait for a slot.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
 
 
-client = genai.Client(api_key=API_KEY)
-
 COMPLEX_KEYWORDS = {
     "refund", "return", "exchange", "late", "exception", "policy",
     "dispute", "chargeback", "damaged", "defective", "complaint",
@@ -25,7 +30,10 @@ def _pick_model(question: str, rag_context: str, tier: str) -> str:
     high_tier = t in {"gold", "vip"}
 
     if complex_q or long_ctx or high_tier:
+        reason = "complex_question" if complex_q else "long_context" if long_ctx else "high_tier"
+        inc("model_routing_total", model="gemini-2.5-flash", reason=reason)
         return "gemini-2.5-flash"
+    inc("model_routing_total", model="gemini-2.5-flash-lite", reason="default")
     return "gemini-2.5-flash-lite"
 
 ALLOWED_MODELS = {
@@ -33,12 +41,85 @@ ALLOWED_MODELS = {
     "gemini-2.5-flash-lite",
 }
 
-def gemini_text(prompt: str, *, question: str = "", rag_context: str = "", tier: str = "", model: str | None = None) -> tuple[str, str]:
+def _resolve_model(question: str, rag_context: str, tier: str, model: str | None) -> str:
     if model in ALLOWED_MODELS:
-        model_name = model
-    else:
-        model_name = _pick_model(question, rag_context, tier)
+        inc("model_routing_total", model=model, reason="requested")
+        return model
+    return _pick_model(question, rag_context, tier)
+
+
+def gemini_text(prompt: str, *, question: str = "", rag_context: str = "", tier: str = "", model: str | None = None) -> tuple[str, str]:
+    model_name = _resolve_model(question, rag_context, tier, model)
+
+    with span("llm.generate", model=model_name):
+        text = get_provider().generate(model_name, prompt)
+    return text, model_name
+
+
+_llm_slots: asyncio.Semaphore | None = None
+
+
+def _get_llm_slots() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop.
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_slots
+
+
+async def gemini_text_async(prompt: str, *, question: str = "", rag_context: str = "", tier: str = "", model: str | None = None,
+                            endpoint: str | None = None) -> tuple[str, str]:
+    # `endpoint` opts the call into the persistent response cache (see LLM_CACHE_ENDPOINTS).
+    model_name = _resolve_model(question, rag_context, tier, model)
+    use_cache = LLM_CACHE.enabled_for(endpoint)
+    if use_cache:
+        cached = await LLM_CACHE.get(endpoint, model_name, prompt)
+        if cached is not None:
+            return cached, model_name
+
+    t0 = time.perf_counter()
+    async with _get_llm_slots():
+        observe("llm.slot_wait", time.perf_counter() - t0)
+        try:
+            with span("llm.generate", model=model_name):
+                text = await get_provider().agenerate(model_name, prompt)
+        except Exception as e:
+            inc("llm_errors_total", model=model_name, error=type(e).__name__)
+            raise
+    if use_cache and text:
+        await LLM_CACHE.put(endpoint, model_name, prompt, text)
+    return text, model_name
+
+
+
+async def gemini_stream_async(prompt: str, *, question: str = "", rag_context: str = "", tier: str = "", model: str | None = None,
+                              endpoint: str | None = None) -> tuple[AsyncIterator[str], str]:
+    # Same routing and caching as gemini_text_async, but yields text as Gemini produces it.
+    model_name = _resolve_model(question, rag_context, tier, model)
+    use_cache = LLM_CACHE.enabled_for(endpoint)
+    cached = await LLM_CACHE.get(endpoint, model_name, prompt) if use_cache else None
 
-    resp = client.models.generate_content(model=model_name, contents=prompt)
-    return (resp.text or ""), model_name
+    async def chunks() -> AsyncIterator[str]:
+        if cached is not None:
+            yield cached
+            return
+        parts: list[str] = []
+        t0 = time.perf_counter()
+        async with _get_llm_slots():
+            observe("llm.slot_wait", time.perf_counter() - t0)
+            t0 = time.perf_counter()
+            try:
+                async for text in get_provider().astream(model_name, prompt):
+                    if not parts:
+                        observe("llm.first_token", time.perf_counter() - t0, model=model_name)
+                    parts.append(text)
+                    yield text
+            except Exception as e:
+                inc("llm_errors_total", model=model_name, error=type(e).__name__)
+                raise
+            observe("llm.generate", time.perf_counter() - t0, model=model_name)
+        text = "".join(parts)
+        if use_cache and text:
+            await LLM_CACHE.put(endpoint, model_name, prompt, text)
 
+    return chunks(), model_name
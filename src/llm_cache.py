@@ -0,0 +1,147 @@
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "dat/cache/llm_cache.sqlite"))
+CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 2**20)))
+# Comma-separated endpoints whose LLM calls are cached ("" disables the cache).
+CACHE_ENDPOINTS = {e.strip() for e in os.getenv("LLM_CACHE_ENDPOINTS", "chat,email_suggestion").split(",") if e.strip()}
+# Size-based eviction runs after this many writes rather than on every put.
+EVICT_EVERY = 100
+
+metadata = MetaData()
+
+responses = Table(
+    "llm_responses",
+    metadata,
+    Column("key", String(64), primary_key=True),
+    Column("model", String(64), nullable=False),
+    Column("endpoint", String(64), nullable=False),
+    Column("text", Text, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("accessed_at", Float, nullable=False, index=True),
+)
+
+
+def cache_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, path: Path = CACHE_PATH, ttl_s: float = CACHE_TTL_S,
+                 max_bytes: int = CACHE_MAX_BYTES, endpoints: set | None = None):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.endpoints = set(CACHE_ENDPOINTS if endpoints is None else endpoints)
+        self._engine: AsyncEngine | None = None
+        self._writes = 0
+        self.stats_by_endpoint: Dict[str, Dict[str, int]] = {}
+
+    def enabled_for(self, endpoint: str | None) -> bool:
+        return bool(endpoint) and endpoint in self.endpoints
+
+    async def _get_engine(self) -> AsyncEngine:
+        if self._engine is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            engine = create_async_engine(f"sqlite+aiosqlite:///{self.path}")
+            async with engine.begin() as conn:
+                await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+                await conn.run_sync(metadata.create_all)
+            self._engine = engine
+        return self._engine
+
+    def _count(self, endpoint: str, what: str) -> None:
+        s = self.stats_by_endpoint.setdefault(endpoint, {"hits": 0, "misses": 0, "writes": 0})
+        s[what] += 1
+
+    async def get(self, endpoint: str, model: str, prompt: str) -> str | None:
+        engine = await self._get_engine()
+        key = cache_key(model, prompt)
+        now = time.time()
+        async with engine.begin() as conn:
+            row = (await conn.execute(
+                select(responses.c.text, responses.c.created_at).where(responses.c.key == key)
+            )).first()
+            if row is not None and self.ttl_s > 0 and now - row.created_at > self.ttl_s:
+                await conn.execute(delete(responses).where(responses.c.key == key))
+                row = None
+            if row is None:
+                self._count(endpoint, "misses")
+                return None
+            await conn.execute(update(responses).where(responses.c.key == key).values(accessed_at=now))
+        self._count(endpoint, "hits")
+        return row.text
+
+    async def put(self, endpoint: str, model: str, prompt: str, text: str) -> None:
+        engine = await self._get_engine()
+        now = time.time()
+        row = {
+            "key": cache_key(model, prompt), "model": model, "endpoint": endpoint, "text": text,
+            "size": len(text.encode("utf-8")), "created_at": now, "accessed_at": now,
+        }
+        async with engine.begin() as conn:
+            await conn.execute(responses.insert().prefix_with("OR REPLACE").values(**row))
+        self._count(endpoint, "writes")
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            await self.evict()
+
+    async def evict(self) -> int:
+        # Drop expired rows, then least-recently-used rows until under max_bytes.
+        engine = await self._get_engine()
+        removed = 0
+        async with engine.begin() as conn:
+            if self.ttl_s > 0:
+                res = await conn.execute(delete(responses).where(responses.c.created_at < time.time() - self.ttl_s))
+                removed += res.rowcount or 0
+            total = (await conn.execute(select(func.coalesce(func.sum(responses.c.size), 0)))).scalar_one()
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                rows = await conn.execute(
+                    select(responses.c.key, responses.c.size).order_by(responses.c.accessed_at)
+                )
+                doomed = []
+                for key, size in rows:
+                    if excess <= 0:
+                        break
+                    doomed.append(key)
+                    excess -= size
+                if doomed:
+                    await conn.execute(delete(responses).where(responses.c.key.in_(doomed)))
+                    removed += len(doomed)
+        return removed
+
+    async def stats(self) -> Dict[str, Any]:
+        engine = await self._get_engine()
+        async with engine.connect() as conn:
+            entries, size = (await conn.execute(
+                select(func.count(), func.coalesce(func.sum(responses.c.size), 0)).select_from(responses)
+            )).one()
+        hits = sum(s["hits"] for s in self.stats_by_endpoint.values())
+        lookups = hits + sum(s["misses"] for s in self.stats_by_endpoint.values())
+        return {
+            "path": str(self.path),
+            "entries": int(entries),
+            "bytes": int(size),
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "enabled_endpoints": sorted(self.endpoints),
+            "hit_ratio": (hits / lookups) if lookups else 0.0,
+            "by_endpoint": self.stats_by_endpoint,
+        }
+
+    async def close(self) -> None:
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+
+LLM_CACHE = LLMResponseCache()
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+from typing import AsyncIterator, Protocol
+
+
+class LLMProvider(Protocol):
+    name: str
+
+    def generate(self, model: str, prompt: str) -> str: ...
+
+    async def agenerate(self, model: str, prompt: str) -> str: ...
+
+    async def astream(self, model: str, prompt: str) -> AsyncIterator[str]: ...
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self, api_key: str | None = None):
+        self.api_key = api_key if api_key is not None else os.getenv("GEMINI_API_KEY", "")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Built on first use, so importing the app (or running it with the fake
+        # provider) never needs google-genai credentials.
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def generate(self, model: str, prompt: str) -> str:
+        resp = self.client.models.generate_content(model=model, contents=prompt)
+        return resp.text or ""
+
+    async def agenerate(self, model: str, prompt: str) -> str:
+        resp = await self.client.aio.models.generate_content(model=model, contents=prompt)
+        return resp.text or ""
+
+    async def astream(self, model: str, prompt: str) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(model=model, contents=prompt)
+        async for resp in stream:
+            if resp.text:
+                yield resp.text
+
+
+class FakeLLMError(RuntimeError):
+    pass
+
+
+FAKE_ANSWER = (
+    "Thanks for reaching out.\n"
+    "Based on our policy, eligible items can be returned within the stated window [1].\n"
+    "SECTION A: Based on this client’s history and status, these picks fit their usual categories.\n"
+    "SECTION B:\nSubject: New picks for you\nBody:\nHi there,\nHere are a few ideas you might like.\n"
+    "Next steps:\n- Share the item name and purchase date"
+)
+
+
+class FakeProvider:
+    # Stands in for Gemini in benches: no network, no quota. Latency is drawn per call
+    # (lognormal around `latency_s`, or "exp" / "fixed"), streamed text arrives at
+    # `tokens_per_s` words per second, and `error_rate` of calls raise FakeLLMError.
+    name = "fake"
+
+    def __init__(self, latency_s: float = 0.8, dist: str = "lognormal", sigma: float = 0.5,
+                 tokens_per_s: float = 50.0, error_rate: float = 0.0, answer: str = FAKE_ANSWER,
+                 seed: int | None = None):
+        if dist not in ("lognormal", "exp", "fixed"):
+            raise ValueError(f"unknown latency distribution {dist!r}")
+        self.latency_s = latency_s
+        self.dist = dist
+        self.sigma = sigma
+        self.tokens_per_s = tokens_per_s
+        self.error_rate = error_rate
+        self.answer = answer
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeProvider":
+        return cls(
+            latency_s=float(os.getenv("FAKE_LLM_LATENCY_S", "0.8")),
+            dist=os.getenv("FAKE_LLM_DIST", "lognormal"),
+            sigma=float(os.getenv("FAKE_LLM_SIGMA", "0.5")),
+            tokens_per_s=float(os.getenv("FAKE_LLM_TOKENS_PER_S", "50")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+        )
+
+    def _latency(self) -> float:
+        if self.dist == "fixed" or self.latency_s <= 0:
+            return max(0.0, self.latency_s)
+        if self.dist == "exp":
+            return self._rng.expovariate(1.0 / self.latency_s)
+        # Median latency_s with a long right tail, like real LLM round trips.
+        return self._rng.lognormvariate(0.0, self.sigma) * self.latency_s
+
+    def _check_error(self) -> None:
+        self.calls += 1
+        if self.error_rate and self._rng.random() < self.error_rate:
+            raise FakeLLMError("injected failure")
+
+    def _text(self, model: str, prompt: str) -> str:
+        tag = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"{self.answer}\n(fake {model} {tag})"
+
+    def generate(self, model: str, prompt: str) -> str:
+        self._check_error()
+        time.sleep(self._latency())
+        return self._text(model, prompt)
+
+    async def agenerate(self, model: str, prompt: str) -> str:
+        self._check_error()
+        await asyncio.sleep(self._latency())
+        return self._text(model, prompt)
+
+    async def astream(self, model: str, prompt: str) -> AsyncIterator[str]:
+        self._check_error()
+        # Time to first token is the sampled latency; the rest streams at tokens_per_s.
+        await asyncio.sleep(self._latency())
+        words = self._text(model, prompt).split(" ")
+        delay = 1.0 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+        for i, w in enumerate(words):
+            if i and delay:
+                await asyncio.sleep(delay)
+            yield w if i == len(words) - 1 else w + " "
+
+
+_provider: LLMProvider | None = None
+
+
+def get_provider() -> LLMProvider:
+    # LLM_PROVIDER=gemini (default) or fake; read on first use so src/.env applies.
+    global _provider
+    if _provider is None:
+        kind = os.getenv("LLM_PROVIDER", "gemini")
+        if kind == "fake":
+            _provider = FakeProvider.from_env()
+        elif kind == "gemini":
+            _provider = GeminiProvider()
+        else:
+            raise ValueError(f"unknown LLM_PROVIDER {kind!r}; expected 'gemini' or 'fake'")
+    return _provider
+
+
+def set_provider(provider: LLMProvider) -> None:
+    global _provider
+    _provider = provider
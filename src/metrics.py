@@ -0,0 +1,169 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, List, Tuple
+
+# In-process latency histograms and counters, rendered in Prometheus text format
+# by /metrics. With METRICS_ENABLED=0, span() and inc() are no-ops.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "False", "")
+PREFIX = "retailops"
+# Seconds; covers cache hits (sub-ms) through slow LLM calls.
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+QUANTILES = (0.50, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += value
+            self.n += 1
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation inside the bucket, as Prometheus' histogram_quantile does.
+        with self._lock:
+            counts, n = list(self.counts), self.n
+        if n == 0:
+            return float("nan")
+        rank = q * n
+        seen = 0
+        for i, c in enumerate(counts):
+            if seen + c >= rank and c:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lo = self.buckets[i - 1] if i else 0.0
+                return lo + (self.buckets[i] - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.total, self.n
+
+
+class Registry:
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str, labels: Dict[str, str] | None = None) -> Histogram:
+        key = (stage, tuple(sorted((labels or {}).items())))
+        h = self.histograms.get(key)
+        if h is None:
+            with self._lock:
+                h = self.histograms.setdefault(key, Histogram())
+        return h
+
+    def inc(self, name: str, labels: Dict[str, str] | None = None, value: float = 1.0) -> None:
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        # {"stage{label=...}": {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}} for benches and debugging.
+        out = {}
+        for (stage, labels), h in sorted(self.histograms.items()):
+            _, total, n = h.snapshot()
+            name = stage + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+            row = {"count": n, "mean_ms": (total / n * 1000) if n else 0.0}
+            for q in QUANTILES:
+                row[f"p{int(q * 100)}_ms"] = h.quantile(q) * 1000
+            out[name] = row
+        return out
+
+    def counter_values(self) -> Dict[str, float]:
+        with self._lock:
+            items = sorted(self.counters.items())
+        return {name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): v
+                for (name, labels), v in items}
+
+    def render(self) -> str:
+        lines: List[str] = []
+        name = f"{PREFIX}_stage_latency_seconds"
+        lines += [f"# HELP {name} Time spent per request stage.", f"# TYPE {name} histogram"]
+        quantile_lines: List[str] = []
+        for (stage, labels), h in sorted(self.histograms.items()):
+            base = _labels((("stage", stage),) + labels)
+            counts, total, n = h.snapshot()
+            cumulative = 0
+            for le, c in zip(h.buckets + (float("inf"),), counts):
+                cumulative += c
+                le_s = "+Inf" if le == float("inf") else repr(le)
+                lines.append(f'{name}_bucket{_labels((("stage", stage),) + labels + (("le", le_s),))} {cumulative}')
+            lines.append(f"{name}_sum{base} {total!r}")
+            lines.append(f"{name}_count{base} {n}")
+            for q in QUANTILES:
+                v = h.quantile(q)
+                if v == v:
+                    quantile_lines.append(
+                        f'{PREFIX}_stage_latency_quantile_seconds{_labels((("stage", stage),) + labels + (("quantile", str(q)),))} {v!r}'
+                    )
+        qname = f"{PREFIX}_stage_latency_quantile_seconds"
+        lines += [f"# HELP {qname} p50/p95/p99 estimated from the stage histograms.", f"# TYPE {qname} gauge"]
+        lines += quantile_lines
+
+        by_name: Dict[str, List[str]] = {}
+        with self._lock:
+            counters = sorted(self.counters.items())
+        for (cname, labels), v in counters:
+            by_name.setdefault(cname, []).append(f"{PREFIX}_{cname}{_labels(labels)} {v!r}")
+        for cname, rows in by_name.items():
+            lines += [f"# TYPE {PREFIX}_{cname} counter"] + rows
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+REGISTRY = Registry()
+_NOOP = nullcontext()
+
+
+@contextmanager
+def _span(stage: str, labels: Dict[str, str] | None) -> Iterator[None]:
+    h = REGISTRY.histogram(stage, labels)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        h.observe(time.perf_counter() - t0)
+
+
+def span(stage: str, **labels: str):
+    # `with span("rag.encode"):` records the block's wall time under that stage.
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _span(stage, labels)
+
+
+def observe(stage: str, seconds: float, **labels: str) -> None:
+    if METRICS_ENABLED:
+        REGISTRY.histogram(stage, labels).observe(seconds)
+
+
+def inc(name: str, value: float = 1.0, **labels: str) -> None:
+    if METRICS_ENABLED:
+        REGISTRY.inc(name, labels, value)
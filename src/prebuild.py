@@ -0,0 +1,33 @@
+import argparse
+import time
+from pathlib import Path
+
+from src.data import CACHE_DIR, CSV_PATH, build_client_index, csv_cache_key, load_sales_data
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def prebuild(csv_path: Path = CSV_PATH, cache_dir: Path = CACHE_DIR) -> None:
+    # Writes everything SHARED_MMAP=1 workers map instead of building: the cleaned
+    # transactions and clients tables and the per-client index, as column files.
+    t0 = time.perf_counter()
+    df, clients = load_sales_data(csv_path, cache_dir=cache_dir)  # (re)writes sales/ and clients/ if stale
+    index = build_client_index(df, clients)
+    index.save(cache_dir / "client_index", key=csv_cache_key(csv_path))
+    print(f"Prebuilt {cache_dir} in {time.perf_counter() - t0:.2f}s")
+    for part in ("sales", "clients", "client_index"):
+        print(f"  {part}: {dir_size(cache_dir / part) / 2**20:.1f} MiB")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Build the column files that SHARED_MMAP=1 API workers memory-map.")
+    ap.add_argument("--csv", type=Path, default=CSV_PATH)
+    ap.add_argument("--cache-dir", type=Path, default=CACHE_DIR)
+    args = ap.parse_args()
+    prebuild(args.csv, args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
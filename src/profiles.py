@@ -0,0 +1,278 @@
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from src.data import (
+    TIER_SUGGESTION_LIMITS, ClientIndex, _context_from_row, build_client_index,
+    classify_modes, classify_tiers,
+)
+from src.sketch import CountHistogram, DDSketch
+
+QUANTILES = (0.50, 0.80, 0.95)
+
+
+class ProfileStore:
+    # Client profiles that accept new transactions after load. Aggregates of the
+    # touched customers are updated in place; the p50/p80/p95 tier thresholds are
+    # maintained by a DDSketch (spend) and an exact histogram (purchase counts),
+    # and tiers are re-derived only for customers that were touched or whose
+    # spend/count lies between an old and a new threshold. Thresholds are exact
+    # at load; after an append each spend threshold is the sketch's answer, within
+    # spend_sketch.relative_accuracy (0.5%) of the spend of the customer at that
+    # rank, so a customer whose spend is that close to a cut-off can get the
+    # neighbouring tier until the next full reload. Count thresholds stay exact.
+    #
+    # The clients frame passed in (memory-mapped under SHARED_MMAP) is never
+    # written: append() copies the rows it changes or adds into a per-worker
+    # overlay, indexed by position, and reads prefer the overlay row.
+
+    def __init__(self, df: pd.DataFrame, clients: pd.DataFrame, index: ClientIndex | None = None):
+        self.df = df
+        if not clients.index.equals(pd.RangeIndex(len(clients))):
+            clients = clients.reset_index(drop=True)
+        self._base = clients
+        self.index = index if index is not None else build_client_index(df, clients)
+        # Loaded customers are looked up through the client index (same row order);
+        # customers first seen by append() get positions after the base rows.
+        self._new_pos: Dict[str, int] = {}
+        # Changed and added rows plus their running rating sum; None until the first append.
+        self._overlay: pd.DataFrame | None = None
+        self._appended: Dict[str, pd.DataFrame] = {}
+        self._lock = threading.RLock()
+        # Chained hash of every appended batch; empty until the first append. Workers
+        # that applied the same batches in the same order end up with the same value.
+        self.appended_digest = ""
+
+        spend = clients["total_spend"].to_numpy(dtype=float)
+        cnt = clients["purchase_count"].to_numpy(dtype="int64")
+        self.spend_sketch = DDSketch()
+        self.spend_sketch.add(spend)
+        self.count_hist = CountHistogram()
+        self.count_hist.add(cnt)
+        # Exact at load so labels match build_clients_table.
+        self.spend_q = tuple(np.quantile(spend, QUANTILES).tolist()) if len(spend) else (np.nan,) * len(QUANTILES)
+        self.count_q = tuple(np.quantile(cnt, QUANTILES).tolist()) if len(cnt) else (np.nan,) * len(QUANTILES)
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._new_pos)
+
+    def thresholds(self) -> Dict[str, Dict[str, float]]:
+        names = [f"p{int(q * 100)}" for q in QUANTILES]
+        return {
+            "spend_quantiles": dict(zip(names, map(float, self.spend_q))),
+            "count_quantiles": dict(zip(names, map(float, self.count_q))),
+            "spend_relative_accuracy": self.spend_sketch.relative_accuracy,
+        }
+
+    def _position(self, customer_id: str) -> int | None:
+        pos = self.index.position(customer_id)
+        return self._new_pos.get(customer_id) if pos is None else pos
+
+    def _row(self, pos: int) -> pd.Series:
+        if self._overlay is not None and pos in self._overlay.index:
+            return self._overlay.loc[pos]
+        return self._base.iloc[pos]
+
+    def _frame(self, columns: List[str]) -> pd.DataFrame:
+        # Current values of `columns` for every client, as a new frame.
+        out = self._base[columns].copy()
+        if self._overlay is None:
+            return out
+        idx = self._overlay.index.to_numpy()
+        old = idx < len(out)
+        for col in columns:
+            out.iloc[idx[old], out.columns.get_loc(col)] = self._overlay[col].to_numpy()[old]
+        if not old.all():
+            out = pd.concat([out, self._overlay.loc[~old, columns].sort_index()], ignore_index=True)
+        return out
+
+    def _touch(self, pos: np.ndarray) -> None:
+        # Copy base rows into the overlay before their first write.
+        if self._overlay is not None:
+            pos = pos[~np.isin(pos, self._overlay.index.to_numpy())]
+        if not len(pos):
+            return
+        rows = self._base.iloc[pos].set_axis(pos)
+        rated = rows["rated_count"].to_numpy(dtype=float)
+        rows["rating_sum"] = np.nan_to_num(rows["avg_rating"].to_numpy(dtype=float, na_value=np.nan)) * rated
+        self._extend_overlay(rows)
+
+    def _extend_overlay(self, rows: pd.DataFrame) -> None:
+        self._overlay = rows if self._overlay is None else pd.concat([self._overlay, rows])
+
+    def history(self, customer_id: str, limit: int | None = None) -> pd.DataFrame:
+        customer_id = str(customer_id)
+        base = self.index.history(customer_id, limit=limit)
+        extra = self._appended.get(customer_id)
+        if extra is None:
+            return base
+        out = pd.concat([extra, base]).sort_values("date", ascending=False, kind="stable")
+        return out if limit is None else out.head(limit)
+
+    def context(self, customer_id: str) -> Dict[str, Any] | None:
+        customer_id = str(customer_id)
+        with self._lock:
+            pos = self._position(customer_id)
+            if pos is None:
+                return None
+            r = self._row(pos)
+            if customer_id in self._appended:
+                hist = self.history(customer_id)
+                top_items = hist["item"].astype(str).value_counts().head(5).index.tolist()
+                recent_items = hist.head(8)["item"].astype(str).tolist()
+            else:
+                top_items, recent_items = self.index.item_summary(customer_id)
+            return _context_from_row(customer_id, r, top_items, recent_items)
+
+    def table(self, columns: List[str]) -> pd.DataFrame:
+        # Consistent copy of the given client columns, safe against concurrent append().
+        with self._lock:
+            return self._frame(columns)
+
+    def select(self, tiers: Iterable[str] | None = None, modes: Iterable[str] | None = None,
+               purchased_after=None, purchased_before=None) -> List[str]:
+        # Vectorized filter over the clients table; date bounds are inclusive.
+        with self._lock:
+            c = self._frame(["customer_id", "tier", "mode", "last_purchase"])
+        mask = np.ones(len(c), dtype=bool)
+        if tiers:
+            mask &= c["tier"].str.lower().isin([t.lower() for t in tiers]).to_numpy()
+        if modes:
+            mask &= c["mode"].str.lower().isin([m.lower() for m in modes]).to_numpy()
+        if purchased_after is not None:
+            mask &= (c["last_purchase"] >= pd.Timestamp(purchased_after)).to_numpy()
+        if purchased_before is not None:
+            mask &= (c["last_purchase"] <= pd.Timestamp(purchased_before)).to_numpy()
+        return c.loc[mask, "customer_id"].astype(str).tolist()
+
+    def contexts(self, customer_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        # Bulk context(): one pass over the untouched rows instead of a lookup per call.
+        with self._lock:
+            ids = list(dict.fromkeys(str(cid) for cid in customer_ids))
+            found = {cid: pos for cid, pos in ((cid, self._position(cid)) for cid in ids) if pos is not None}
+            touched = set() if self._overlay is None else set(self._overlay.index.tolist())
+            out = {cid: self.context(cid) for cid, pos in found.items() if pos in touched}
+            base = [pos for pos in found.values() if pos not in touched]
+            for r in self._base.iloc[base].to_dict("records"):
+                cid = str(r["customer_id"])
+                out[cid] = _context_from_row(cid, r, *self.index.item_summary(cid))
+            return {cid: out[cid] for cid in found}
+
+    def append(self, tx: pd.DataFrame) -> Dict[str, int]:
+        tx = _normalize_transactions(tx)
+        part = tx.groupby("customer_id").agg(
+            spend=("amount", "sum"), n=("amount", "size"), last=("date", "max"),
+            rating_sum=("rating", "sum"), rated=("rating", "count"),
+        )
+
+        with self._lock:
+            new_ids = [cid for cid in part.index if self._position(cid) is None]
+            if new_ids:
+                self._add_customers(new_ids)
+            pos = np.array([self._position(cid) for cid in part.index], dtype="int64")
+            self._touch(pos)
+
+            c = self._overlay
+            old_spend = c.loc[pos, "total_spend"].to_numpy(dtype=float)
+            old_cnt = c.loc[pos, "purchase_count"].to_numpy(dtype="int64")
+            existing = old_cnt > 0
+            self.spend_sketch.remove(old_spend[existing])
+            self.count_hist.remove(old_cnt[existing])
+
+            spend = old_spend + part["spend"].to_numpy(dtype=float)
+            cnt = old_cnt + part["n"].to_numpy(dtype="int64")
+            rated = c.loc[pos, "rated_count"].to_numpy(dtype="int64") + part["rated"].to_numpy()
+            rating_sum = c.loc[pos, "rating_sum"].to_numpy(dtype=float) + part["rating_sum"].to_numpy(dtype=float)
+            last = c.loc[pos, "last_purchase"]
+            last = np.where(last.isna() | (part["last"].to_numpy() > last.to_numpy()), part["last"].to_numpy(), last.to_numpy())
+
+            c.loc[pos, "total_spend"] = spend
+            c.loc[pos, "purchase_count"] = cnt
+            c.loc[pos, "rated_count"] = rated
+            c.loc[pos, "rating_sum"] = rating_sum
+            c.loc[pos, "last_purchase"] = last
+            c.loc[pos, "avg_rating"] = np.divide(rating_sum, rated, out=np.full(len(pos), np.nan), where=rated > 0)
+            c.loc[pos, "avg_amount"] = spend / cnt
+            c.loc[pos, "rating_coverage"] = rated / cnt
+            self.spend_sketch.add(spend)
+            self.count_hist.add(cnt)
+
+            old_q = self.spend_q, self.count_q
+            self.spend_q = tuple(self.spend_sketch.quantile(q) for q in QUANTILES)
+            self.count_q = tuple(self.count_hist.quantile(q) for q in QUANTILES)
+
+            cur = self._frame(["total_spend", "purchase_count", "avg_rating", "rating_coverage", "tier", "mode"])
+            affected = np.zeros(len(cur), dtype=bool)
+            affected[pos] = True
+            all_spend = cur["total_spend"].to_numpy(dtype=float)
+            all_cnt = cur["purchase_count"].to_numpy(dtype=float)
+            for values, old, new in ((all_spend, old_q[0], self.spend_q), (all_cnt, old_q[1], self.count_q)):
+                for a, b in zip(old, new):
+                    if a != b:
+                        affected |= (values >= min(a, b)) & (values <= max(a, b))
+            relabeled = self._relabel(cur, np.flatnonzero(affected))
+
+            for cid, rows in tx.groupby("customer_id", sort=False):
+                prev = self._appended.get(cid)
+                self._appended[cid] = rows if prev is None else pd.concat([prev, rows])
+            h = hashlib.sha1(self.appended_digest.encode())
+            h.update(pd.util.hash_pandas_object(tx, index=False).to_numpy().tobytes())
+            self.appended_digest = h.hexdigest()
+
+        return {
+            "transactions": len(tx),
+            "updated_customers": int(len(part) - len(new_ids)),
+            "new_customers": len(new_ids),
+            "relabeled": int(len(np.flatnonzero(affected))),
+            "tier_changes": relabeled,
+        }
+
+    def _relabel(self, cur: pd.DataFrame, pos: np.ndarray) -> int:
+        # Only rows whose tier or mode actually changes are written (and so copied).
+        r = cur.iloc[pos]
+        ar = r["avg_rating"].to_numpy(dtype=float, na_value=np.nan)
+        tiers = classify_tiers(
+            r["total_spend"].to_numpy(dtype=float), r["purchase_count"].to_numpy(dtype=float),
+            ar, self.spend_q, self.count_q,
+        )
+        modes = classify_modes(ar, r["rating_coverage"].to_numpy(dtype=float))
+        tier_changed = r["tier"].to_numpy() != tiers
+        changed = tier_changed | (r["mode"].to_numpy() != modes)
+        pos, tiers, modes = pos[changed], tiers[changed], modes[changed]
+        self._touch(pos)
+        self._overlay.loc[pos, "tier"] = tiers
+        self._overlay.loc[pos, "mode"] = modes
+        self._overlay.loc[pos, "suggestion_limit"] = [TIER_SUGGESTION_LIMITS[t] for t in tiers]
+        return int(tier_changed.sum())
+
+    def _add_customers(self, ids: list) -> None:
+        start = len(self)
+        pos = np.arange(start, start + len(ids))
+        rows = pd.DataFrame({"customer_id": pd.array(ids, dtype=str)}, index=pos)
+        for col in self._base.columns:
+            if col == "customer_id":
+                continue
+            if col in ("tier", "mode"):
+                rows[col] = pd.array(["bronze" if col == "tier" else "cautious"] * len(ids), dtype=self._base[col].dtype)
+            elif col == "last_purchase":
+                rows[col] = pd.Series(pd.NaT, index=rows.index, dtype=self._base[col].dtype)
+            else:
+                rows[col] = np.zeros(len(ids), dtype=self._base[col].dtype)
+        rows["rating_sum"] = 0.0
+        self._extend_overlay(rows)
+        self._new_pos.update({cid: int(p) for cid, p in zip(ids, pos)})
+
+
+def _normalize_transactions(tx: pd.DataFrame) -> pd.DataFrame:
+    tx = tx.copy()
+    tx["customer_id"] = tx["customer_id"].astype(str)
+    tx["item"] = tx["item"].astype(str)
+    tx["amount"] = pd.to_numeric(tx["amount"], errors="coerce").fillna(0.0)
+    tx["date"] = pd.to_datetime(tx["date"], errors="coerce")
+    tx["rating"] = pd.to_numeric(tx.get("rating"), errors="coerce")
+    if "payment_method" not in tx:
+        tx["payment_method"] = None
+    return tx[["customer_id", "item", "amount", "date", "rating", "payment_method"]]
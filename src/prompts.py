@@ -0,0 +1,181 @@
+from src.schemas import EmailSuggestionResponse
+
+
+def tier_ack_line(tier: str, mode: str) -> str:
+    tier = (tier or "").lower()
+    mode = (mode or "").lower()
+
+    if tier == "vip":
+        base = "Thanks for being one of our VIP customers."
+    elif tier == "gold":
+        base = "Thanks for being a Gold customer."
+    elif tier == "silver":
+        base = "Thanks for being a Silver customer."
+    else:
+        base = "Thanks for reaching out."
+
+    if mode == "optimistic":
+        return base + " I’ll be proactive and share the best options available under our policy."
+    return base + " I’ll help, but I may need a couple details to confirm eligibility under policy."
+
+
+def parse_email_sections(text: str) -> tuple[str, str, str]:
+    platform_summary = ""
+    subject = "Discover new picks for you"
+    body = text.strip()
+
+    lower = text.lower()
+    if "section a:" in lower and "section b:" in lower:
+        parts = text.split("SECTION B:", 1)
+        a_part = parts[0]
+        b_part = parts[1] if len(parts) > 1 else ""
+
+
+        if "SECTION A:" in a_part:
+            platform_summary = a_part.split("SECTION A:", 1)[1].strip()
+        else:
+            platform_summary = a_part.strip()
+
+
+        b_lines = b_part.strip().splitlines()
+
+        for i, line in enumerate(b_lines):
+            if line.lower().startswith("subject:"):
+                subject = line.split(":", 1)[1].strip() or subject
+                rest = "\n".join(b_lines[i+1:]).strip()
+                if "Body:" in rest:
+                    body = rest.split("Body:", 1)[1].strip()
+                else:
+                    body = rest
+                break
+
+        return platform_summary, subject, body
+
+
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if line.lower().startswith("subject:"):
+            subject = line.split(":", 1)[1].strip() or subject
+            rest = "\n".join(lines[i+1:]).strip()
+            if "Body:" in rest:
+                body = rest.split("Body:", 1)[1].strip()
+            else:
+                body = rest
+            break
+
+    return platform_summary, subject, body
+
+
+
+def chat_prompt(ctx: dict, rag_context: str, question: str) -> str:
+    # Only tier and mode go in: the answer is cached and shared by every customer with the
+    # same tier/mode (rag.answer_cache), and customer_lines() is added around it afterwards.
+    return f"""
+You are a customer support assistant for a fashion retail platform.
+
+HARD RULES:
+- Use ONLY the POLICY CONTEXT below to answer policy questions.
+- Do NOT invent rules, time windows, exceptions, or benefits.
+- If the policy context is missing info, ask for exactly what you need.
+- You MUST adapt your response to the customer's tier and mode.
+
+TIER & MODE BEHAVIOR:
+- Tier affects what benefits can be offered (shipping coverage, goodwill likelihood, priority).
+- Mode affects communication style:
+  - optimistic: warm, proactive, suggest best options within policy.
+  - cautious: neutral, verification-first, stricter about timelines/evidence.
+
+CUSTOMER CONTEXT:
+- tier: {ctx["tier"]}
+- mode: {ctx["mode"]}
+
+POLICY CONTEXT (authoritative):
+{rag_context}
+
+RESPONSE FORMAT:
+1) A tier-aware acknowledgment has already been shown; do NOT write one. Start with the answer.
+2) Then provide the answer grounded in policy.
+3) Include citations like [1], [2] corresponding to the POLICY CONTEXT numbering.
+4) End with "Next steps" bullets.
+5) Do not address the customer by name or ID, or mention their purchases.
+
+Customer question: {question}
+""".strip()
+
+
+def customer_lines(ctx: dict) -> str:
+    # Per-customer opening shown before the shared policy answer.
+    lines = [tier_ack_line(ctx["tier"], ctx["mode"])]
+    if ctx.get("last_purchase"):
+        recent = ", ".join(list(dict.fromkeys(ctx.get("recent_items") or []))[:3])
+        lines.append(f"Your last purchase was on {ctx['last_purchase']}" + (f" ({recent})." if recent else "."))
+    return "\n".join(lines)
+
+
+def chat_fallback(rag_context: str) -> str:
+    return (
+        "I couldn’t reach the AI model right now, but here is the most relevant policy context I found:\n\n"
+        f"{rag_context}\n\n"
+        "Next steps:\n"
+        "- Share the item name and purchase date\n"
+        "- Tell us the reason (changed mind / wrong size / defective)\n"
+    )
+
+
+def email_prompt(ctx: dict, occasion: str) -> str:
+    limit = int(ctx["suggestion_limit"])
+    return f"""
+You are generating content to display inside a demo platform (do not send emails).
+
+CLIENT CONTEXT:
+- Tier: {ctx["tier"]}
+- Mode: {ctx["mode"]}
+- Top items: {ctx["top_items"][:5]}
+- Recent items: {ctx["recent_items"][:5]}
+- Avg purchase amount: {ctx["avg_amount"]}
+- Total spend: {ctx["total_spend"]}
+
+TASK:
+Return TWO sections.
+
+SECTION A: PLATFORM SUMMARY (2-4 sentences)
+- Start with: "Based on this client’s history and status..."
+- Explain why these suggestions fit and how tier/mode changes optimism/caution.
+
+SECTION B: SUGGESTED EMAIL DRAFT
+- Format exactly:
+  Subject: ...
+  Body:
+  ...
+- Suggest exactly {min(limit,5)} item ideas (categories like Jacket, Tunic, Handbag, etc.)
+- No promises of discounts/refunds/exceptions.
+
+Occasion/theme: {occasion}
+""".strip()
+
+
+def email_fallback(ctx: dict) -> EmailSuggestionResponse:
+    top_items = ctx["top_items"][:5]
+    subject = "New picks for you"
+    body = (
+        f"Based on this client’s history and status ({ctx['tier']}/{ctx['mode']}), "
+        f"we suggest focusing on items similar to: {', '.join(top_items[:3])}.\n\n"
+        "Subject: New picks you may like\n"
+        "Body:\n"
+        f"Hi {ctx['customer_id']},\n\n"
+        "Based on your recent choices, here are a few ideas you might like:\n"
+        f"- {top_items[0] if len(top_items) > 0 else 'Jacket'}\n"
+        f"- {top_items[1] if len(top_items) > 1 else 'Tunic'}\n"
+        f"- {top_items[2] if len(top_items) > 2 else 'Handbag'}\n\n"
+        "Reply with your occasion and budget, and we’ll refine the picks.\n"
+    )
+    return EmailSuggestionResponse(subject=subject, body=body, tier=ctx["tier"], mode=ctx["mode"])
+
+
+def email_response(ctx: dict, text: str) -> EmailSuggestionResponse:
+    platform_summary, subject, body = parse_email_sections(text)
+
+    if platform_summary.strip():
+        body = platform_summary.strip() + "\n\n---\n\n" + body.strip()
+
+    return EmailSuggestionResponse(subject=subject, body=body, tier=ctx["tier"], mode=ctx["mode"])
@@ -30,3 +30,29 @@ class EmailSuggestionResponse(BaseModel):
 
 
 
+
+
+class TransactionIn(BaseModel):
+    customer_id: str
+    item: str
+    amount: float
+    date: str
+    rating: Optional[float] = None
+    payment_method: Optional[str] = None
+
+
+class CampaignRequest(BaseModel):
+    campaign_id: str
+    tiers: List[str] = []
+    modes: List[str] = []
+    purchased_within_days: Optional[int] = None
+    purchased_after: Optional[str] = None
+    purchased_before: Optional[str] = None
+    occasion: Optional[str] = None
+    model: Optional[str] = None
+    concurrency: Optional[int] = None
+    rate_per_s: Optional[float] = None
+
+
+class ClientLookupRequest(BaseModel):
+    customer_ids: List[str]
@@ -0,0 +1,91 @@
+import math
+from typing import Dict
+
+import numpy as np
+
+# Quantile summaries over per-customer values that change over time, so both
+# support removing a value (a customer's old spend) as well as adding one.
+
+
+class DDSketch:
+    # Log-bucketed quantile sketch (DDSketch): any quantile is returned within
+    # `relative_accuracy` of a true sample value, buckets are plain counts so
+    # removals are exact, and size grows with log(max/min), not with N.
+
+    def __init__(self, relative_accuracy: float = 0.005):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _update(self, values: np.ndarray, sign: int) -> None:
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        pos = values > 0
+        self.zero_count += sign * int((~pos).sum())
+        keys, counts = np.unique(np.ceil(np.log(values[pos]) / self._log_gamma).astype("int64"), return_counts=True)
+        for k, c in zip(keys.tolist(), counts.tolist()):
+            n = self.buckets.get(k, 0) + sign * c
+            if n:
+                self.buckets[k] = n
+            else:
+                self.buckets.pop(k, None)
+        self.count += sign * len(values)
+
+    def add(self, values) -> None:
+        self._update(np.atleast_1d(values), +1)
+
+    def remove(self, values) -> None:
+        self._update(np.atleast_1d(values), -1)
+
+    def quantile(self, q: float) -> float:
+        if self.count <= 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen > rank:
+                return 2.0 * self.gamma ** k / (self.gamma + 1.0)
+        return 2.0 * self.gamma ** max(self.buckets) / (self.gamma + 1.0)
+
+
+class CountHistogram:
+    # Exact quantiles for small non-negative integers (purchase counts), with the
+    # same linear interpolation as pandas.Series.quantile.
+
+    def __init__(self):
+        self.counts = np.zeros(0, dtype="int64")
+        self.count = 0
+
+    def _update(self, values: np.ndarray, sign: int) -> None:
+        values = np.asarray(values, dtype="int64")
+        if not len(values):
+            return
+        hist = np.bincount(values)
+        if len(hist) > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(len(hist) - len(self.counts), dtype="int64")])
+        self.counts[: len(hist)] += sign * hist
+        self.count += sign * len(values)
+
+    def add(self, values) -> None:
+        self._update(np.atleast_1d(values), +1)
+
+    def remove(self, values) -> None:
+        self._update(np.atleast_1d(values), -1)
+
+    def _value_at(self, cum: np.ndarray, rank: int) -> float:
+        return float(np.searchsorted(cum, rank, side="right"))
+
+    def quantile(self, q: float) -> float:
+        if self.count <= 0:
+            return float("nan")
+        cum = np.cumsum(self.counts)
+        pos = q * (self.count - 1)
+        lo, hi = math.floor(pos), math.ceil(pos)
+        a, b = self._value_at(cum, lo), self._value_at(cum, hi)
+        return a + (pos - lo) * (b - a)
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import pandas as pd
+
+from src.data import CSV_PATH, SHARED_MMAP, ClientIndex, csv_cache_key, load_client_index, load_sales_data
+from src.profiles import ProfileStore
+from rag.search import INDEX_PATH, LEGACY_META_PATH, LEXICAL_PATH, META_PATH, Retriever, get_retriever
+
+RAG_FILES = (INDEX_PATH, META_PATH, LEGACY_META_PATH, LEXICAL_PATH, INDEX_PATH.parent / "rag_manifest.json")
+WATCH_INTERVAL_S = float(os.getenv("SNAPSHOT_WATCH_INTERVAL_S", "30"))
+
+
+def rag_files_key() -> Dict[str, Any]:
+    key = {}
+    for p in RAG_FILES:
+        try:
+            st = p.stat()
+            key[p.name] = (st.st_size, st.st_mtime_ns)
+        except FileNotFoundError:
+            key[p.name] = None
+    return key
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    # Everything a request reads. Handlers take one snapshot up front and use it
+    # for the whole request, so a reload never mixes old and new data mid-request.
+    version: int
+    df: pd.DataFrame
+    clients: pd.DataFrame
+    index: ClientIndex
+    profiles: ProfileStore
+    retriever: Retriever
+    data_key: Dict[str, Any]
+    rag_key: Dict[str, Any]
+    loaded_at: float = field(default_factory=time.time)
+
+    @property
+    def data_version(self) -> str:
+        # Derived from content only: the CSV's cache key plus a hash of the transactions
+        # appended to this worker's profiles. Workers serving the same table report the
+        # same version, and workers that took different appends never do, so it can back
+        # ETags and client caches behind a multi-worker deployment.
+        digest = hashlib.sha1(json.dumps(self.data_key, sort_keys=True, default=str).encode()).hexdigest()[:12]
+        appended = self.profiles.appended_digest
+        return f"{digest}.{appended[:12]}" if appended else digest
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "data_version": self.data_version,
+            "loaded_at": self.loaded_at,
+            "rows": len(self.df),
+            "customers": len(self.profiles),
+            "vectors": int(self.retriever.index.ntotal),
+        }
+
+
+def build_snapshot(version: int, previous: "Snapshot | None" = None, csv_path: Path = CSV_PATH) -> Snapshot:
+    data_key = csv_cache_key(csv_path)
+    rag_key = rag_files_key()
+
+    if previous is not None and previous.data_key == data_key:
+        df, clients, index, profiles = previous.df, previous.clients, previous.index, previous.profiles
+    else:
+        df, clients = load_sales_data(csv_path, mmap=SHARED_MMAP)
+        index = load_client_index(df, clients, data_key, mmap=SHARED_MMAP)
+        profiles = ProfileStore(df, clients, index)
+
+    if previous is None:
+        retriever = get_retriever()
+    elif previous.rag_key == rag_key:
+        retriever = previous.retriever
+    else:
+        # Reuse the loaded encoder and query-embedding cache; only the index files changed.
+        retriever = Retriever(model=previous.retriever.model, cache=previous.retriever.cache)
+
+    return Snapshot(
+        version=version, df=df, clients=clients, index=index, profiles=profiles,
+        retriever=retriever, data_key=data_key, rag_key=rag_key,
+    )
+
+
+class SnapshotManager:
+    def __init__(self, builder: Callable[..., Snapshot] = build_snapshot):
+        self._builder = builder
+        self._current: Snapshot | None = None
+        self._init_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.last_error: str | None = None
+        self.reloads = 0
+
+    def current(self) -> Snapshot:
+        snap = self._current
+        if snap is None:
+            with self._init_lock:
+                if self._current is None:
+                    self._current = self._builder(1)
+                snap = self._current
+        return snap
+
+    def reload(self) -> bool:
+        # Builds the next snapshot off the request path, then swaps the reference.
+        # Returns False if a reload is already running.
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            prev = self.current()
+            nxt = self._builder(prev.version + 1, previous=prev)
+            self._current = nxt
+            self.reloads += 1
+            self.last_error = None
+            return True
+        except Exception:
+            self.last_error = traceback.format_exc(limit=3)
+            return False
+        finally:
+            self._reload_lock.release()
+
+    def reload_in_background(self) -> bool:
+        if self._reload_lock.locked():
+            return False
+        threading.Thread(target=self.reload, name="snapshot-reload", daemon=True).start()
+        return True
+
+    def is_stale(self) -> bool:
+        snap = self.current()
+        return snap.data_key != csv_cache_key() or snap.rag_key != rag_files_key()
+
+    def start_watcher(self, interval_s: float = WATCH_INTERVAL_S) -> None:
+        if interval_s <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            pending = None
+            while not self._stop.wait(interval_s):
+                try:
+                    key = (csv_cache_key(), rag_files_key())
+                except OSError:
+                    continue
+                snap = self.current()
+                if key == (snap.data_key, snap.rag_key):
+                    pending = None
+                elif key == pending:
+                    # Unchanged for a full interval: writers are done, reload.
+                    self.reload()
+                    pending = None
+                else:
+                    pending = key
+
+        self._watcher = threading.Thread(target=watch, name="snapshot-watch", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.current().info(),
+            "reloading": self._reload_lock.locked(),
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE = "http://127.0.0.1:8000"
+
+
+class ApiClient:
+    # One pooled session per UI process. GET responses are served from memory while
+    # the backend's data version (polled at most every `version_ttl_s`) is unchanged;
+    # after a change they are revalidated with If-None-Match where the server sent an ETag.
+
+    def __init__(self, base: str = API_BASE, timeout=(3.05, 30), stream_timeout=(3.05, 120),
+                 pool_size: int = 8, version_ttl_s: float = 2.0, cache_size: int = 512):
+        self.base = base.rstrip("/")
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.version_ttl_s = version_ttl_s
+        self.cache_size = cache_size
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods={"GET"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (data_version, etag, data)
+        self._version: str | None = None
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+
+    def data_version(self) -> str | None:
+        now = time.monotonic()
+        if now - self._version_checked < self.version_ttl_s:
+            return self._version
+        r = self.session.get(f"{self.base}/version", timeout=self.timeout)
+        r.raise_for_status()
+        version = r.json()["data_version"]
+        self._version = version
+        self._version_checked = now
+        return version
+
+    def get(self, path: str, params: dict | None = None):
+        version = self.data_version()
+        key = (path, tuple(sorted((params or {}).items())))
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[2]
+
+        headers = {"If-None-Match": hit[1]} if hit is not None and hit[1] else {}
+        r = self.session.get(f"{self.base}{path}", params=params, headers=headers, timeout=self.timeout)
+        if r.status_code == 304:
+            data = hit[2]
+        else:
+            r.raise_for_status()
+            data = r.json()
+        with self._lock:
+            self._cache[key] = (version, r.headers.get("ETag"), data)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return data
+
+    def post(self, path: str, payload: dict):
+        r = self.session.post(f"{self.base}{path}", json=payload, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def stream(self, path: str, payload: dict):
+        # Yields (event, data) pairs from a server-sent-event endpoint as they arrive.
+        with self.session.post(f"{self.base}{path}", json=payload, stream=True, timeout=self.stream_timeout) as r:
+            r.raise_for_status()
+            event, data = "message", []
+            for line in r.iter_lines(decode_unicode=True):
+                if line is None:
+                    continue
+                if not line:
+                    if data:
+                        yield event, json.loads("\n".join(data))
+                    event, data = "message", []
+                elif line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data.append(line[5:].strip())
+
+    def clients(self, **params):
+        return self.get("/clients", params)
+
+    def search_clients(self, q: str, limit: int = 50):
+        return self.get("/clients/search", {"q": q, "limit": limit})["results"]
+
+    def client(self, customer_id: str):
+        return self.get(f"/clients/{customer_id}")
+
+    def lookup(self, customer_ids: list):
+        return self.post("/clients/lookup", {"customer_ids": list(customer_ids)})
@@ -1,8 +1,6 @@
 import streamlit as st
-import requests
-import json
 
-API_BASE = "http://127.0.0.1:8000"
+from api_client import API_BASE, ApiClient
 
 TIER_COLORS = {
     "bronze": "#CD7F32",
@@ -39,13 +37,12 @@ def badge(label: str, color: str) -> str:
 
 st.set_page_config(page_title="Fashion RAG Demo", layout="wide")
 
-def api_get(path):
-    r = requests.get(f"{API_BASE}{path}")
-    return r.json()
+@st.cache_resource
+def get_api() -> ApiClient:
+    # Shared across reruns and sessions so connections and cached responses are reused.
+    return ApiClient(API_BASE)
 
-def api_post(path, payload):
-    r = requests.post(f"{API_BASE}{path}", json=payload)
-    return r.json()
+api = get_api()
 
 with st.sidebar:
     model_choice = st.selectbox(
@@ -108,9 +105,14 @@ with st.expander("🔎 How tiers & modes work (click to expand)", expanded=False
 st.sidebar.header("Clients")
 
 with st.sidebar:
-    clients = api_get("/clients")
-    client_map = {c["customer_id"]: c for c in clients}
+    # Only matching clients are fetched, so the picker stays fast with very large client tables.
+    query = st.text_input("Search customer ID", key="client_search", autocomplete="off")
+    matches = api.search_clients(query.strip(), limit=50)
+    client_map = {c["customer_id"]: c for c in matches}
     client_ids = list(client_map.keys())
+    if not client_ids:
+        st.info("No matching clients.")
+        st.stop()
 
     def format_client(cid: str) -> str:
         t = (client_map[cid].get("tier") or "bronze").lower()
@@ -118,7 +120,7 @@ with st.sidebar:
         return f"{icon} {cid} ({t.upper()})"
 
     selected_id = st.selectbox("Select Client", client_ids, format_func=format_client)
-    selected_client = client_map[selected_id]
+    selected_client = api.client(selected_id)["profile"]
 
     st.markdown("### Client Summary")
     tier = (selected_client["tier"] or "bronze").lower()
@@ -152,11 +154,18 @@ with col1:
 
     if st.button("Send", key="send_btn") and user_input.strip():
         st.session_state.chat_history.append({"role": "user", "content": user_input})
-        resp = api_post("/chat", {"customer_id": selected_id, "question": user_input, "model": model_choice})
-
-        answer = resp.get("answer", "")
-        used_docs = resp.get("used_policy_docs", [])
-        ctx = resp.get("client_context", {})
+        st.markdown(f"**You:** {user_input}")
+        placeholder = st.empty()
+        answer, used_docs, ctx = "", [], {}
+        for event, data in api.stream("/chat/stream", {"customer_id": selected_id, "question": user_input, "model": model_choice}):
+            if event == "token":
+                answer += data["text"]
+                placeholder.markdown(f"**Assistant:** {answer}▌")
+            elif event == "sources":
+                used_docs = data.get("used_policy_docs", [])
+            elif event == "done":
+                answer = data.get("answer", answer)
+                ctx = data.get("client_context", {})
 
         if used_docs:
             answer += "\n\n---\n**Policy sources:** " + ", ".join(used_docs)
@@ -170,7 +179,15 @@ with col2:
     occasion = st.text_input("Optional theme/occasion", key="email_occasion", autocomplete="off")
 
     if st.button("Generate Email Draft", key="generate_email_btn"):
-        resp = api_post("/email_suggestion", {"customer_id": selected_id, "occasion": occasion, "model": model_choice})
+        placeholder = st.empty()
+        draft, resp = "", {}
+        for event, data in api.stream("/email_suggestion/stream", {"customer_id": selected_id, "occasion": occasion, "model": model_choice}):
+            if event == "token":
+                draft += data["text"]
+                placeholder.text(draft)
+            elif event == "done":
+                resp = data
+        placeholder.empty()
         st.markdown(f"### Subject\n{resp.get('subject', '')}")
         st.text_area("", value=resp.get("body", ""), height=300)
         st.caption(f"Tier: {resp.get('tier')} | Mode: {resp.get('mode')}")